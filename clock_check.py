@@ -0,0 +1,130 @@
+import argparse
+import multiprocessing
+import subprocess
+import time
+
+# Cross-process clock calibration. The profilers, the power sampler and lightframe.py all stamp events with
+# CLOCK_MONOTONIC, which the kernel shares between processes, so the offset between them should be zero. This measures
+# it NTP-style: ask the other process for its time and compare the answer with the midpoint of the round trip. The
+# round trip with the smallest delay bounds the uncertainty of the offset.
+
+CLOCK_CHECK_ROUNDS = 200
+READY_TIMEOUT_LINES = 1000
+
+def measure_resolution(no_reads=100000):
+    # Smallest non-zero step between two consecutive reads, i.e. the resolution that is actually observable
+    smallest_step_ns = None
+    previous_ns = time.monotonic_ns()
+    for _ in range(no_reads):
+        now_ns = time.monotonic_ns()
+        if now_ns != previous_ns and (smallest_step_ns is None or now_ns - previous_ns < smallest_step_ns):
+            smallest_step_ns = now_ns - previous_ns
+        previous_ns = now_ns
+    return {'reported_ns': int(time.get_clock_info('monotonic').resolution * 1e9), 'observed_ns': smallest_step_ns}
+
+def measure_offset(ping, rounds=CLOCK_CHECK_ROUNDS):
+    # ping() returns the other process's CLOCK_MONOTONIC in ns
+    samples = []
+    for _ in range(rounds):
+        sent_ns = time.monotonic_ns()
+        remote_ns = ping()
+        received_ns = time.monotonic_ns()
+        samples.append((received_ns - sent_ns, remote_ns - (sent_ns + received_ns) // 2))
+    samples.sort()
+    round_trip_ns, offset_ns = samples[0]
+    return {
+        'offset_ns': offset_ns,
+        'uncertainty_ns': (round_trip_ns + 1) // 2,
+        'min_round_trip_ns': round_trip_ns,
+        'median_round_trip_ns': samples[len(samples) // 2][0],
+    }
+
+def check_command(command, rounds=CLOCK_CHECK_ROUNDS):
+    # The profilers answer '--clock-check' with a 'READY <resolution_ns>' line and then one timestamp per input line
+    proc = subprocess.Popen(command + ['--clock-check'], stdin=subprocess.PIPE, stdout=subprocess.PIPE,
+                            stderr=subprocess.DEVNULL, text=True, bufsize=1)
+    try:
+        for _ in range(READY_TIMEOUT_LINES):
+            line = proc.stdout.readline()
+            if not line or line.startswith('READY'):
+                break
+        if not line.startswith('READY'):
+            return None
+
+        def ping():
+            proc.stdin.write("ping\n")
+            proc.stdin.flush()
+            return int(proc.stdout.readline())
+
+        result = measure_offset(ping, rounds)
+        result['remote_resolution_ns'] = int(line.split()[1])
+        proc.stdin.write("quit\n")
+        proc.stdin.flush()
+        proc.wait(timeout=10)
+        return result
+    finally:
+        if proc.poll() is None:
+            proc.kill()
+
+def echo_monotonic(connection):
+    # Stand-in for the power sampler: a process spawned the same way as logger.run_sampler
+    while connection.recv() != 'quit':
+        connection.send(time.monotonic_ns())
+
+def check_spawned_process(rounds=CLOCK_CHECK_ROUNDS):
+    context = multiprocessing.get_context('spawn')
+    parent_connection, child_connection = context.Pipe()
+    process = context.Process(target=echo_monotonic, args=(child_connection,), daemon=True)
+    process.start()
+    try:
+        def ping():
+            parent_connection.send('ping')
+            return parent_connection.recv()
+
+        result = measure_offset(ping, rounds)
+        result['remote_resolution_ns'] = int(time.get_clock_info('monotonic').resolution * 1e9)
+        parent_connection.send('quit')
+        return result
+    finally:
+        process.join(timeout=10)
+        if process.is_alive():
+            process.kill()
+
+def print_clock_check(name, result, resolution):
+    if result is None:
+        print(f"{name}: no answer to the clock check (is it built and does it support --clock-check?)")
+        return
+    # Worst-case misalignment of an event in that process against a power sample
+    bound_ns = abs(result['offset_ns']) + result['uncertainty_ns'] + max(resolution['reported_ns'], result['remote_resolution_ns'])
+    print(f"{name}: offset {result['offset_ns'] / 1e3:+.1f} us (± {result['uncertainty_ns'] / 1e3:.1f} us), "
+          f"round trip min {result['min_round_trip_ns'] / 1e3:.1f} us / median {result['median_round_trip_ns'] / 1e3:.1f} us, "
+          f"resolution {result['remote_resolution_ns']} ns -> events align to within {bound_ns / 1e3:.1f} us")
+    if abs(result['offset_ns']) > result['uncertainty_ns']:
+        print(f"Warning: {name} does not share lightframe.py's monotonic clock; phase and power timestamps cannot be compared.")
+    elif bound_ns >= 1_000_000:
+        print(f"Warning: {name} can only be aligned to {bound_ns / 1e6:.2f} ms; sub-millisecond phases are not resolvable.")
+
+def run_clock_check(profiler_commands, rounds=CLOCK_CHECK_ROUNDS):
+    # profiler_commands: list of (name, command) for the profilers, e.g. ('C++ (LibTorch)', ['./cpp/build/profiler'])
+    print("\n--- Clock Check (CLOCK_MONOTONIC) ---")
+    resolution = measure_resolution()
+    print(f"lightframe.py: resolution {resolution['reported_ns']} ns reported, {resolution['observed_ns']} ns observed between reads")
+    print_clock_check("Power sampler (spawned process)", check_spawned_process(rounds), resolution)
+    for name, command in profiler_commands:
+        try:
+            result = check_command(command, rounds)
+        except (OSError, ValueError, subprocess.TimeoutExpired) as e:
+            print(f"{name}: clock check failed: {e}")
+            continue
+        print_clock_check(name, result, resolution)
+    print("-" * (len("--- Clock Check (CLOCK_MONOTONIC) ---") - 1))
+
+def main():
+    parser = argparse.ArgumentParser(description='Measure the timestamp offset and resolution between the profiler processes')
+    parser.add_argument('--rounds', type=int, default=CLOCK_CHECK_ROUNDS, help='Number of round trips per process')
+    args = parser.parse_args()
+    run_clock_check([("Python (PyTorch)", ['python3', './python/profiler.py']), ("C++ (LibTorch)", ['./cpp/build/profiler'])],
+                    args.rounds)
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,234 @@
+import argparse
+import json
+import math
+
+# Static shape, parameter, FLOP and activation-memory estimates for the 'layers' section of a config.
+# Shapes exclude the batch dimension and mirror python/constructor.py. FLOPs count a multiply-accumulate
+# as two operations and every elementwise op (pooling window element, activation, batchnorm, residual add)
+# as one. Activation bytes assume float32 and a batch size of 1.
+
+BYTES_PER_ELEMENT = 4
+
+ACTIVATION_FLOPS_PER_ELEMENT = {
+    'relu': 1,
+    'tanh': 1,
+    'softmax': 3,  # exp, sum, divide
+}
+
+def conv_output_size(size, kernel_size, stride, padding):
+    return (size + 2 * padding - kernel_size) // stride + 1
+
+def analyze_conv2d(layer, shape):
+    if len(shape) != 3:
+        return None, f"conv2d expects a [channels, height, width] input, got {list(shape)}."
+    in_channels, out_channels = layer['io_shape']
+    if shape[0] != in_channels:
+        return None, f"conv2d expects {in_channels} input channels, got {shape[0]}."
+
+    conv_params = layer['conv_params']
+    kernel_h, kernel_w = conv_params['kernel_size']
+    stride_h, stride_w = conv_params['stride']
+    if conv_params['padding'] == 'same':
+        if (stride_h, stride_w) != (1, 1):
+            return None, "conv2d with padding 'same' requires a stride of [1, 1]."
+        out_h, out_w = shape[1], shape[2]
+    else:
+        out_h = conv_output_size(shape[1], kernel_h, stride_h, conv_params['padding'])
+        out_w = conv_output_size(shape[2], kernel_w, stride_w, conv_params['padding'])
+
+    params = in_channels * out_channels * kernel_h * kernel_w + out_channels
+    macs = out_channels * out_h * out_w * in_channels * kernel_h * kernel_w
+    return {'output_shape': (out_channels, out_h, out_w), 'params': params, 'macs': macs, 'other_flops': 0}, None
+
+def analyze_pool2d(layer, shape, params_key):
+    layer_type = layer['type']
+    if len(shape) != 3:
+        return None, f"{layer_type} expects a [channels, height, width] input, got {list(shape)}."
+
+    pool_params = layer[params_key]
+    kernel_h, kernel_w = pool_params['kernel_size']
+    stride_h, stride_w = pool_params['stride']
+    padding = pool_params.get('padding', 0)
+    if padding > kernel_h // 2 or padding > kernel_w // 2:
+        return None, f"{layer_type} padding {padding} must be at most half the kernel size."
+    out_h = conv_output_size(shape[1], kernel_h, stride_h, padding)
+    out_w = conv_output_size(shape[2], kernel_w, stride_w, padding)
+
+    other_flops = shape[0] * out_h * out_w * kernel_h * kernel_w
+    return {'output_shape': (shape[0], out_h, out_w), 'params': 0, 'macs': 0, 'other_flops': other_flops}, None
+
+def analyze_dense(layer, shape):
+    in_features, out_features = layer['io_shape']
+    if shape[-1] != in_features:
+        return None, f"dense expects {in_features} input features, got {shape[-1]} (input shape {list(shape)})."
+
+    rows = math.prod(shape[:-1])
+    params = in_features * out_features + out_features
+    macs = rows * in_features * out_features
+    return {'output_shape': tuple(shape[:-1]) + (out_features,), 'params': params, 'macs': macs, 'other_flops': 0}, None
+
+def analyze_batchnorm2d(layer, shape):
+    if len(shape) != 3:
+        return None, f"batchnorm2d expects a [channels, height, width] input, got {list(shape)}."
+    num_features = layer['batchnorm_params']['num_features'][0]
+    if shape[0] != num_features:
+        return None, f"batchnorm2d expects {num_features} channels, got {shape[0]}."
+    # Inference cost: one scale and one shift per element
+    return {'output_shape': shape, 'params': 2 * num_features, 'macs': 0, 'other_flops': 2 * math.prod(shape)}, None
+
+def analyze_residual_block(layer, shape):
+    if len(shape) != 3:
+        return None, f"residual_block expects a [channels, height, width] input, got {list(shape)}."
+    residual_params = layer['residual_params']
+    in_channels = residual_params['in_channels']
+    out_channels = residual_params['out_channels']
+    stride = residual_params['stride']
+    if shape[0] != in_channels:
+        return None, f"residual_block expects {in_channels} input channels, got {shape[0]}."
+
+    # conv3x3(stride) -> relu -> conv3x3, plus a 1x1 strided shortcut when the shape changes
+    out_h = conv_output_size(shape[1], 3, stride, 1)
+    out_w = conv_output_size(shape[2], 3, stride, 1)
+    out_elements = out_channels * out_h * out_w
+    params = (in_channels * out_channels * 9 + out_channels) + (out_channels * out_channels * 9 + out_channels)
+    macs = out_elements * in_channels * 9 + out_elements * out_channels * 9
+    if stride != 1 or in_channels != out_channels:
+        params += in_channels * out_channels + out_channels
+        macs += out_elements * in_channels
+    other_flops = 2 * out_elements  # Inner relu and residual add
+    return {'output_shape': (out_channels, out_h, out_w), 'params': params, 'macs': macs, 'other_flops': other_flops}, None
+
+def analyze_layer(layer, shape):
+    layer_type = layer['type']
+    if layer_type == 'conv2d':
+        return analyze_conv2d(layer, shape)
+    elif layer_type == 'maxpool2d':
+        return analyze_pool2d(layer, shape, 'maxpool_params')
+    elif layer_type == 'averagepool2d':
+        return analyze_pool2d(layer, shape, 'averagepool_params')
+    elif layer_type == 'flatten':
+        return {'output_shape': (math.prod(shape),), 'params': 0, 'macs': 0, 'other_flops': 0}, None
+    elif layer_type == 'dense':
+        return analyze_dense(layer, shape)
+    elif layer_type == 'batchnorm2d':
+        return analyze_batchnorm2d(layer, shape)
+    elif layer_type == 'dropout':
+        return {'output_shape': shape, 'params': 0, 'macs': 0, 'other_flops': 0}, None
+    elif layer_type == 'residual_block':
+        return analyze_residual_block(layer, shape)
+    return None, f"Unknown layer type '{layer_type}'."
+
+def analyze_layers(input_shape, layers):
+    layer_reports = []
+    errors = []
+    shape = tuple(input_shape)
+
+    for index, layer in enumerate(layers):
+        report, error = analyze_layer(layer, shape)
+        if error is None and min(report['output_shape']) < 1:
+            error = f"{layer['type']} produces an empty output shape {list(report['output_shape'])} from input {list(shape)}."
+        if error is not None:
+            errors.append(f"Layer {index} ({layer['type']}): {error}")
+            break
+
+        output_elements = math.prod(report['output_shape'])
+        activation = layer.get('activation_function')
+        other_flops = report['other_flops']
+        activation_bytes = output_elements * BYTES_PER_ELEMENT
+        if activation is not None:
+            # The activation is a separate module with its own output tensor
+            other_flops += ACTIVATION_FLOPS_PER_ELEMENT.get(activation, 1) * output_elements
+            activation_bytes += output_elements * BYTES_PER_ELEMENT
+
+        layer_reports.append({
+            'index': index,
+            'type': layer['type'],
+            'activation_function': activation,
+            'input_shape': list(shape),
+            'output_shape': list(report['output_shape']),
+            'params': report['params'],
+            'macs': report['macs'],
+            'flops': 2 * report['macs'] + other_flops,
+            'activation_bytes': activation_bytes,
+            'peak_bytes': (math.prod(shape) + output_elements) * BYTES_PER_ELEMENT,
+        })
+        shape = report['output_shape']
+
+    totals = {
+        'output_shape': list(shape),
+        'params': sum(report['params'] for report in layer_reports),
+        'param_bytes': sum(report['params'] for report in layer_reports) * BYTES_PER_ELEMENT,
+        'macs': sum(report['macs'] for report in layer_reports),
+        'flops': sum(report['flops'] for report in layer_reports),
+        'activation_bytes': sum(report['activation_bytes'] for report in layer_reports),
+        'peak_activation_bytes': max((report['peak_bytes'] for report in layer_reports), default=0),
+    }
+    return {'layers': layer_reports, 'totals': totals}, errors
+
+def analyze_config(config_data):
+    network_config = config_data['network']
+    return analyze_layers(network_config['input_shape'], network_config['layers'])
+
+def count_profiled_samples(config_data):
+    # Number of samples pushed through the network during the timed region, or None if unknown
+    network_config = config_data['network']
+    mode = network_config.get('mode')
+    if mode == 'inference':
+        inference_params = network_config['inference_params']
+        if inference_params.get('batch_sizes'):
+            return sum(-(-inference_params['no_inferences'] // size) * size for size in inference_params['batch_sizes'])
+        return inference_params['no_inferences']
+    elif mode == 'training':
+        training_params = network_config['training_params']
+        return training_params['num_samples'] * training_params['epochs']
+    return None
+
+def achieved_gflops(analysis, config_data, duration_s):
+    samples = count_profiled_samples(config_data)
+    if not samples or duration_s <= 0:
+        return None
+    flops_per_sample = analysis['totals']['flops']
+    if config_data['network']['mode'] == 'training':
+        flops_per_sample *= 3  # Backward pass costs roughly twice the forward pass
+    return flops_per_sample * samples / duration_s / 1e9
+
+def format_count(value):
+    for threshold, suffix in [(1e9, 'G'), (1e6, 'M'), (1e3, 'K')]:
+        if value >= threshold:
+            return f"{value / threshold:.2f}{suffix}"
+    return str(value)
+
+def print_network_analysis(analysis):
+    print("\n--- Static Network Analysis (batch size 1, float32) ---")
+    print(f"{'#':>3} {'Layer':<15} {'Output shape':<18} {'Params':>9} {'MACs':>9} {'FLOPs':>9} {'Act. bytes':>11}")
+    for report in analysis['layers']:
+        layer_name = report['type'] + (f"+{report['activation_function']}" if report['activation_function'] else "")
+        print(f"{report['index']:>3} {layer_name:<15} {str(report['output_shape']):<18} {format_count(report['params']):>9} "
+              f"{format_count(report['macs']):>9} {format_count(report['flops']):>9} {format_count(report['activation_bytes']):>11}")
+    totals = analysis['totals']
+    print(f"Total params:      {totals['params']} ({totals['param_bytes'] / (1024 * 1024):.2f} MiB)")
+    print(f"Total MACs:        {format_count(totals['macs'])}")
+    print(f"Total FLOPs:       {format_count(totals['flops'])} per sample (forward)")
+    print(f"Activation memory: {totals['activation_bytes'] / (1024 * 1024):.2f} MiB total, "
+          f"{totals['peak_activation_bytes'] / (1024 * 1024):.2f} MiB peak (layer input + output)")
+    print("-" * (len("--- Static Network Analysis (batch size 1, float32) ---") - 1))
+
+def main():
+    parser = argparse.ArgumentParser(description='Static shape, parameter and FLOP analysis of a config file')
+    parser.add_argument('--config', type=str, default='./configs/network_config.json',
+                        help='Path to the configuration file')
+    args = parser.parse_args()
+
+    with open(args.config, 'r') as config_file:
+        config_data = json.load(config_file)
+
+    analysis, errors = analyze_config(config_data)
+    if errors:
+        print("Shape Errors:")
+        for error in errors:
+            print(f"- {error}")
+        exit(1)
+    print_network_analysis(analysis)
+
+if __name__ == "__main__":
+    main()
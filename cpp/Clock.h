@@ -0,0 +1,25 @@
+#pragma once
+
+#include <cstdint>
+#include <ctime>
+
+// Timestamps shared with the Python profiler and the power logger: CLOCK_MONOTONIC in ns, which never steps under NTP
+// and is the same clock in every process on the machine (Python's time.monotonic_ns()). Wall-clock time is only
+// recorded once per run as an anchor, see EventChannel::open.
+inline int64_t monotonicNs() {
+    timespec ts;
+    clock_gettime(CLOCK_MONOTONIC, &ts);
+    return static_cast<int64_t>(ts.tv_sec) * 1000000000LL + ts.tv_nsec;
+}
+
+inline int64_t wallClockNs() {
+    timespec ts;
+    clock_gettime(CLOCK_REALTIME, &ts);
+    return static_cast<int64_t>(ts.tv_sec) * 1000000000LL + ts.tv_nsec;
+}
+
+inline int64_t monotonicResolutionNs() {
+    timespec ts;
+    clock_getres(CLOCK_MONOTONIC, &ts);
+    return static_cast<int64_t>(ts.tv_sec) * 1000000000LL + ts.tv_nsec;
+}
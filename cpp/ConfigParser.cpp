@@ -106,6 +106,11 @@ std::string ConfigParser::getMode() { return mode_; }
 
 InferenceParameters ConfigParser::getInferenceParameters() {
     inference_parameters_.no_inferences = inference_params_["no_inferences"];
+    if (inference_params_.contains("batch_sizes")) {
+        inference_parameters_.batch_sizes = inference_params_["batch_sizes"].get<std::vector<int>>();
+    }
+    inference_parameters_.input_pool_size = inference_params_.value("input_pool_size", 64);
+    inference_parameters_.pinned_inputs = inference_params_.value("pinned_inputs", false);
     return inference_parameters_; 
 }
 
@@ -117,6 +122,8 @@ TrainingParameters ConfigParser::getTrainingParameters() {
     training_parameters_.epochs = training_params_["epochs"];
     training_parameters_.num_samples = training_params_["num_samples"];
     training_parameters_.num_classes = network_layers_.back().io_shape[1];
+    training_parameters_.step_breakdown = training_params_.value("step_breakdown", false);
+    training_parameters_.data_loader = training_params_.value("data_loader", "batch_sampler");
     return training_parameters_;
 }
 
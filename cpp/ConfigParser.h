@@ -14,10 +14,15 @@ struct TrainingParameters {
     int epochs;
     int num_samples;
     int num_classes;
+    bool step_breakdown = false;
+    std::string data_loader = "batch_sampler";
 };
 
 struct InferenceParameters {
     int no_inferences;
+    std::vector<int> batch_sizes;  // Empty unless a batch-size sweep is configured
+    int input_pool_size = 64;
+    bool pinned_inputs = false;
 };
 
 class ConfigParser {
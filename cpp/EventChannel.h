@@ -0,0 +1,68 @@
+#pragma once
+
+#include <fstream>
+#include <iostream>
+#include <string>
+#include <nlohmann/json.hpp>
+#include "Clock.h"
+
+using json = nlohmann::json;
+
+// JSON-lines event channel to lightframe.py, the counterpart of python/events.py. Every line is one object with an
+// "event" ("clock_anchor", "phase_begin", "phase_end" or "metrics"), a CLOCK_MONOTONIC "t_ns" timestamp and
+// event-specific fields. Without an open channel phase events are dropped and metrics go to stdout.
+class EventChannel {
+public:
+    static EventChannel& instance() {
+        static EventChannel channel;
+        return channel;
+    }
+
+    void open(const std::string& path) {
+        file_.open(path, std::ios::app);
+        if (!file_.is_open()) {
+            std::cerr << "Warning: could not open event file " << path << ". Falling back to stdout metrics.\n";
+            return;
+        }
+        // The one wall-clock reading of the run, for converting monotonic timestamps to dates
+        emit("clock_anchor", {{"wall_ns", wallClockNs()}, {"resolution_ns", monotonicResolutionNs()}});
+    }
+
+    void emit(const std::string& event, json fields = json::object()) {
+        if (!file_.is_open()) {
+            return;
+        }
+        fields["event"] = event;
+        fields["t_ns"] = monotonicNs();
+        fields["source"] = "cpp";
+        file_ << fields.dump() << std::endl;  // Flushed, so the runner sees every event as soon as it happens
+    }
+
+    void phaseBegin(const std::string& phase, json fields = json::object()) {
+        fields["phase"] = phase;
+        emit("phase_begin", fields);
+    }
+
+    void phaseEnd(const std::string& phase, json fields = json::object()) {
+        fields["phase"] = phase;
+        emit("phase_end", fields);
+    }
+
+    // Structured results for lightframe.py, see profiler_runner.run_profiler_task
+    void emitMetrics(const std::string& name, const json& data) {
+        if (!file_.is_open()) {
+            std::cout << "[METRICS] " << json{{name, data}}.dump() << "\n";
+            return;
+        }
+        emit("metrics", {{"name", name}, {"data", data}});
+    }
+
+private:
+    EventChannel() = default;
+
+    std::ofstream file_;
+};
+
+inline EventChannel& events() {
+    return EventChannel::instance();
+}
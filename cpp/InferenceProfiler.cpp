@@ -2,64 +2,199 @@
 #include <iostream>
 #include <vector>
 #include <chrono>
+#include <ATen/cuda/CUDAEvent.h>
 #include "CustomNetworks.h"
+#include "LatencyStats.h"
+#include "EventChannel.h"
+#include "Clock.h"
+
+struct InferenceRun {
+    long long duration = 0;  // ms
+    long long start_time = 0;  // ns
+    long long end_time = 0;  // ns
+    std::vector<int64_t> latencies_ns;
+    json input_pool;
+};
 
 class InferenceProfiler {
 public:
-    InferenceProfiler(CustomNetwork& network, const std::string& device, const std::vector<int64_t>& input_shape, int no_inferences)
-        : network_(network), device_(device), input_shape_(input_shape), no_inferences_(no_inferences) {}
+    InferenceProfiler(CustomNetwork& network, const std::string& device, const std::vector<int64_t>& input_shape, int no_inferences,
+                      const std::vector<int>& batch_sizes = {}, int input_pool_size = 64, bool pinned_inputs = false)
+        : network_(network), device_(device), input_shape_(input_shape), no_inferences_(no_inferences), batch_sizes_(batch_sizes),
+          input_pool_size_(input_pool_size), pinned_inputs_(pinned_inputs) {}
 
     void profile() {
         torch::NoGradGuard no_grad;  // Disable gradient computation
         network_->eval();  // Set the network to evaluation mode
-        std::vector<torch::Tensor> inputs;
-        for (int i = 0; i < no_inferences_; ++i) {
-            torch::Tensor input = torch::randn(input_shape_).unsqueeze(0);  // Add a batch dimension of size 1
-            inputs.push_back(input);
+
+        if (!batch_sizes_.empty()) {
+            profileBatchSweep();
+            return;
+        }
+
+        InferenceRun run = runInferences(no_inferences_, 1);
+        if (run.latencies_ns.empty()) {
+            return;
+        }
+        printMetrics(run.duration, run.start_time, run.end_time);
+        printLatencyMetrics(run.latencies_ns);
+        events().emitMetrics("input_pool", run.input_pool);
+        std::cout << "Generated an input pool of " << run.input_pool["size"] << " tensors (" << run.input_pool["bytes"]
+                  << " bytes) in " << run.input_pool["generation_ms"].get<double>() << " ms (not part of the timed run).\n";
+    }
+
+private:
+    // Runs the same network over each configured batch size, keeping the total number of samples constant
+    void profileBatchSweep() {
+        json results = json::array();
+        long long sweep_start_time = 0;
+        long long sweep_end_time = 0;
+        double peak_samples_per_s = 0.0;
+
+        for (int batch_size : batch_sizes_) {
+            int no_batches = std::max(1, (no_inferences_ + batch_size - 1) / batch_size);
+            std::cout << "Batch size " << batch_size << ": running " << no_batches << " batches..." << std::endl;
+            InferenceRun run = runInferences(no_batches, batch_size);
+            if (run.latencies_ns.empty()) {
+                return;
+            }
+            if (results.empty()) {
+                sweep_start_time = run.start_time;
+            }
+            sweep_end_time = run.end_time;
+
+            json latency_stats = summarizeLatencies(run.latencies_ns);
+            double duration_s = (run.end_time - run.start_time) / 1e9;
+            double samples_per_s = static_cast<double>(no_batches) * batch_size / duration_s;
+            peak_samples_per_s = std::max(peak_samples_per_s, samples_per_s);
+            results.push_back({
+                {"batch_size", batch_size},
+                {"no_batches", no_batches},
+                {"samples_per_s", samples_per_s},
+                {"batch_latency_mean_ms", latency_stats["mean_ms"]},
+                {"batch_latency_p50_ms", latency_stats["p50_ms"]},
+                {"batch_latency_p99_ms", latency_stats["p99_ms"]},
+                {"sample_latency_mean_ms", latency_stats["mean_ms"].get<double>() / batch_size},
+                {"input_generation_ms", run.input_pool["generation_ms"]},
+            });
+        }
+
+        // Knee: smallest batch size that already reaches 90% of the peak throughput
+        json knee_batch_size = nullptr;
+        for (auto& result : results) {
+            bool is_knee = knee_batch_size.is_null() && result["samples_per_s"].get<double>() >= 0.9 * peak_samples_per_s;
+            if (is_knee) {
+                knee_batch_size = result["batch_size"];
+            }
+            result["knee"] = is_knee;
         }
+
+        std::cout << "[START TIME] " << sweep_start_time << " - [END TIME] " << sweep_end_time << "\n";
+        json sweep = {{"results", results}, {"knee_batch_size", knee_batch_size}, {"peak_samples_per_s", peak_samples_per_s}};
+        events().emitMetrics("batch_sweep", sweep);
+        for (const auto& result : results) {
+            std::cout << "Batch size " << result["batch_size"] << ": " << result["samples_per_s"].get<double>() << " samples/s, "
+                      << result["batch_latency_mean_ms"].get<double>() << " ms per batch, "
+                      << result["sample_latency_mean_ms"].get<double>() << " ms per sample"
+                      << (result["knee"].get<bool>() ? " (knee)" : "") << "\n";
+        }
+    }
+
+    InferenceRun runInferences(int no_batches, int64_t batch_size) {
+        std::vector<int64_t> pool_shape = {std::max<int64_t>(1, std::min<int64_t>(input_pool_size_, no_batches)), batch_size};
+        pool_shape.insert(pool_shape.end(), input_shape_.begin(), input_shape_.end());
+
+        // One contiguous block that the timed loop cycles through, so memory stays O(pool size) for any no_inferences
+        events().phaseBegin("data_generation");
+        auto generation_start = std::chrono::steady_clock::now();
+        torch::Tensor pool = torch::randn(pool_shape);
+        bool pinned = pinned_inputs_ && device_ == "gpu";
+        if (device_ == "gpu") {
+            pool = pinned ? pool.pin_memory() : pool.to(torch::kCUDA);
+            torch::cuda::synchronize();
+        }
+        auto generation_ns = std::chrono::duration_cast<std::chrono::nanoseconds>(std::chrono::steady_clock::now() - generation_start).count();
+        events().phaseEnd("data_generation");
+        std::vector<torch::Tensor> inputs = pool.unbind(0);
+
+        InferenceRun run;
         if (device_ == "cpu") {
-            profileOnCPU(inputs);
+            run = profileOnCPU(inputs, no_batches);
         } else if (device_ == "gpu") {
-            profileOnGPU(inputs);
+            run = profileOnGPU(inputs, no_batches, pinned);
         } else {
             std::cerr << "Error: Invalid device specified.\n";
+            return run;
         }
+        run.input_pool = {
+            {"size", pool_shape[0]},
+            {"bytes", pool.numel() * pool.element_size()},
+            {"pinned", pinned},
+            {"generation_ms", generation_ns / 1e6},
+        };
+        return run;
     }
 
-private:
-    void profileOnCPU(const std::vector<torch::Tensor>& inputs) {
-        auto start = std::chrono::high_resolution_clock::now();
-        for (const auto& input : inputs) {
+    InferenceRun profileOnCPU(const std::vector<torch::Tensor>& inputs, int no_batches) {
+        InferenceRun run;
+        run.latencies_ns.resize(no_batches);
+        events().phaseBegin("timed_run", {{"batch_size", inputs[0].size(0)}});
+        int64_t start = monotonicNs();
+        for (int i = 0; i < no_batches; ++i) {
+            const torch::Tensor& input = inputs[i % inputs.size()];
+            auto iteration_start = std::chrono::steady_clock::now();
             torch::Tensor output = network_(input);
+            run.latencies_ns[i] = std::chrono::duration_cast<std::chrono::nanoseconds>(std::chrono::steady_clock::now() - iteration_start).count();
         }
-        auto end = std::chrono::high_resolution_clock::now();
-        auto duration = std::chrono::duration_cast<std::chrono::milliseconds>(end - start).count();
+        int64_t end = monotonicNs();
+        events().phaseEnd("timed_run", {{"batch_size", inputs[0].size(0)}});
+        run.duration = (end - start) / 1000000;
 
-        long long start_seconds = long(std::chrono::duration<double>(start.time_since_epoch()).count() * pow(10, 9));
-        long long end_seconds = long(std::chrono::duration<double>(end.time_since_epoch()).count() * pow(10, 9));
-        printMetrics(duration, start_seconds, end_seconds);
+        run.start_time = start;
+        run.end_time = end;
+        return run;
     }
 
-    void profileOnGPU(std::vector<torch::Tensor>& inputs) {
+    InferenceRun profileOnGPU(const std::vector<torch::Tensor>& inputs, int no_batches, bool copy_inputs) {
         torch::Device device(torch::kCUDA);  // Select the CUDA device
         network_->to(device);  // Move the network to GPU
 
-        for (auto& input : inputs) {
-            input = input.to(device);  // Move the individual tensor to the device
+        // One event pair per inference; kernels are asynchronous, so host timers would only measure launch time
+        std::vector<at::cuda::CUDAEvent> start_events;
+        std::vector<at::cuda::CUDAEvent> end_events;
+        start_events.reserve(no_batches);
+        end_events.reserve(no_batches);
+        for (int i = 0; i < no_batches; ++i) {
+            start_events.emplace_back(cudaEventDefault);  // The default CUDAEvent flags disable timing
+            end_events.emplace_back(cudaEventDefault);
         }
 
         torch::cuda::synchronize();
-        auto start = std::chrono::high_resolution_clock::now();
-        for (const auto& input : inputs) {
+        events().phaseBegin("timed_run", {{"batch_size", inputs[0].size(0)}});
+        int64_t start = monotonicNs();
+        for (int i = 0; i < no_batches; ++i) {
+            torch::Tensor input = inputs[i % inputs.size()];
+            start_events[i].record();
+            if (copy_inputs) {
+                input = input.to(device, /*non_blocking=*/true);  // Pinned pool: the copy is part of each inference
+            }
             torch::Tensor output = network_(input);
+            end_events[i].record();
         }
         torch::cuda::synchronize();
-        auto end = std::chrono::high_resolution_clock::now();
-        auto duration = std::chrono::duration_cast<std::chrono::milliseconds>(end - start).count();
+        int64_t end = monotonicNs();
+        events().phaseEnd("timed_run", {{"batch_size", inputs[0].size(0)}});
+
+        InferenceRun run;
+        run.duration = (end - start) / 1000000;
+        run.latencies_ns.resize(no_batches);
+        for (int i = 0; i < no_batches; ++i) {
+            run.latencies_ns[i] = static_cast<int64_t>(start_events[i].elapsed_time(end_events[i]) * 1e6);  // elapsed_time is in ms
+        }
 
-        long long start_seconds = long(std::chrono::duration<double>(start.time_since_epoch()).count() * pow(10, 9));
-        long long end_seconds = long(std::chrono::duration<double>(end.time_since_epoch()).count() * pow(10, 9));
-        printMetrics(duration, start_seconds, end_seconds);
+        run.start_time = start;
+        run.end_time = end;
+        return run;
     }
 
     void printMetrics(long long duration, long long start_time, long long end_time) {
@@ -68,8 +203,19 @@ private:
         std::cout << "Time spent per inference: " << static_cast<double>(duration) / no_inferences_ << " ms on average.\n"; //Maybe set precision here?
     }
 
+    void printLatencyMetrics(const std::vector<int64_t>& latencies_ns) {
+        json latency_stats = summarizeLatencies(latencies_ns);
+        events().emitMetrics("latency", latency_stats);
+        std::cout << "Latency p50: " << latency_stats["p50_ms"].get<double>() << " ms, p90: " << latency_stats["p90_ms"].get<double>()
+                  << " ms, p99: " << latency_stats["p99_ms"].get<double>() << " ms, max: " << latency_stats["max_ms"].get<double>()
+                  << " ms, std: " << latency_stats["std_ms"].get<double>() << " ms\n";
+    }
+
     CustomNetwork network_;
     std::string device_;
     std::vector<int64_t> input_shape_;
     int no_inferences_;
-};
\ No newline at end of file
+    std::vector<int> batch_sizes_;
+    int input_pool_size_;
+    bool pinned_inputs_;
+};
@@ -0,0 +1,81 @@
+#pragma once
+
+#include <algorithm>
+#include <cmath>
+#include <cstdint>
+#include <numeric>
+#include <sstream>
+#include <string>
+#include <vector>
+#include <nlohmann/json.hpp>
+
+using json = nlohmann::json;
+
+// Linear interpolation between closest ranks, matching numpy.percentile's default
+inline double percentileOfSorted(const std::vector<int64_t>& sorted, double percentile) {
+    double rank = percentile / 100.0 * static_cast<double>(sorted.size() - 1);
+    size_t lower = static_cast<size_t>(std::floor(rank));
+    size_t upper = std::min(lower + 1, sorted.size() - 1);
+    double fraction = rank - static_cast<double>(lower);
+    return static_cast<double>(sorted[lower]) + (static_cast<double>(sorted[upper]) - static_cast<double>(sorted[lower])) * fraction;
+}
+
+inline json summarizeLatencies(const std::vector<int64_t>& latencies_ns, size_t slowest_n = 10) {
+    json stats;
+    stats["count"] = latencies_ns.size();
+    if (latencies_ns.empty()) {
+        return stats;
+    }
+
+    std::vector<int64_t> sorted(latencies_ns);
+    std::sort(sorted.begin(), sorted.end());
+
+    double sum = std::accumulate(sorted.begin(), sorted.end(), 0.0);
+    double mean = sum / sorted.size();
+    double squared_diff = 0.0;
+    for (int64_t latency : sorted) {
+        squared_diff += (latency - mean) * (latency - mean);
+    }
+
+    stats["mean_ms"] = mean / 1e6;
+    stats["std_ms"] = std::sqrt(squared_diff / sorted.size()) / 1e6;
+    stats["min_ms"] = sorted.front() / 1e6;
+    stats["max_ms"] = sorted.back() / 1e6;
+    for (double percentile : {50.0, 90.0, 95.0, 99.0, 99.9}) {
+        std::ostringstream key;
+        key << "p" << percentile << "_ms";
+        stats[key.str()] = percentileOfSorted(sorted, percentile) / 1e6;
+    }
+
+    // Base-2 buckets in microseconds, same layout as python/latency_stats.py
+    json histogram = json::array();
+    int low_exp = static_cast<int>(std::floor(std::log2(std::max<int64_t>(sorted.front(), 1) / 1e3)));
+    int high_exp = static_cast<int>(std::floor(std::log2(std::max<int64_t>(sorted.back(), 1) / 1e3))) + 1;
+    size_t index = 0;
+    for (int exp = low_exp; exp < high_exp; ++exp) {
+        double lower_us = std::exp2(exp);
+        double upper_us = std::exp2(exp + 1);
+        size_t count = 0;
+        while (index < sorted.size() && (std::max<int64_t>(sorted[index], 1) / 1e3 < upper_us || exp == high_exp - 1)) {
+            ++count;
+            ++index;
+        }
+        if (count > 0) {
+            histogram.push_back({{"lower_us", lower_us}, {"upper_us", upper_us}, {"count", count}});
+        }
+    }
+    stats["histogram"] = histogram;
+
+    std::vector<size_t> order(latencies_ns.size());
+    std::iota(order.begin(), order.end(), 0);
+    slowest_n = std::min(slowest_n, order.size());
+    std::partial_sort(order.begin(), order.begin() + slowest_n, order.end(),
+                      [&](size_t a, size_t b) { return latencies_ns[a] > latencies_ns[b]; });
+    json slowest = json::array();
+    for (size_t i = 0; i < slowest_n; ++i) {
+        slowest.push_back({{"iteration", order[i]}, {"latency_ms", latencies_ns[order[i]] / 1e6}});
+    }
+    stats["slowest"] = slowest;
+
+    return stats;
+}
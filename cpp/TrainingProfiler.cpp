@@ -4,6 +4,12 @@
 #include <chrono>
 #include "CustomNetworks.h"
 #include "CustomDataset.h"
+#include "EventChannel.h"
+#include "Clock.h"
+#include "LatencyStats.h"
+#include <array>
+#include <optional>
+#include <ATen/cuda/CUDAEvent.h>
 
 class TrainingProfiler {
 public:
@@ -18,11 +24,14 @@ public:
         int epochs,
         int num_samples,
         int num_classes,
-        const std::string& task)
+        const std::string& task,
+        bool step_breakdown = false,
+        const std::string& data_loader = "batch_sampler")
         : network_(network), device_(device), input_shape_(input_shape),
           learning_rate_(learning_rate), optimizer_choice_(optimizer_choice),
           loss_function_(loss_function), batch_size_(batch_size), epochs_(epochs),
-          num_samples_(num_samples), num_classes_(num_classes), task_(task) {}
+          num_samples_(num_samples), num_classes_(num_classes), task_(task), step_breakdown_(step_breakdown),
+          data_loader_(data_loader) {}
 
     void train() {
         torch::optim::Optimizer* optimizer = nullptr;
@@ -41,15 +50,16 @@ public:
         torch::nn::CrossEntropyLoss criterion;
         torch::nn::MSELoss mse_criterion;
 
-        auto [train_data, train_labels] = generate_mock_training_data(input_shape_, num_classes_, num_samples_, task_);
+        events().phaseBegin("data_generation");
+        torch::Tensor train_data, train_labels;
+        std::tie(train_data, train_labels) = generate_mock_training_data(input_shape_, num_classes_, num_samples_, task_);
 
-        CustomDataset custom_dataset;
         if (device_ == "gpu") {
-            custom_dataset = CustomDataset(train_data.to(torch::kCUDA), train_labels.to(torch::kCUDA));
-        } else {
-            custom_dataset = CustomDataset(train_data, train_labels);
+            train_data = train_data.to(torch::kCUDA);
+            train_labels = train_labels.to(torch::kCUDA);
         }
-        auto dataset = custom_dataset.map(torch::data::transforms::Stack<>());
+        auto dataset = CustomDataset(train_data, train_labels).map(torch::data::transforms::Stack<>());
+        events().phaseEnd("data_generation");
 
         auto data_loader = torch::data::make_data_loader<torch::data::samplers::RandomSampler>(
             std::move(dataset),
@@ -57,81 +67,245 @@ public:
         );
 
         network_->train();
-
-        long long training_duration = 0;
-        long long start_seconds = 0;
-        long long end_seconds = 0;
-        if (device_ == "cpu") {
+        bool on_gpu = device_ == "gpu";
+        if (on_gpu) {
+            std::cout << "Training on GPU..." << std::endl;
+            network_->to(torch::kCUDA);
+            torch::cuda::synchronize();
+        } else if (device_ == "cpu") {
             std::cout << "Training on CPU..." << std::endl;
             network_->to(torch::kCPU);
-            
-            auto training_start = std::chrono::high_resolution_clock::now();
-            for (int epoch = 0; epoch < epochs_; ++epoch) {
-                for (auto& batch : *data_loader) {
-                    auto input = batch.data;
-                    auto label = batch.target;
-                    optimizer->zero_grad();
-                    torch::Tensor output = network_(input);
-                    torch::Tensor loss;
-                    if (loss_function_ == "categorical_crossentropy") {
-                        loss = criterion(output, label);
-                    } else if (loss_function_ == "mse") {
-                        loss = mse_criterion(output, label);
-                    } else {
-                        std::cerr << "Unsupported loss function: " << loss_function_ << std::endl;
-                        return;
-                    }
-                    loss.backward();
-                    optimizer->step();
+        } else {
+            std::cerr << "Error" << std::endl;
+            return;
+        }
+
+        // 'batch_sampler': one permutation per epoch and every batch a single index_select of a contiguous slice of it,
+        // on the device of the data. 'dataloader': torch::data with per-sample indexing and Stack collation.
+        torch::Tensor order;
+        int64_t batch_start = 0;
+        std::optional<decltype(data_loader->begin())> loader_batch;
+        auto begin_epoch = [&](bool batch_sampler) {
+            if (batch_sampler) {
+                order = torch::randperm(num_samples_, torch::TensorOptions().dtype(torch::kInt64).device(train_data.device()));
+                batch_start = 0;
+            } else {
+                loader_batch.emplace(data_loader->begin());
+            }
+        };
+        // Returns false at the end of the epoch
+        auto next_batch = [&](bool batch_sampler, torch::Tensor& input, torch::Tensor& label) {
+            if (batch_sampler) {
+                if (batch_start >= num_samples_) {
+                    return false;
                 }
-            auto training_end = std::chrono::high_resolution_clock::now();
+                auto index = order.slice(0, batch_start, std::min<int64_t>(batch_start + batch_size_, num_samples_));
+                batch_start += batch_size_;
+                input = train_data.index_select(0, index);
+                label = train_labels.index_select(0, index);
+                return true;
+            }
+            if (*loader_batch == data_loader->end()) {
+                return false;
+            }
+            input = (*loader_batch)->data;
+            label = (*loader_batch)->target;
+            ++(*loader_batch);  // Loads the next batch, so its cost is part of this fetch
+            return true;
+        };
 
-            start_seconds = long(std::chrono::duration<double>(training_start.time_since_epoch()).count() * pow(10, 9));
-            end_seconds = long(std::chrono::duration<double>(training_end.time_since_epoch()).count() * pow(10, 9));
-            training_duration = std::chrono::duration_cast<std::chrono::milliseconds>(training_end - training_start).count(); 
+        // Fetch cost of one epoch with every loader, outside the timed run
+        events().phaseBegin("loader_overhead");
+        json loader_overhead;
+        for (bool batch_sampler : {true, false}) {
+            if (on_gpu) {
+                torch::cuda::synchronize();
             }
-        } else if (device_ == "gpu") {
-            std::cout << "Training on GPU..." << std::endl;
-            network_->to(torch::kCUDA);
+            int64_t fetch_start = monotonicNs();
+            int64_t no_batches = 0;
+            torch::Tensor input, label;
+            begin_epoch(batch_sampler);
+            while (next_batch(batch_sampler, input, label)) {
+                ++no_batches;
+            }
+            if (on_gpu) {
+                torch::cuda::synchronize();
+            }
+            double epoch_ms = (monotonicNs() - fetch_start) / 1e6;
+            loader_overhead[batch_sampler ? "batch_sampler" : "dataloader"] = {
+                {"batches", no_batches},
+                {"ms_per_epoch", epoch_ms},
+                {"ms_per_batch", no_batches > 0 ? epoch_ms / no_batches : 0.0},
+            };
+        }
+        events().phaseEnd("loader_overhead");
+        bool use_batch_sampler = data_loader_ == "batch_sampler";
 
-            torch::cuda::synchronize();
-            auto training_start = std::chrono::high_resolution_clock::now();
-            for (int epoch = 0; epoch < epochs_; ++epoch) {
-                for (auto& batch : *data_loader) {
-                    auto input = batch.data;
-                    auto label = batch.target;
-                    optimizer->zero_grad();
-                    torch::Tensor output = network_(input);
-                    torch::Tensor loss;
-                    if (loss_function_ == "categorical_crossentropy") {
-                        loss = criterion(output, label);
-                    } else if (loss_function_ == "mse") {
-                        loss = mse_criterion(output, label);
-                    } else {
-                        std::cerr << "Unsupported loss function: " << loss_function_ << std::endl;
-                        return;
-                    }
-                    loss.backward();
-                    optimizer->step();
+        // Boundaries of every step: before the fetch, after the fetch, forward, loss, backward and optimizer step.
+        // CUDA events on GPU, so every phase is measured on the device timeline.
+        int64_t steps_per_epoch = (num_samples_ + batch_size_ - 1) / batch_size_;
+        int64_t no_steps = step_breakdown_ ? steps_per_epoch * epochs_ : 0;
+        std::vector<std::array<int64_t, kStepBoundaries>> step_marks_ns(on_gpu ? 0 : no_steps);
+        std::vector<at::cuda::CUDAEvent> step_events;
+        if (on_gpu) {
+            step_events.reserve(no_steps * kStepBoundaries);
+            for (int64_t i = 0; i < no_steps * static_cast<int64_t>(kStepBoundaries); ++i) {
+                step_events.emplace_back(cudaEventDefault);  // The default CUDAEvent flags disable timing
+            }
+        }
+        int64_t step = 0;
+        auto mark = [&](size_t boundary) {
+            if (on_gpu) {
+                step_events[step * kStepBoundaries + boundary].record();
+            } else {
+                step_marks_ns[step][boundary] = monotonicNs();
+            }
+        };
+
+        std::vector<double> epoch_losses;
+        events().phaseBegin("timed_run");
+        int64_t training_start = monotonicNs();
+        for (int epoch = 0; epoch < epochs_; ++epoch) {
+            events().phaseBegin("epoch", {{"index", epoch}});
+            // Accumulated on the device and read back once per epoch; loss.item() every step would synchronize each time
+            torch::Tensor running_loss;
+            int64_t no_batches = 0;
+            begin_epoch(use_batch_sampler);
+            torch::Tensor input, label;
+            while (true) {
+                if (step_breakdown_ && step < no_steps) {
+                    mark(0);
                 }
-                torch::cuda::synchronize();
-                auto training_end = std::chrono::high_resolution_clock::now();
+                if (!next_batch(use_batch_sampler, input, label)) {
+                    break;
+                }
+                bool timed = step_breakdown_ && step < no_steps;
+                if (timed) mark(1);
+                optimizer->zero_grad();  // Counted with the forward pass
+                torch::Tensor output = network_(input);
+                if (timed) mark(2);
+                torch::Tensor loss;
+                if (loss_function_ == "categorical_crossentropy") {
+                    loss = criterion(output, label);
+                } else if (loss_function_ == "mse") {
+                    loss = mse_criterion(output, label);
+                } else {
+                    std::cerr << "Unsupported loss function: " << loss_function_ << std::endl;
+                    return;
+                }
+                if (timed) mark(3);
+                loss.backward();
+                if (timed) mark(4);
+                optimizer->step();
+                if (timed) mark(5);
+                running_loss = running_loss.defined() ? running_loss + loss.detach() : loss.detach();
+                ++no_batches;
+                ++step;
+            }
+            // The only host-device synchronization of the epoch, which also makes the epoch boundary accurate
+            epoch_losses.push_back(no_batches > 0 ? running_loss.item<double>() / no_batches : 0.0);
+            events().phaseEnd("epoch", {{"index", epoch}});
+        }
+        if (on_gpu) {
+            torch::cuda::synchronize();
+        }
+        int64_t training_end = monotonicNs();
+        events().phaseEnd("timed_run");
 
-                start_seconds = long(std::chrono::duration<double>(training_start.time_since_epoch()).count() * pow(10, 9));
-                end_seconds = long(std::chrono::duration<double>(training_end.time_since_epoch()).count() * pow(10, 9));
-                training_duration = std::chrono::duration_cast<std::chrono::milliseconds>(training_end - training_start).count(); 
+        long long training_duration = (training_end - training_start) / 1000000;
+        json training = {
+            {"samples", static_cast<int64_t>(num_samples_) * epochs_},
+            {"samples_per_s", static_cast<double>(num_samples_) * epochs_ / ((training_end - training_start) / 1e9)},
+            {"epoch_losses", epoch_losses},
+            {"data_loader", summarizeLoaderOverhead(loader_overhead, (training_end - training_start) / 1e6 / std::max<int64_t>(step, 1))},
+        };
+        if (step_breakdown_) {
+            int64_t timed_steps = std::min(step, no_steps);
+            std::vector<std::vector<int64_t>> durations_ns(kStepPhases.size(), std::vector<int64_t>(timed_steps));
+            for (int64_t i = 0; i < timed_steps; ++i) {
+                for (size_t phase = 0; phase < kStepPhases.size(); ++phase) {
+                    durations_ns[phase][i] = on_gpu
+                        ? static_cast<int64_t>(step_events[i * kStepBoundaries + phase].elapsed_time(step_events[i * kStepBoundaries + phase + 1]) * 1e6)  // ms -> ns
+                        : step_marks_ns[i][phase + 1] - step_marks_ns[i][phase];
+                }
             }
-        } else {
-            std::cerr << "Error" << std::endl;
-            return;
+            training["step_breakdown"] = summarizeSteps(durations_ns);
         }
 
-        printMetrics(training_duration, start_seconds, end_seconds);
+        printMetrics(training_duration, training_start, training_end);
+        events().emitMetrics("training", training);
+        std::cout << "Throughput: " << training["samples_per_s"].get<double>() << " samples/s, final epoch loss "
+                  << epoch_losses.back() << "\n";
+        printLoaderOverhead(training["data_loader"]);
+        if (step_breakdown_) {
+            printStepBreakdown(training["step_breakdown"]);
+        }
     }
 
 private:
+    static constexpr size_t kStepBoundaries = 6;
+    inline static const std::vector<std::string> kStepPhases = {"fetch", "forward", "loss", "backward", "optimizer"};
+
+    // Same layout as python/step_breakdown.py::summarize_steps
+    json summarizeSteps(const std::vector<std::vector<int64_t>>& durations_ns) {
+        size_t no_steps = durations_ns[0].size();
+        std::vector<int64_t> step_ns(no_steps, 0);
+        double total_ns = 0.0;
+        for (const auto& phase_ns : durations_ns) {
+            for (size_t i = 0; i < no_steps; ++i) {
+                step_ns[i] += phase_ns[i];
+                total_ns += phase_ns[i];
+            }
+        }
+        json phases;
+        for (size_t phase = 0; phase < kStepPhases.size(); ++phase) {
+            std::vector<int64_t> sorted(durations_ns[phase]);
+            std::sort(sorted.begin(), sorted.end());
+            double phase_total_ns = std::accumulate(sorted.begin(), sorted.end(), 0.0);
+            phases[kStepPhases[phase]] = {
+                {"mean_ms", no_steps > 0 ? phase_total_ns / no_steps / 1e6 : 0.0},
+                {"p50_ms", no_steps > 0 ? percentileOfSorted(sorted, 50.0) / 1e6 : 0.0},
+                {"p99_ms", no_steps > 0 ? percentileOfSorted(sorted, 99.0) / 1e6 : 0.0},
+                {"share", total_ns > 0 ? phase_total_ns / total_ns : 0.0},
+            };
+        }
+        // A step that waits a quarter of its time on the batch is limited by the data loader
+        std::string bound = phases["fetch"]["share"].get<double>() >= 0.25 ? "loader" : "compute";
+        return {{"steps", no_steps}, {"step_latency", summarizeLatencies(step_ns)}, {"phases", phases}, {"bound", bound}};
+    }
+
+    // Same layout as python/batch_sampler.py::summarize_loader_overhead: the step time of the run minus the fetch time
+    // of the selected loader is the compute per step, which gives the share of a step every loader would take
+    json summarizeLoaderOverhead(json loaders, double step_ms) {
+        double compute_ms = std::max(step_ms - loaders[data_loader_]["ms_per_batch"].get<double>(), 0.0);
+        for (auto& stats : loaders) {
+            double loader_step_ms = compute_ms + stats["ms_per_batch"].get<double>();
+            stats["share_of_step"] = loader_step_ms > 0 ? stats["ms_per_batch"].get<double>() / loader_step_ms : 0.0;
+        }
+        return {{"selected", data_loader_}, {"step_ms", step_ms}, {"loaders", loaders}};
+    }
+
+    void printLoaderOverhead(const json& summary) {
+        std::cout << "Data loader overhead:\n";
+        for (const auto& loader : summary["loaders"].items()) {
+            const json& stats = loader.value();
+            std::cout << "  " << loader.key() << (loader.key() == data_loader_ ? " (selected)" : "") << ": " << stats["ms_per_batch"].get<double>()
+                      << " ms per batch, " << stats["ms_per_epoch"].get<double>() << " ms per epoch, "
+                      << stats["share_of_step"].get<double>() * 100 << "% of a training step\n";
+        }
+    }
+
+    void printStepBreakdown(const json& breakdown) {
+        std::cout << "Step breakdown over " << breakdown["steps"] << " steps (" << breakdown["bound"].get<std::string>() << "-bound):\n";
+        for (const auto& phase : kStepPhases) {
+            const json& stats = breakdown["phases"][phase];
+            std::cout << "  " << phase << ": mean " << stats["mean_ms"].get<double>() << " ms, p50 " << stats["p50_ms"].get<double>()
+                      << " ms, p99 " << stats["p99_ms"].get<double>() << " ms, " << stats["share"].get<double>() * 100 << "% of the step\n";
+        }
+    }
+
     void printMetrics(long long duration, long long start_time, long long end_time) {
-        std::cout << "[START TIME] " << start_time << " - [END TIME] " << end_time;
+        std::cout << "[START TIME] " << start_time << " - [END TIME] " << end_time << "\n";
         std::cout << "Trained for " << epochs_ << " epochs in "
                   << duration << " ms.\n";
         std::cout << "Time spent per epoch: " << static_cast<double>(duration) / epochs_
@@ -180,4 +354,6 @@ private:
     const int num_samples_;
     const int num_classes_;
     const std::string& task_;
+    const bool step_breakdown_;
+    const std::string data_loader_;
 };
\ No newline at end of file
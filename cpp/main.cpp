@@ -6,9 +6,22 @@
 #include "InferenceProfiler.cpp"
 #include "TrainingProfiler.cpp"
 #include "ConfigParser.h"
+#include "EventChannel.h"
+#include "Clock.h"
 
 using json = nlohmann::json;
 
+// Answers every line on stdin with the current CLOCK_MONOTONIC timestamp, so clock_check.py can measure the offset
+// between this process and the power logger
+int runClockEcho() {
+    std::cout << "READY " << monotonicResolutionNs() << std::endl;
+    std::string line;
+    while (std::getline(std::cin, line) && line != "quit") {
+        std::cout << monotonicNs() << std::endl;
+    }
+    return 0;
+}
+
 int main(int argc, char* argv[]) {
     // Default path
     std::string config_file_path = "../../configs/network_config.json";
@@ -18,8 +31,13 @@ int main(int argc, char* argv[]) {
         if (arg == "-c" && i + 1 < argc) {
             config_file_path = argv[i + 1];
             ++i;
+        } else if (arg == "-e" && i + 1 < argc) {
+            events().open(argv[i + 1]);
+            ++i;
+        } else if (arg == "--clock-check") {
+            return runClockEcho();
         } else {
-            std::cerr << "Usage: " << argv[0] << " -c <config_file_path>" << std::endl;
+            std::cerr << "Usage: " << argv[0] << " -c <config_file_path> [-e <event_file_path>] [--clock-check]" << std::endl;
             return -1;
         }
     }
@@ -28,8 +46,10 @@ int main(int argc, char* argv[]) {
     if (!configParser.parseConfig()) {
         return -1;
     }
+    events().phaseBegin("build");
     std::vector<NetworkLayer> network_layers = configParser.getNetworkLayers();
     CustomNetwork network(network_layers);
+    events().phaseEnd("build");
 
     // Print the network architecture
     // std::cout << "Network Architecture:\n" << network << std::endl;
@@ -39,7 +59,8 @@ int main(int argc, char* argv[]) {
     const std::string task = configParser.getTask();
     if (configParser.getMode() == "inference") {
         InferenceParameters params = configParser.getInferenceParameters();
-        InferenceProfiler inference_profiler(network, device, input_shape, params.no_inferences);
+        InferenceProfiler inference_profiler(network, device, input_shape, params.no_inferences, params.batch_sizes,
+                                             params.input_pool_size, params.pinned_inputs);
         inference_profiler.profile();
     } else if (configParser.getMode() == "training") {
         TrainingParameters params = configParser.getTrainingParameters();
@@ -52,7 +73,9 @@ int main(int argc, char* argv[]) {
             params.epochs,
             params.num_samples,
             params.num_classes,
-            task);
+            task,
+            params.step_breakdown,
+            params.data_loader);
         training_profiler.train();
     } else {
         std::cout << "Invalid mode specified in the configuration file." << std::endl;
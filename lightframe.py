@@ -1,11 +1,18 @@
 import argparse
 import os
+import subprocess
+import threading
 from datetime import datetime
 from validate_config import validate_config
+from config_analyzer import analyze_config, achieved_gflops, print_network_analysis
 from logger import log_power
+from power_sources import create_power_source
 from profiler_runner import run_profiler_task
+from clock_check import run_clock_check
 # Updated import:
-from power_analyzer import load_power_log, analyze_power_consumption, trim_power_log_file
+from power_analyzer import load_power_log, analyze_power_consumption, analyze_idle_baseline, baseline_drift, analyze_phases, analyze_telemetry
+from power_trace import export_csv, load_telemetry_trace
+from trace_exporter import export_timeline
 
 # print_power_analysis_summary function (as defined in previous step) remains here...
 def print_power_analysis_summary(analysis_results, profiler_name):
@@ -29,17 +36,380 @@ def print_power_analysis_summary(analysis_results, profiler_name):
     min_power = analysis_results.get('min_power_mw', 'N/A')
     max_power = analysis_results.get('max_power_mw', 'N/A')
 
-    print(f"Avg. Power Cons.:  {avg_power:.2f} mW" if isinstance(avg_power, float) else f"Avg. Power Cons.:  {avg_power}")
+    print(f"Avg. Power Cons.:  {avg_power:.2f} mW (time-weighted)" if isinstance(avg_power, float) else f"Avg. Power Cons.:  {avg_power}")
     print(f"Min. Power Cons.:  {min_power:.2f} mW" if isinstance(min_power, float) else f"Min. Power Cons.:  {min_power}")
     print(f"Max. Power Cons.:  {max_power:.2f} mW" if isinstance(max_power, float) else f"Max. Power Cons.:  {max_power}")
 
+    if 'total_energy_j' in analysis_results:
+        print(f"Total Energy:      {analysis_results['total_energy_j']:.4f} J (± {analysis_results['energy_uncertainty_j']:.4f} J)")
+        if 'energy_per_operation_j' in analysis_results:
+            print(f"Energy per {op_unit}: {analysis_results['energy_per_operation_j'] * 1000:.4f} mJ "
+                  f"(± {analysis_results['energy_per_operation_uncertainty_j'] * 1000:.4f} mJ)")
+        print(f"Energy-Delay Prod: {analysis_results['energy_delay_product_js']:.4f} J*s")
+        for rail, rail_energy_j in analysis_results['rail_energy_j'].items():
+            print(f"  {rail + ':':<17}{rail_energy_j:.4f} J")
+        if 'dynamic_energy_j' in analysis_results:
+            print(f"Idle Baseline:     {analysis_results['baseline_power_mw']:.2f} mW")
+            print(f"Dynamic Power:     {analysis_results['dynamic_average_power_mw']:.2f} mW")
+            print(f"Dynamic Energy:    {analysis_results['dynamic_energy_j']:.4f} J (± {analysis_results['dynamic_energy_uncertainty_j']:.4f} J)")
+            if 'dynamic_energy_per_operation_j' in analysis_results:
+                print(f"Dynamic Energy per {op_unit}: {analysis_results['dynamic_energy_per_operation_j'] * 1000:.4f} mJ "
+                      f"(± {analysis_results['dynamic_energy_per_operation_uncertainty_j'] * 1000:.4f} mJ)")
+            for rail, rail_energy_j in analysis_results['rail_dynamic_energy_j'].items():
+                print(f"  {rail + ' (dynamic):':<27}{rail_energy_j:.4f} J")
+        if 'sampling_interval_ms' in analysis_results:
+            print(f"Sampling:          every {analysis_results['sampling_interval_ms']:.3f} ms "
+                  f"(jitter {analysis_results['sampling_jitter_ms']:.3f} ms), {analysis_results['window_coverage'] * 100:.1f}% of the window covered")
+
+    telemetry = analysis_results.get('telemetry')
+    if telemetry:
+        columns = telemetry['columns']
+        for name, label, unit in [('cpu_util_pct', 'CPU Utilization', '%'), ('gpu_util_pct', 'GPU Utilization', '%'),
+                                  ('gpu_freq_mhz', 'GPU Frequency', ' MHz'), ('rss_mb', 'Process RSS', ' MB'),
+                                  ('uss_mb', 'Process USS', ' MB'), ('mem_pressure_pct', 'Memory Pressure', '%')]:
+            if name in columns:
+                print(f"{label + ':':<19}mean {columns[name]['mean']:.1f}{unit}, max {columns[name]['max']:.1f}{unit}")
+        if 'mem_available_pct' in columns:
+            print(f"{'Memory Available:':<19}min {columns['mem_available_pct']['min']:.1f}%")
+        for name, stats in columns.items():
+            if name.startswith('cpufreq_'):
+                print(f"{name[len('cpufreq_'):-len('_mhz')] + ' Frequency:':<19}{stats['min']:.0f} - {stats['max']:.0f} MHz (mean {stats['mean']:.0f} MHz)")
+        temperatures = {name: stats for name, stats in columns.items() if name.startswith('temp_')}
+        if temperatures:
+            hottest = max(temperatures, key=lambda name: temperatures[name]['max'])
+            print(f"{'Peak Temperature:':<19}{temperatures[hottest]['max']:.1f} C ({hottest[len('temp_'):-len('_c')]})")
+        for event in telemetry['throttling']:
+            if event['kind'] == 'temperature':
+                print(f"Warning: THROTTLING RISK - {event['column']} reached {event['peak']:.1f} C (limit {event['limit']:.1f} C) "
+                      f"{event['first_offset_s']:.2f} s into the run, {event['share'] * 100:.1f}% of samples at or above the limit.")
+            else:
+                print(f"Warning: FREQUENCY THROTTLED - {event['column']} fell to {event['low']:.0f} MHz while busy "
+                      f"(peak {event['reference']:.0f} MHz) {event['first_offset_s']:.2f} s into the run, "
+                      f"{event['share'] * 100:.1f}% of busy samples below {event['limit']:.0f} MHz.")
+        if not telemetry['throttling']:
+            print("Throttling:        none detected")
+
     print("-" * (len(f"--- Power Analysis Summary for {profiler_name} ---") -1))
 
 
+def measure_idle_baseline(power_config, power_log_file_path, logging_interval, duration_s, profiler_name):
+    # Samples the quiescent system before a profiler run so static board power is not charged to the model
+    print(f"\nCapturing a {duration_s} s idle power baseline before the {profiler_name} run. Keep the system quiescent...")
+    log_power(os.getpid(), threading.Event(), power_log_file_path, logging_interval, create_power_source(power_config),
+              max_duration_s=duration_s)
+    baseline = analyze_idle_baseline(load_power_log(power_log_file_path))
+    if baseline is None:
+        print(f"Warning: not enough idle samples for a baseline. Reporting {profiler_name} power without baseline subtraction.")
+        return None
+    print(f"Idle baseline for {profiler_name}: {baseline['power_mw']:.2f} mW (std {baseline['std_mw']:.2f} mW, "
+          f"{baseline['num_samples']} samples over {baseline['duration_s']:.2f} s)")
+    return baseline
+
+
+def print_baseline_drift(py_baseline, cpp_baseline, tolerance):
+    drift = baseline_drift(py_baseline, cpp_baseline, tolerance)
+    if drift is None:
+        return
+    print(f"\nIdle baseline drift between the Python and C++ runs: {drift['drift'] * 100:+.2f}% "
+          f"({py_baseline['power_mw']:.2f} mW -> {cpp_baseline['power_mw']:.2f} mW)")
+    if drift['flagged']:
+        print(f"Warning: the idle baseline drifted by more than {tolerance * 100:.1f}% (e.g. thermal or DVFS state changed). "
+              "Compare the two runs' dynamic energy with care.")
+
+
+def print_phase_energy_summary(phase_results, profiler_name):
+    if not phase_results:
+        return
+    print(f"\n--- Energy per Phase for {profiler_name} ---")
+    print(f"{'Phase':<34}{'Duration (s)':>14}{'Avg. Power (mW)':>17}{'Energy (J)':>12}{'Samples':>9}")
+    for result in phase_results:
+        label = '  ' * result['depth'] + result['phase']
+        if 'index' in result:
+            label += f" {result['index']}"
+        elif 'backend' in result:
+            label += f" ({result['backend']})"
+        print(f"{label:<34}{result['duration_s']:>14.3f}{result['average_power_mw']:>17.2f}{result['energy_j']:>12.4f}{result['num_samples']:>9}")
+    if any(result['num_samples'] < 2 for result in phase_results):
+        print("Note: phases with fewer than two samples are mostly interpolated; lower the logging interval to resolve them.")
+    print("-" * (len(f"--- Energy per Phase for {profiler_name} ---") -1))
+
+
+def analyze_run_telemetry(power_config, telemetry_file_path, start_time_ns, end_time_ns):
+    if telemetry_file_path is None or not os.path.exists(telemetry_file_path):
+        return None
+    try:
+        telemetry_data = load_telemetry_trace(telemetry_file_path)
+    except ValueError as e:
+        print(f"Warning: could not load telemetry trace {telemetry_file_path}: {e}")
+        return None
+    return analyze_telemetry(telemetry_data, start_time_ns, end_time_ns,
+                             power_config.get('throttle_temperature_c', 85.0), power_config.get('throttle_frequency_drop', 0.15))
+
+
+def export_run_timeline(timeline_config, power_log_file_path, telemetry_file_path, metrics, profiler_name):
+    # Chrome trace / Perfetto JSON next to the power log, see trace_exporter.py
+    if not timeline_config or timeline_config.get('status') != 'on':
+        return
+    power_data = load_power_log(power_log_file_path) if power_log_file_path is not None and os.path.exists(power_log_file_path) else None
+    telemetry_data = None
+    if telemetry_file_path is not None and os.path.exists(telemetry_file_path):
+        try:
+            telemetry_data = load_telemetry_trace(telemetry_file_path)
+        except ValueError as e:
+            print(f"Warning: could not load telemetry trace {telemetry_file_path}: {e}")
+    timeline_path = power_log_file_path[:-len('_power_log.bin')] + '_timeline.json'
+    no_events = export_timeline(timeline_path, profiler_name, power_data, telemetry_data, metrics.get('phases'),
+                                metrics.get('layer_profile'), timeline_config.get('max_counter_points', 20000))
+    print(f"\nTimeline for {profiler_name}: {no_events} events written to {timeline_path} (open in ui.perfetto.dev or chrome://tracing)")
+
+
+def tune_training_batch_size(config_data, config_path, config_file_name_base):
+    # With batch_size_tuning on, the batch size search writes a derived config that both profilers then use.
+    # Returns the config path and data to profile.
+    tuning = config_data['network'].get('batch_size_tuning', {'status': 'off'})
+    if config_data['network']['mode'] != 'training' or tuning['status'] != 'on':
+        return config_path, config_data
+
+    os.makedirs('./logs', exist_ok=True)
+    derived_config_path = os.path.join('./logs', f"{config_file_name_base}_tuned_{datetime.now().strftime('%Y%m%d_%H%M%S')}.json")
+    print("\n--- Training Batch Size Tuning ---")
+    result = subprocess.run(['python3', './python/batch_tuner.py', '-c', config_path, '-o', derived_config_path])
+    if result.returncode != 0 or not os.path.exists(derived_config_path):
+        print(f"Batch size tuning failed (exit code {result.returncode}). Profiling with the configured batch size "
+              f"{config_data['network']['training_params']['batch_size']}.")
+        return config_path, config_data
+    is_valid, derived_config = validate_config(derived_config_path)
+    if not is_valid:
+        print("Exiting due to invalid derived config file.")
+        exit(1)
+    print(f"Profiling with the derived configuration {derived_config_path}")
+    return derived_config_path, derived_config
+
+
+def print_latency_summary(latency_stats, profiler_name):
+    if not latency_stats or latency_stats.get('count', 0) == 0:
+        return
+
+    print(f"\n--- Latency Distribution for {profiler_name} ---")
+    print(f"Inferences:        {latency_stats['count']}")
+    print(f"Mean / Std:        {latency_stats['mean_ms']:.4f} ms / {latency_stats['std_ms']:.4f} ms")
+    for key in ['min_ms', 'p50_ms', 'p90_ms', 'p95_ms', 'p99_ms', 'p99.9_ms', 'max_ms']:
+        if key in latency_stats:
+            label = key[:-3].upper() + ':'
+            print(f"{label:<19}{latency_stats[key]:.4f} ms")
+
+    histogram = latency_stats.get('histogram', [])
+    if histogram:
+        print("Histogram (log2 buckets):")
+        max_count = max(bucket['count'] for bucket in histogram)
+        for bucket in histogram:
+            bar = '#' * max(1, int(40 * bucket['count'] / max_count))
+            print(f"  [{bucket['lower_us']:>10.1f}, {bucket['upper_us']:>10.1f}) us {bucket['count']:>8} {bar}")
+
+    slowest = latency_stats.get('slowest', [])
+    if slowest:
+        print("Slowest iterations:")
+        print("  " + ", ".join(f"#{entry['iteration']}: {entry['latency_ms']:.4f} ms" for entry in slowest))
+
+    print("-" * (len(f"--- Latency Distribution for {profiler_name} ---") -1))
+
+
+def print_throughput_summary(analysis, config_data, start_time_ns, end_time_ns, profiler_name):
+    if start_time_ns is None or end_time_ns is None or end_time_ns <= start_time_ns:
+        return
+
+    gflops = achieved_gflops(analysis, config_data, (end_time_ns - start_time_ns) / 1e9)
+    if gflops is not None:
+        print(f"{profiler_name} achieved compute: {gflops:.3f} GFLOP/s (static FLOP estimate over the timed run)")
+
+
+def print_layer_hotspots(layer_profile, profiler_name, top_n=5):
+    if not layer_profile:
+        return
+
+    print(f"\n--- Layer Hotspots for {profiler_name} ---")
+    for phase in ['forward', 'backward']:
+        if phase not in layer_profile:
+            continue
+        hotspots = sorted(layer_profile[phase], key=lambda row: row['mean_ms'], reverse=True)[:top_n]
+        print(f"{phase.capitalize()} ({layer_profile['iterations']} iterations, batch size {layer_profile['batch_size']}):")
+        for row in hotspots:
+            print(f"  #{row['index']:<3} {row['type']:<14} {str(row['output_shape']):<18} mean {row['mean_ms']:.4f} ms, "
+                  f"p99 {row['p99_ms']:.4f} ms, {row['share'] * 100:.1f}% of total")
+    print("-" * (len(f"--- Layer Hotspots for {profiler_name} ---") -1))
+
+
+def print_backend_comparison(backend_results, profiler_name):
+    if not backend_results:
+        return
+
+    print(f"\n--- Execution Backend Comparison for {profiler_name} ---")
+    print(f"{'Backend':<15} {'Convert ms':>11} {'1st call ms':>12} {'Mean ms':>10} {'P50 ms':>10} {'P99 ms':>10} {'Inf/s':>10}")
+    for result in backend_results:
+        if 'mean_ms' not in result:
+            continue
+        print(f"{result['backend']:<15} {result['conversion_ms']:>11.2f} {result['first_call_ms']:>12.2f} {result['mean_ms']:>10.4f} "
+              f"{result['p50_ms']:>10.4f} {result['p99_ms']:>10.4f} {result['inferences_per_s']:>10.1f}")
+    print("-" * (len(f"--- Execution Backend Comparison for {profiler_name} ---") -1))
+
+
+def print_precision_comparison(precision_results, profiler_name):
+    if not precision_results:
+        return
+
+    print(f"\n--- Precision / Quantization Comparison for {profiler_name} ---")
+    print(f"{'Precision':<13} {'Mean ms':>10} {'P99 ms':>10} {'Inf/s':>10} {'Size MiB':>9} {'Max dev.':>11}")
+    for result in precision_results:
+        print(f"{result['precision']:<13} {result['mean_ms']:>10.4f} {result['p99_ms']:>10.4f} {result['inferences_per_s']:>10.1f} "
+              f"{result['model_size_bytes'] / (1024 * 1024):>9.2f} {result['max_abs_deviation']:>11.4g}")
+    print("-" * (len(f"--- Precision / Quantization Comparison for {profiler_name} ---") -1))
+
+
+def print_graph_optimization_summary(graph_optimization, profiler_name):
+    if not graph_optimization:
+        return
+
+    print(f"\n--- Graph Optimization for {profiler_name} ---")
+    for pass_name, count in graph_optimization['passes'].items():
+        note = graph_optimization.get('notes', {}).get(pass_name)
+        print(f"{pass_name + ':':<19}{count} module(s) rewritten" + (f" ({note})" if note else ""))
+    before = graph_optimization['before']
+    after = graph_optimization['after']
+    for key in ['mean_ms', 'p50_ms', 'p99_ms']:
+        label = key[:-3].capitalize() + ':'
+        change = (after[key] - before[key]) / before[key] * 100 if before[key] > 0 else 0.0
+        print(f"{label:<19}{before[key]:.4f} ms -> {after[key]:.4f} ms ({change:+.1f}%)")
+    print("-" * (len(f"--- Graph Optimization for {profiler_name} ---") -1))
+
+
+def print_serving_summary(serving_profile, profiler_name):
+    if not serving_profile or not serving_profile.get('results'):
+        return
+
+    print(f"\n--- Serving Benchmark for {profiler_name} ---")
+    print(f"Dynamic batching: max batch size {serving_profile['max_batch_size']}, "
+          f"max queue delay {serving_profile['max_queue_delay_ms']} ms, {serving_profile['duration_s']} s per load")
+    print(f"{'Offered load':<18} {'Req/s':>9} {'Batch':>6} {'Queue p50':>10} {'Queue p99':>10} {'E2E p50':>10} {'E2E p99':>10}")
+    for result in serving_profile['results']:
+        offered = f"{result['offered_load']} req/s" if result['load_type'] == 'rate' else f"{result['offered_load']} clients"
+        queueing = result['queueing_delay']
+        latency = result['end_to_end_latency']
+        print(f"{offered:<18} {result['throughput_per_s']:>9.1f} {result['mean_batch_size']:>6.2f} {queueing['p50_ms']:>10.4f} "
+              f"{queueing['p99_ms']:>10.4f} {latency['p50_ms']:>10.4f} {latency['p99_ms']:>10.4f}")
+    print("Queueing and end-to-end latencies in ms.")
+    print("-" * (len(f"--- Serving Benchmark for {profiler_name} ---") -1))
+
+
+def print_multi_stream_summary(multi_stream, profiler_name):
+    if not multi_stream or not multi_stream.get('results'):
+        return
+
+    print(f"\n--- Multi-Stream Scaling for {profiler_name} ---")
+    print(f"{'Streams':>7} {'Total inf/s':>12} {'Efficiency':>10} {'Worst P50 ms':>13} {'Worst P99 ms':>13}")
+    for result in multi_stream['results']:
+        worst_p50 = max(stream['p50_ms'] for stream in result['per_stream'])
+        worst_p99 = max(stream['p99_ms'] for stream in result['per_stream'])
+        print(f"{result['streams']:>7} {result['aggregate_inferences_per_s']:>12.1f} {result['scaling_efficiency'] * 100:>9.1f}% "
+              f"{worst_p50:>13.4f} {worst_p99:>13.4f}")
+    print("-" * (len(f"--- Multi-Stream Scaling for {profiler_name} ---") -1))
+
+
+def print_thread_sweep_summary(sweep, profiler_name):
+    if not sweep or not sweep.get('results'):
+        return
+
+    print(f"\n--- CPU Thread Scaling for {profiler_name} ---")
+    print(f"{'Intra':>5} {'Inter':>5} {'Cores':<20} {'Duration ms':>12} {'Speedup':>8} {'Efficiency':>10}")
+    for result in sweep['results']:
+        cores = ','.join(str(core) for core in result['cores']) if result['cores'] else 'any'
+        print(f"{result['intra_op_threads']:>5} {result['inter_op_threads']:>5} {cores:<20} {result['duration_ms']:>12.3f} "
+              f"{result['speedup']:>7.2f}x {result['parallel_efficiency'] * 100:>9.1f}%")
+    best = sweep['best']
+    best_cores = ','.join(str(core) for core in best['cores']) if best['cores'] else 'any'
+    print(f"Best configuration: {best['intra_op_threads']} intra-op / {best['inter_op_threads']} inter-op threads on cores {best_cores}")
+    print("-" * (len(f"--- CPU Thread Scaling for {profiler_name} ---") -1))
+
+
+def print_input_pool_summary(input_pool, profiler_name):
+    if not input_pool:
+        return
+
+    pinned_note = ", pinned host memory" if input_pool.get('pinned') else ""
+    print(f"{profiler_name} input pool: {input_pool['size']} tensors, {input_pool['bytes'] / (1024 * 1024):.2f} MiB{pinned_note}, "
+          f"generated in {input_pool['generation_ms']:.3f} ms (excluded from the timed run)")
+
+
+def print_training_summary(training, profiler_name):
+    if not training:
+        return
+
+    print(f"\n--- Training Summary for {profiler_name} ---")
+    print(f"Samples trained:   {training['samples']} ({training['samples_per_s']:.1f} samples/s)")
+    if training.get('epoch_losses'):
+        print(f"Epoch loss:        {training['epoch_losses'][0]:.4f} (first) -> {training['epoch_losses'][-1]:.4f} (last)")
+    if 'peak_memory_mb' in training:
+        print(f"Peak memory:       {training['peak_memory_mb']:.1f} MiB")
+    data_info = training.get('synthetic_data')
+    if data_info:
+        location = f"on disk ({'cached' if data_info['cached'] else 'generated'})" if data_info['storage'] == 'disk' else "in memory"
+        print(f"Training data:     {data_info['bytes'] / (1024 * 1024):.1f} MiB {location}, seed {data_info['seed']}")
+    loader_summary = training.get('data_loader')
+    if loader_summary:
+        print("Data loader overhead (one epoch of fetching, outside the timed run):")
+        for name, stats in loader_summary['loaders'].items():
+            selected_marker = " (selected)" if name == loader_summary['selected'] else ""
+            print(f"  {name + selected_marker:<25} {stats['ms_per_batch']:>10.4f} ms/batch {stats['share_of_step'] * 100:>6.1f}% of a step")
+    breakdown = training.get('step_breakdown')
+    if breakdown:
+        step_latency = breakdown['step_latency']
+        print(f"Step latency:      mean {step_latency['mean_ms']:.4f} ms, p50 {step_latency['p50_ms']:.4f} ms, "
+              f"p99 {step_latency['p99_ms']:.4f} ms over {breakdown['steps']} steps")
+        print(f"{'Phase':<10} {'Mean ms':>10} {'P50 ms':>10} {'P99 ms':>10} {'Share':>7}")
+        for name, phase in breakdown['phases'].items():
+            print(f"{name:<10} {phase['mean_ms']:>10.4f} {phase['p50_ms']:>10.4f} {phase['p99_ms']:>10.4f} {phase['share'] * 100:>6.1f}%")
+        if breakdown['bound'] == 'loader':
+            print(f"Loader-bound: {breakdown['phases']['fetch']['share'] * 100:.1f}% of every step is spent waiting for the batch.")
+        else:
+            print("Compute-bound: forward, loss, backward and optimizer dominate the step.")
+    print("-" * (len(f"--- Training Summary for {profiler_name} ---") -1))
+
+
+def print_training_variants(variants, profiler_name):
+    if not variants:
+        return
+
+    print(f"\n--- Training Variants for {profiler_name} ---")
+    print(f"{'Variant':<45} {'Samples/s':>12} {'Speedup':>8} {'Peak MiB':>10} {'Memory':>8} {'Final loss':>11}")
+    for variant in variants:
+        if variant['memory_ratio'] is not None:
+            memory = f"{variant['peak_memory_mb']:>10.1f} {variant['memory_ratio']:>7.2f}x"
+        else:
+            memory = f"{'n/a':>10} {'n/a':>8}"
+        print(f"{variant['name']:<45} {variant['samples_per_s']:>12.1f} {variant['speedup']:>7.2f}x {memory} {variant['final_loss']:>11.4f}")
+    print("-" * (len(f"--- Training Variants for {profiler_name} ---") -1))
+
+
+def print_batch_sweep_summary(sweep, profiler_name):
+    if not sweep or not sweep.get('results'):
+        return
+
+    print(f"\n--- Batch Size Sweep for {profiler_name} ---")
+    print(f"{'Batch':>6} {'Samples/s':>12} {'Batch mean':>12} {'Batch p99':>12} {'Per sample':>12}")
+    for result in sweep['results']:
+        knee_marker = "  <- knee" if result.get('knee') else ""
+        print(f"{result['batch_size']:>6} {result['samples_per_s']:>12.1f} {result['batch_latency_mean_ms']:>9.4f} ms "
+              f"{result['batch_latency_p99_ms']:>9.4f} ms {result['sample_latency_mean_ms']:>9.4f} ms{knee_marker}")
+    print(f"Peak throughput:   {sweep['peak_samples_per_s']:.1f} samples/s")
+    print(f"Throughput knee:   batch size {sweep['knee_batch_size']} (first size within 90% of peak)")
+    print("-" * (len(f"--- Batch Size Sweep for {profiler_name} ---") -1))
+
+
 def main():
     parser = argparse.ArgumentParser(description='Lightframe: ML Framework Speed Comparison Tool')
     parser.add_argument('--config', type=str, default='./configs/network_config.json',
                         help='Path to the configuration file')
+    parser.add_argument('--clock-check', action='store_true',
+                        help='Measure the timestamp offset and resolution between the profilers and the power sampler first')
     args = parser.parse_args()
     config_path = args.config
 
@@ -50,10 +420,15 @@ def main():
         print("Exiting due to invalid config file.")
         exit(1)
 
+    config_file_name_base = os.path.splitext(os.path.basename(config_path))[0]
+    config_path, config_data = tune_training_batch_size(config_data, config_path, config_file_name_base)
+
+    network_analysis, _ = analyze_config(config_data)  # Shape errors were already rejected by validate_config
+    print_network_analysis(network_analysis)
+
     logs_dir = './logs'
     os.makedirs(logs_dir, exist_ok=True)
 
-    config_file_name_base = os.path.splitext(os.path.basename(config_path))[0]
     try:
         mode = config_data['network']['mode']
     except KeyError:
@@ -69,13 +444,20 @@ def main():
 
     power_logging_enabled = False
     logging_interval = 1.0
+    power_config = {}
+    export_power_csv = False
+    idle_baseline_s = 0
+    telemetry_enabled = False
 
     try:
         power_config = config_data['network']['power_measurement']
         if power_config['status'] == 'on':
             power_logging_enabled = True
             logging_interval = power_config['logging_interval']
-            print(f"Power measurement status from config: ON (Interval: {logging_interval}s)")
+            export_power_csv = power_config.get('export_csv', False)
+            idle_baseline_s = power_config.get('idle_baseline_s', 0)
+            telemetry_enabled = power_config.get('telemetry', False)
+            print(f"Power measurement status from config: ON (Interval: {logging_interval}s, source: {power_config.get('source', 'jtop')})")
         else:
             print("Power measurement status from config: OFF")
     except KeyError as e:
@@ -83,76 +465,127 @@ def main():
         power_logging_enabled = False
 
 
+    if args.clock_check:
+        run_clock_check([("Python (PyTorch)", ['python3', './python/profiler.py']), ("C++ (LibTorch)", ['./cpp/build/profiler'])])
+
     # --- Python Profiler ---
     python_executable = 'python3'
     python_script_path = './python/profiler.py'
-    python_log_filename = f"python_{config_file_name_base}_{mode}_{device}_{timestamp}_power_log.txt"
+    python_log_filename = f"python_{config_file_name_base}_{mode}_{device}_{timestamp}_power_log.bin"
     python_power_log_path = os.path.join(logs_dir, python_log_filename)
     python_command_args = [python_executable, python_script_path, '-c', config_path]
+    python_telemetry_path = python_power_log_path[:-len('.bin')] + '_telemetry.bin' if telemetry_enabled else None
+
+    py_baseline = None
+    if power_logging_enabled and idle_baseline_s > 0:
+        py_baseline = measure_idle_baseline(power_config, python_power_log_path[:-len('.bin')] + '_idle_baseline.bin',
+                                            logging_interval, idle_baseline_s, "Python (PyTorch)")
 
-    py_rc, py_start_time, py_end_time = run_profiler_task(
+    py_rc, py_start_time, py_end_time, py_metrics = run_profiler_task(
         profiler_name="Python (PyTorch)",
         executable_path_args=python_command_args,
         config_path_for_error_msg=config_path,
         power_log_file_path=python_power_log_path,
         power_logging_enabled=power_logging_enabled,
         logging_interval=logging_interval,
-        log_power_func=log_power
+        log_power_func=log_power,
+        power_source=create_power_source(power_config) if power_logging_enabled else None,
+        events_file_path=python_power_log_path[:-len('.bin')] + '_events.jsonl',
+        telemetry_file_path=python_telemetry_path
     )
+    print_latency_summary(py_metrics.get('latency'), "Python (PyTorch)")
+    print_input_pool_summary(py_metrics.get('input_pool'), "Python (PyTorch)")
+    print_throughput_summary(network_analysis, config_data, py_start_time, py_end_time, "Python (PyTorch)")
+    print_layer_hotspots(py_metrics.get('layer_profile'), "Python (PyTorch)")
+    print_backend_comparison(py_metrics.get('backends'), "Python (PyTorch)")
+    print_precision_comparison(py_metrics.get('precisions'), "Python (PyTorch)")
+    print_graph_optimization_summary(py_metrics.get('graph_optimization'), "Python (PyTorch)")
+    print_serving_summary(py_metrics.get('serving'), "Python (PyTorch)")
+    print_multi_stream_summary(py_metrics.get('multi_stream'), "Python (PyTorch)")
+    print_thread_sweep_summary(py_metrics.get('thread_sweep'), "Python (PyTorch)")
+    print_batch_sweep_summary(py_metrics.get('batch_sweep'), "Python (PyTorch)")
+    print_training_summary(py_metrics.get('training'), "Python (PyTorch)")
+    print_training_variants((py_metrics.get('training') or {}).get('variants'), "Python (PyTorch)")
 
     if power_logging_enabled and py_start_time is not None and py_end_time is not None:
-        # TRIM the log file before loading for analysis
-        print(f"\nTrimming power log '{python_power_log_path}' for Python (PyTorch) interval...")
-        trim_power_log_file(python_power_log_path, py_start_time, py_end_time)
-
-        print(f"Attempting power analysis for Python (PyTorch)...")
-        py_power_data = load_power_log(python_power_log_path) # Now loads the trimmed file
+        print(f"\nAttempting power analysis for Python (PyTorch)...")
+        # Only the profiler's timed window of the trace is mapped, the trace file itself is left untouched
+        py_power_data = load_power_log(python_power_log_path, py_start_time, py_end_time)
+        if export_power_csv and py_power_data is not None:
+            export_csv(py_power_data, python_power_log_path[:-len('.bin')] + '.csv')
         # analyze_power_consumption will use py_start_time and py_end_time for duration,
-        # and py_power_data (which is already trimmed) for power metrics.
+        # and py_power_data (already limited to that window) for power metrics.
         py_analysis_results = analyze_power_consumption(
             power_data=py_power_data,
             config_data=config_data,
             start_time_ns=py_start_time,
-            end_time_ns=py_end_time
+            end_time_ns=py_end_time,
+            baseline=py_baseline
         )
+        py_analysis_results['telemetry'] = analyze_run_telemetry(power_config, python_telemetry_path, py_start_time, py_end_time)
         print_power_analysis_summary(py_analysis_results, "Python (PyTorch)")
+        # Phases such as data generation and warmup lie outside the timed window, so they need the whole trace
+        print_phase_energy_summary(analyze_phases(load_power_log(python_power_log_path), py_metrics.get('phases'), py_baseline), "Python (PyTorch)")
     elif power_logging_enabled:
-        print("\nSkipping Python (PyTorch) power analysis and log trimming: Profiler start/end times not captured, or power logging was initially off.")
+        print("\nSkipping Python (PyTorch) power analysis: Profiler start/end times not captured, or power logging was initially off.")
+
+    export_run_timeline(config_data['network'].get('timeline_trace'), python_power_log_path, python_telemetry_path, py_metrics, "Python (PyTorch)")
 
 
     # --- C++ Profiler ---
     print("\n" + "="*60)
     cpp_executable_path = './cpp/build/profiler'
-    cpp_log_filename = f"cpp_{config_file_name_base}_{mode}_{device}_{timestamp}_power_log.txt"
+    cpp_log_filename = f"cpp_{config_file_name_base}_{mode}_{device}_{timestamp}_power_log.bin"
     cpp_power_log_path = os.path.join(logs_dir, cpp_log_filename)
     cpp_command_args = [cpp_executable_path, '-c', config_path]
+    cpp_telemetry_path = cpp_power_log_path[:-len('.bin')] + '_telemetry.bin' if telemetry_enabled else None
 
-    cpp_rc, cpp_start_time, cpp_end_time = run_profiler_task(
+    cpp_baseline = None
+    if power_logging_enabled and idle_baseline_s > 0:
+        cpp_baseline = measure_idle_baseline(power_config, cpp_power_log_path[:-len('.bin')] + '_idle_baseline.bin',
+                                             logging_interval, idle_baseline_s, "C++ (LibTorch)")
+
+    cpp_rc, cpp_start_time, cpp_end_time, cpp_metrics = run_profiler_task(
         profiler_name="C++ (LibTorch)",
         executable_path_args=cpp_command_args,
         config_path_for_error_msg=config_path,
         power_log_file_path=cpp_power_log_path,
         power_logging_enabled=power_logging_enabled,
         logging_interval=logging_interval,
-        log_power_func=log_power
+        log_power_func=log_power,
+        power_source=create_power_source(power_config) if power_logging_enabled else None,
+        events_file_path=cpp_power_log_path[:-len('.bin')] + '_events.jsonl',
+        telemetry_file_path=cpp_telemetry_path
     )
+    print_latency_summary(cpp_metrics.get('latency'), "C++ (LibTorch)")
+    print_input_pool_summary(cpp_metrics.get('input_pool'), "C++ (LibTorch)")
+    print_throughput_summary(network_analysis, config_data, cpp_start_time, cpp_end_time, "C++ (LibTorch)")
+    print_batch_sweep_summary(cpp_metrics.get('batch_sweep'), "C++ (LibTorch)")
+    print_training_summary(cpp_metrics.get('training'), "C++ (LibTorch)")
 
     if power_logging_enabled and cpp_start_time is not None and cpp_end_time is not None:
-        # TRIM the log file before loading for analysis
-        print(f"\nTrimming power log '{cpp_power_log_path}' for C++ (LibTorch) interval...")
-        trim_power_log_file(cpp_power_log_path, cpp_start_time, cpp_end_time)
-
-        print(f"Attempting power analysis for C++ (LibTorch)...")
-        cpp_power_data = load_power_log(cpp_power_log_path) # Now loads the trimmed file
+        print(f"\nAttempting power analysis for C++ (LibTorch)...")
+        # Only the profiler's timed window of the trace is mapped, the trace file itself is left untouched
+        cpp_power_data = load_power_log(cpp_power_log_path, cpp_start_time, cpp_end_time)
+        if export_power_csv and cpp_power_data is not None:
+            export_csv(cpp_power_data, cpp_power_log_path[:-len('.bin')] + '.csv')
         cpp_analysis_results = analyze_power_consumption(
             power_data=cpp_power_data,
             config_data=config_data,
             start_time_ns=cpp_start_time,
-            end_time_ns=cpp_end_time
+            end_time_ns=cpp_end_time,
+            baseline=cpp_baseline
         )
+        cpp_analysis_results['telemetry'] = analyze_run_telemetry(power_config, cpp_telemetry_path, cpp_start_time, cpp_end_time)
         print_power_analysis_summary(cpp_analysis_results, "C++ (LibTorch)")
+        # Phases such as data generation and warmup lie outside the timed window, so they need the whole trace
+        print_phase_energy_summary(analyze_phases(load_power_log(cpp_power_log_path), cpp_metrics.get('phases'), cpp_baseline), "C++ (LibTorch)")
     elif power_logging_enabled:
-        print("\nSkipping C++ (LibTorch) power analysis and log trimming: Profiler start/end times not captured, or power logging was initially off.")
+        print("\nSkipping C++ (LibTorch) power analysis: Profiler start/end times not captured, or power logging was initially off.")
+
+    export_run_timeline(config_data['network'].get('timeline_trace'), cpp_power_log_path, cpp_telemetry_path, cpp_metrics, "C++ (LibTorch)")
+
+    print_baseline_drift(py_baseline, cpp_baseline, power_config.get('baseline_drift_tolerance', 0.05))
 
     print("\nAll profiling tasks complete.")
 
@@ -1,50 +1,171 @@
 import time
-import psutil
-import threading
-from jtop import jtop
+import os
+import multiprocessing
+from contextlib import ExitStack
+from power_sources import JtopSource
+from power_trace import PowerTraceWriter, TelemetryTraceWriter
+from telemetry import Telemetry
 
-def log_power(pid, stop_event, log_file="power_log.txt", interval=0.5):
+MAX_RAILS = 16
+MAX_TELEMETRY_COLUMNS = 256
+RING_BUFFER_SECONDS = 8
+FLUSH_INTERVAL_S = 0.25
+SAMPLER_STARTUP_TIMEOUT_S = 30
+
+class PowerRingBuffer:
+    # Fixed-size records in shared memory: an int64 timestamp plus float32 values (total and per-rail power, or
+    # telemetry). The sampler process is the only writer and advances write_count once a record is complete.
+    def __init__(self, context, capacity, columns=1 + MAX_RAILS):
+        self.capacity = capacity
+        self.columns = columns
+        self.timestamps_ns = context.RawArray('q', capacity)
+        self.values_mw = context.RawArray('f', capacity * self.columns)
+        self.write_count = context.RawValue('q', 0)
+
+    def write(self, timestamp_ns, values):
+        slot = self.write_count.value % self.capacity
+        offset = slot * self.columns
+        self.timestamps_ns[slot] = timestamp_ns
+        self.values_mw[offset:offset + len(values)] = values
+        self.write_count.value += 1
+
+    def read_since(self, read_count, no_values):
+        # Returns the records written since read_count, the new read count and the number of records lost
+        # because the writer lapped the reader
+        write_count = self.write_count.value
+        first = max(read_count, write_count - self.capacity)
+        records = []
+        for count in range(first, write_count):
+            slot = count % self.capacity
+            offset = slot * self.columns
+            records.append((self.timestamps_ns[slot], self.values_mw[offset:offset + no_values]))
+        # Drop records that were overwritten while they were being copied
+        overwritten = self.write_count.value - self.capacity - first
+        if overwritten > 0:
+            records = records[overwritten:]
+            first += overwritten
+        return records, write_count, first - read_count
+
+def run_sampler(power_source, ring_buffer, interval_ns, stop_event, status_pipe, telemetry=None, telemetry_buffer=None):
+    # Low priority, so the sampler never competes with the workload it measures
     try:
-        p = psutil.Process(pid)
-    except psutil.NoSuchProcess:
-        print(f"Error: Process with PID {pid} not found at logger start.")
+        os.nice(10)
+    except (AttributeError, OSError):
+        pass
+
+    try:
+        power_source.open()
+    except Exception as e:
+        status_pipe.send(('error', str(e)))
         return
-    except psutil.AccessDenied:
-         print(f"Error: Permission denied to access process PID {pid}.")
-         return
+    rails = power_source.rails[:MAX_RAILS]
 
+    telemetry_columns = []
+    if telemetry is not None:
+        try:
+            telemetry.open()
+            telemetry_columns = telemetry.columns[:MAX_TELEMETRY_COLUMNS]
+        except Exception as e:
+            print(f"Warning: could not open system telemetry, sampling power only: {e}")
+            telemetry = None
+    status_pipe.send(('ready', (rails, telemetry_columns)))
 
-    print(f"Logger thread started for PID {pid}. Logging to {log_file}")
+    missed_ticks = 0
     try:
-        with jtop() as jetson, open(log_file, "w") as f:
-            f.write("timestamp_ns,power_tot_mw\n")
-
-            while not stop_event.is_set():
-                if not psutil.pid_exists(pid):
-                     print(f"Logger: Process {pid} disappeared.")
-                     break
-
-                try:
-                    if not p.is_running():
-                        print(f"Logger: Process {pid} is no longer running.")
-                        break
-                except psutil.NoSuchProcess:
-                    print(f"Logger: Process {pid} disappeared (NoSuchProcess during is_running check).")
-                    break
+        # Ticks sit on an absolute monotonic grid, so the time spent reading never accumulates as drift
+        next_tick_ns = time.monotonic_ns()
+        while not stop_event.is_set():
+            if power_source.ok():
+                timestamp_ns = time.monotonic_ns()
+                readings = power_source.read()
+                ring_buffer.write(timestamp_ns, [readings['total']] + [readings.get(rail, 0.0) for rail in rails])
+                if telemetry_columns:
+                    # Same timestamp as the power record, so both traces line up sample for sample
+                    telemetry_buffer.write(timestamp_ns, telemetry.read()[:MAX_TELEMETRY_COLUMNS])
+            next_tick_ns += interval_ns
+            now_ns = time.monotonic_ns()
+            if now_ns >= next_tick_ns:
+                # Behind schedule: skip the missed ticks instead of sampling in a burst to catch up
+                skipped = (now_ns - next_tick_ns) // interval_ns + 1
+                missed_ticks += skipped
+                next_tick_ns += skipped * interval_ns
+            time.sleep(max(0, next_tick_ns - time.monotonic_ns()) / 1e9)
+    finally:
+        power_source.close()
+        if telemetry is not None:
+            telemetry.close()
+        status_pipe.send(('done', missed_ticks))
+
+def flush_records(trace_writer, ring_buffer, read_count, no_values):
+    records, read_count, lost = ring_buffer.read_since(read_count, no_values)
+    trace_writer.write_records(records)
+    return read_count, lost
+
+def log_power(pid, stop_event, log_file="power_log.bin", interval=0.5, power_source=None, max_duration_s=None,
+              telemetry_file=None):
+    # Runs as a thread of the parent: samples are taken by a separate process and only flushed to disk here.
+    # Stops when stop_event is set or, if given, max_duration_s after the first sample.
+    # With telemetry_file, system telemetry is sampled on the same ticks and written to that trace.
+    if power_source is None:
+        power_source = JtopSource()
 
-                if jetson.ok():
-                    stats = jetson.stats
-                    power = stats.get('Power TOT', 0)
-                    timestamp = int(time.time() * 1e9)
-                    f.write(f"{timestamp},{power}\n")
-                    # flush buffer periodically if real-time view is needed
-                    # f.flush()
-                else:
-                    print("Warning: jtop is not ok(). Skipping power reading.")
+    context = multiprocessing.get_context('spawn')
+    capacity = max(1024, int(RING_BUFFER_SECONDS / interval))
+    ring_buffer = PowerRingBuffer(context, capacity)
+    telemetry = Telemetry(pid) if telemetry_file is not None else None
+    telemetry_buffer = PowerRingBuffer(context, capacity, MAX_TELEMETRY_COLUMNS) if telemetry is not None else None
+    sampler_stop_event = context.Event()
+    status_receiver, status_sender = context.Pipe(duplex=False)
+    sampler = context.Process(target=run_sampler, daemon=True,
+                              args=(power_source, ring_buffer, int(interval * 1e9), sampler_stop_event, status_sender,
+                                    telemetry, telemetry_buffer))
 
-                stop_event.wait(timeout=interval)
+    print(f"Logger thread started for PID {pid}. Logging to {log_file} (power source: {power_source.name}, interval: {interval * 1000:g} ms)")
+    lost_records = 0
+    try:
+        sampler.start()
+        if not status_receiver.poll(SAMPLER_STARTUP_TIMEOUT_S):
+            print(f"Error: power sampler did not start within {SAMPLER_STARTUP_TIMEOUT_S} s.")
+            return
+        status, payload = status_receiver.recv()
+        if status == 'error':
+            print(f"Error: could not open power source '{power_source.name}': {payload}")
+            return
+        rails, telemetry_columns = payload
+        no_values = 1 + len(rails)
+
+        with ExitStack() as stack:
+            trace_writer = stack.enter_context(PowerTraceWriter(log_file, rails))
+            telemetry_writer = None
+            if telemetry_columns:
+                telemetry_writer = stack.enter_context(TelemetryTraceWriter(telemetry_file, telemetry_columns))
+                print(f"Sampling system telemetry ({len(telemetry_columns)} columns) to {telemetry_file}")
+            read_count = 0
+            telemetry_read_count = 0
+            deadline_ns = time.monotonic_ns() + int(max_duration_s * 1e9) if max_duration_s is not None else None
+            while True:
+                stopping = stop_event.wait(timeout=FLUSH_INTERVAL_S) or (deadline_ns is not None and time.monotonic_ns() >= deadline_ns)
+                if stopping:
+                    sampler_stop_event.set()
+                    sampler.join(timeout=10)
+                read_count, lost = flush_records(trace_writer, ring_buffer, read_count, no_values)
+                lost_records += lost
+                if telemetry_writer is not None:
+                    telemetry_read_count, lost = flush_records(telemetry_writer, telemetry_buffer, telemetry_read_count, len(telemetry_columns))
+                if stopping:
+                    break
 
+        if status_receiver.poll(1):
+            status, missed_ticks = status_receiver.recv()
+            if missed_ticks > 0:
+                print(f"Warning: the power sampler missed {missed_ticks} of its {interval * 1000:g} ms ticks.")
+        if lost_records > 0:
+            print(f"Warning: {lost_records} power samples were overwritten in the ring buffer before they were flushed.")
+        print(f"Logged {read_count - lost_records} power samples.")
     except Exception as e:
         print(f"Error during power logging for PID {pid}: {e}")
     finally:
-        print(f"Power logging loop finished for PID {pid}. Power log saved to {log_file}")
\ No newline at end of file
+        sampler_stop_event.set()
+        if sampler.is_alive():
+            sampler.join(timeout=10)
+        print(f"Power logging loop finished for PID {pid}. Power log saved to {log_file}")
@@ -1,96 +1,211 @@
 import csv
 import sys
-import os
+import numpy as np
+from power_trace import load_power_trace, record_dtype, slice_time_window
 
-def trim_power_log_file(power_log_file_path, start_time_ns, end_time_ns):
-    if not os.path.exists(power_log_file_path):
-        return
-
-    scoped_rows = []
-
-    try:
-        with open(power_log_file_path, 'r', newline='') as infile:
-            reader = csv.reader(infile)
-            try:
-                header_row = next(reader)
-                scoped_rows.append(header_row)
-            except StopIteration:
-                return
-
-            for row_str_list in reader:
-                if len(row_str_list) == 2:
-                    try:
-                        timestamp_ns_val = int(row_str_list[0])
-                        if start_time_ns <= timestamp_ns_val <= end_time_ns:
-                            scoped_rows.append(row_str_list)
-                    except ValueError:
-                        pass
-
-    except IOError:
-        return
-    except Exception:
-        return
-
-    temp_file_path = power_log_file_path + ".tmp"
-    try:
-        with open(temp_file_path, 'w', newline='') as outfile:
-            writer = csv.writer(outfile)
-            writer.writerows(scoped_rows)
-
-        os.replace(temp_file_path, power_log_file_path)
-    except (IOError, OSError) as e:
-        if os.path.exists(temp_file_path):
-            try:
-                os.remove(temp_file_path)
-            except OSError:
-                pass
-            
-    except Exception:
-        if os.path.exists(temp_file_path):
-            try:
-                os.remove(temp_file_path)
-            except OSError:
-                pass
-
-def load_power_log(power_log_file_path):
-    power_data = []
+def load_power_log(power_log_file_path, start_time_ns=None, end_time_ns=None):
+    # Returns the samples in [start_time_ns, end_time_ns], plus the nearest sample on either side for interpolating
+    # the window edges, as a structured array with a 'timestamp_ns', a 'power_tot_mw' and one '<rail>_mw' field per
+    # rail. Binary traces are memory-mapped and windowed without being rewritten; CSV logs (as exported by
+    # power_trace.py) are parsed in full.
     try:
-        with open(power_log_file_path, 'r', newline='') as f:
-            reader = csv.reader(f)
-            try:
-                header = next(reader)
-            except StopIteration:
-                print(f"Info (power_analyzer): Power log file {power_log_file_path} is empty or contains only a header.", file=sys.stderr)
-                return []
-
-            expected_header = ['timestamp_ns', 'power_tot_mw']
-            if header != expected_header:
-                 print(f"Warning (power_analyzer): Power log header is '{header}', expected '{expected_header}'. "
-                       "Proceeding by assuming format is <timestamp_nanoseconds>,<power_milliwatts>.", file=sys.stderr)
-
-            for i, row in enumerate(reader):
-                if len(row) != 2:
-                    print(f"Warning (power_analyzer): Skipping malformed row {i+2} (file line number) in {power_log_file_path}: {row}", file=sys.stderr)
-                    continue
-                try:
-                    timestamp_ns = int(row[0])
-                    power_mw = float(row[1])
-                    power_data.append((timestamp_ns, power_mw))
-                except ValueError:
-                    print(f"Warning (power_analyzer): Skipping row {i+2} (file line number) with invalid numeric data in {power_log_file_path}: {row}", file=sys.stderr)
-                    continue
-
-        power_data.sort(key=lambda x: x[0])
-        return power_data
+        if power_log_file_path.endswith('.csv'):
+            power_data = load_power_csv(power_log_file_path)
+        else:
+            power_data = load_power_trace(power_log_file_path)
     except FileNotFoundError:
         print(f"Error (power_analyzer): Power log file not found at {power_log_file_path}", file=sys.stderr)
-        return []
+        return None
     except Exception as e:
         print(f"Error (power_analyzer): Loading power log file {power_log_file_path}: {e}", file=sys.stderr)
+        return None
+
+    if len(power_data) == 0:
+        print(f"Info (power_analyzer): Power log file {power_log_file_path} contains no samples.", file=sys.stderr)
+        return power_data
+    if start_time_ns is not None and end_time_ns is not None:
+        power_data = slice_time_window(power_data, start_time_ns, end_time_ns, margin=1)
+    return power_data
+
+def load_power_csv(power_log_file_path):
+    with open(power_log_file_path, 'r', newline='') as f:
+        reader = csv.reader(f)
+        header = next(reader)
+        rails = [column[:-len('_mw')] for column in header[2:]]
+        rows = []
+        for i, row in enumerate(reader):
+            if len(row) != len(header):
+                print(f"Warning (power_analyzer): Skipping malformed row {i+2} (file line number) in {power_log_file_path}: {row}", file=sys.stderr)
+                continue
+            try:
+                rows.append((int(row[0]),) + tuple(float(value) for value in row[1:]))
+            except ValueError:
+                print(f"Warning (power_analyzer): Skipping row {i+2} (file line number) with invalid numeric data in {power_log_file_path}: {row}", file=sys.stderr)
+    power_data = np.array(rows, dtype=record_dtype(rails))
+    power_data.sort(order='timestamp_ns')
+    return power_data
+
+
+def integrate_energy(timestamps_ns, power_mw, start_time_ns, end_time_ns):
+    # Trapezoidal energy in joules over exactly [start_time_ns, end_time_ns]. The edges are linearly interpolated
+    # between the neighbouring samples (held constant if the trace does not reach past an edge). Also returns the
+    # bound on the discretization error: the power between two samples can lie anywhere between their values,
+    # which moves each trapezoid by at most half of |delta power| * delta t.
+    inside = (timestamps_ns > start_time_ns) & (timestamps_ns < end_time_ns)
+    edge_power_mw = np.interp([start_time_ns, end_time_ns], timestamps_ns, power_mw)
+    window_ns = np.concatenate(([start_time_ns], timestamps_ns[inside], [end_time_ns])).astype(np.float64)
+    window_mw = np.concatenate(([edge_power_mw[0]], power_mw[inside], [edge_power_mw[1]])).astype(np.float64)
+    intervals_ns = np.diff(window_ns)
+    energy_j = float(np.sum((window_mw[1:] + window_mw[:-1]) * intervals_ns) / 2 * 1e-12)  # mW * ns -> J
+    discretization_bound_j = float(np.sum(np.abs(np.diff(window_mw)) * intervals_ns) / 2 * 1e-12)
+    return energy_j, discretization_bound_j
+
+def analyze_energy(power_data, start_time_ns, end_time_ns):
+    results = {}
+    timestamps_ns = power_data['timestamp_ns'].astype(np.int64)
+    duration_s = (end_time_ns - start_time_ns) / 1e9
+    energy_j, discretization_bound_j = integrate_energy(timestamps_ns, power_data['power_tot_mw'], start_time_ns, end_time_ns)
+    results['total_energy_j'] = energy_j
+    # Time-weighted, so irregular sampling does not bias it towards densely sampled phases
+    results['average_power_mw'] = energy_j / duration_s * 1000.0
+
+    sampling_intervals_ms = np.diff(timestamps_ns) / 1e6
+    if len(sampling_intervals_ms) > 0:
+        results['sampling_interval_ms'] = float(sampling_intervals_ms.mean())
+        results['sampling_jitter_ms'] = float(sampling_intervals_ms.std())
+        # Timestamp jitter shifts every trapezoid edge independently, which adds up like a random walk
+        jitter_bound_j = results['average_power_mw'] / 1000.0 * results['sampling_jitter_ms'] / 1000.0 * np.sqrt(len(sampling_intervals_ms))
+    else:
+        jitter_bound_j = 0.0
+    results['energy_uncertainty_j'] = discretization_bound_j + float(jitter_bound_j)
+
+    # Fraction of the window between the first and the last sample; the rest is extrapolated
+    covered_ns = min(end_time_ns, timestamps_ns[-1]) - max(start_time_ns, timestamps_ns[0])
+    results['window_coverage'] = max(0.0, covered_ns / (end_time_ns - start_time_ns))
+
+    results['rail_energy_j'] = {}
+    for name in power_data.dtype.names[2:]:
+        rail_energy_j, _ = integrate_energy(timestamps_ns, power_data[name], start_time_ns, end_time_ns)
+        results['rail_energy_j'][name[:-len('_mw')]] = rail_energy_j
+    return results
+
+def analyze_idle_baseline(power_data):
+    # Static power of the quiescent board from a trace captured before a profiler run
+    if power_data is None or len(power_data) < 2:
+        return None
+    timestamps_ns = power_data['timestamp_ns'].astype(np.int64)
+    start_time_ns, end_time_ns = int(timestamps_ns[0]), int(timestamps_ns[-1])
+    if end_time_ns <= start_time_ns:
+        return None
+    duration_s = (end_time_ns - start_time_ns) / 1e9
+    power_mw = power_data['power_tot_mw'].astype(np.float64)
+    energy_j, _ = integrate_energy(timestamps_ns, power_mw, start_time_ns, end_time_ns)
+    baseline = {
+        'duration_s': duration_s,
+        'num_samples': len(power_data),
+        'power_mw': energy_j / duration_s * 1000.0,
+        'std_mw': float(power_mw.std()),
+        # Standard error of the baseline mean, which carries over into the dynamic energy
+        'sem_mw': float(power_mw.std() / np.sqrt(len(power_mw))),
+        'rail_power_mw': {},
+    }
+    for name in power_data.dtype.names[2:]:
+        rail_energy_j, _ = integrate_energy(timestamps_ns, power_data[name], start_time_ns, end_time_ns)
+        baseline['rail_power_mw'][name[:-len('_mw')]] = rail_energy_j / duration_s * 1000.0
+    return baseline
+
+def baseline_drift(first_baseline, second_baseline, tolerance):
+    # Relative change of the idle power between two baselines, flagged when it exceeds the tolerance
+    if not first_baseline or not second_baseline or first_baseline['power_mw'] <= 0:
+        return None
+    drift = (second_baseline['power_mw'] - first_baseline['power_mw']) / first_baseline['power_mw']
+    return {'drift': drift, 'tolerance': tolerance, 'flagged': abs(drift) > tolerance}
+
+def apply_idle_baseline(results, baseline):
+    # Dynamic power and energy: what the workload adds on top of the static board power
+    duration_s = results['total_duration_s']
+    results['baseline_power_mw'] = baseline['power_mw']
+    results['dynamic_average_power_mw'] = results['average_power_mw'] - baseline['power_mw']
+    results['dynamic_energy_j'] = results['total_energy_j'] - baseline['power_mw'] / 1000.0 * duration_s
+    results['dynamic_energy_uncertainty_j'] = results['energy_uncertainty_j'] + baseline['sem_mw'] / 1000.0 * duration_s
+    results['rail_dynamic_energy_j'] = {}
+    for rail, rail_energy_j in results['rail_energy_j'].items():
+        if rail in baseline['rail_power_mw']:
+            results['rail_dynamic_energy_j'][rail] = rail_energy_j - baseline['rail_power_mw'][rail] / 1000.0 * duration_s
+
+def analyze_phases(power_data, phases, baseline=None):
+    # Energy and average power of every phase span reported on the profiler's event channel.
+    # power_data is the full trace, each phase is windowed out of it like the timed run.
+    if power_data is None or len(power_data) < 2 or not phases:
         return []
+    phase_results = []
+    for phase in phases:
+        start_time_ns, end_time_ns = phase['start_ns'], phase['end_ns']
+        if end_time_ns <= start_time_ns:
+            continue
+        window = slice_time_window(power_data, start_time_ns, end_time_ns, margin=1)
+        if len(window) < 2:
+            continue
+        duration_s = (end_time_ns - start_time_ns) / 1e9
+        energy_j, discretization_bound_j = integrate_energy(window['timestamp_ns'].astype(np.int64), window['power_tot_mw'],
+                                                            start_time_ns, end_time_ns)
+        result = {key: value for key, value in phase.items() if key not in ('start_ns', 'end_ns')}
+        result['duration_s'] = duration_s
+        result['energy_j'] = energy_j
+        result['energy_uncertainty_j'] = discretization_bound_j
+        result['average_power_mw'] = energy_j / duration_s * 1000.0
+        # Fewer samples than two per phase means the energy is mostly interpolated
+        result['num_samples'] = int(np.count_nonzero((window['timestamp_ns'] >= start_time_ns) & (window['timestamp_ns'] <= end_time_ns)))
+        if baseline:
+            result['dynamic_energy_j'] = energy_j - baseline['power_mw'] / 1000.0 * duration_s
+        phase_results.append(result)
+    return phase_results
+
+def analyze_telemetry(telemetry_data, start_time_ns, end_time_ns, temperature_limit_c=85.0, frequency_drop=0.15,
+                      busy_utilization_pct=50.0):
+    # Min/mean/max of every telemetry column over the timed window, plus throttling events: a thermal zone at or
+    # above temperature_limit_c, or a CPU policy or the GPU running more than frequency_drop below the highest
+    # frequency it reached during the run while busy. Idle clusters are expected to clock down, so a frequency
+    # sample only counts when the policy's first CPU (or the GPU) is at least busy_utilization_pct utilized.
+    if telemetry_data is None or len(telemetry_data) == 0:
+        return None
+    window = slice_time_window(telemetry_data, start_time_ns, end_time_ns)
+    if len(window) == 0:
+        return None
+    timestamps_ns = window['timestamp_ns'].astype(np.int64)
+    names = window.dtype.names[1:]
+    results = {'num_samples': len(window), 'columns': {}, 'throttling': []}
+    for name in names:
+        values = window[name].astype(np.float64)
+        results['columns'][name] = {'min': float(values.min()), 'mean': float(values.mean()), 'max': float(values.max())}
 
+        if name.startswith('temp_'):
+            above = values >= temperature_limit_c
+            if above.any():
+                results['throttling'].append({
+                    'column': name, 'kind': 'temperature', 'limit': temperature_limit_c, 'peak': float(values.max()),
+                    'share': float(above.mean()), 'first_offset_s': (int(timestamps_ns[above][0]) - start_time_ns) / 1e9,
+                })
+        elif name.startswith('cpufreq_policy') or name == 'gpu_freq_mhz':
+            reference = float(telemetry_data[name].max())
+            if reference <= 0:
+                continue
+            if name == 'gpu_freq_mhz':
+                utilization_column = 'gpu_util_pct'
+            else:
+                utilization_column = f"cpu{name[len('cpufreq_policy'):-len('_mhz')]}_util_pct"
+            busy = window[utilization_column] >= busy_utilization_pct if utilization_column in names else np.ones(len(window), dtype=bool)
+            below = busy & (values < (1 - frequency_drop) * reference)
+            if below.any():
+                results['throttling'].append({
+                    'column': name, 'kind': 'frequency', 'limit': (1 - frequency_drop) * reference, 'reference': reference,
+                    'low': float(values[below].min()), 'share': float(below.sum() / max(1, busy.sum())),
+                    'first_offset_s': (int(timestamps_ns[below][0]) - start_time_ns) / 1e9,
+                })
+    return results
 
-def analyze_power_consumption(power_data, config_data, start_time_ns, end_time_ns):
+def analyze_power_consumption(power_data, config_data, start_time_ns, end_time_ns, baseline=None):
+    # baseline: optional result of analyze_idle_baseline for the same power source
     results = {}
 
     if start_time_ns >= end_time_ns:
@@ -106,17 +221,20 @@ def analyze_power_consumption(power_data, config_data, start_time_ns, end_time_n
 
     results['total_duration_s'] = (end_time_ns - start_time_ns) / 1_000_000_000.0
 
-    if not power_data:
+    if power_data is None or len(power_data) == 0:
         results['error'] = "No power data points found within the profiler's time interval."
         results['average_power_mw'] = 'N/A'
         results['min_power_mw'] = 'N/A'
         results['max_power_mw'] = 'N/A'
     else:
-        power_values_in_scope = [p_mw for ts_ns, p_mw in power_data]
-        
-        results['average_power_mw'] = sum(power_values_in_scope) / len(power_values_in_scope)
-        results['min_power_mw'] = min(power_values_in_scope)
-        results['max_power_mw'] = max(power_values_in_scope)
+        in_window = (power_data['timestamp_ns'] >= start_time_ns) & (power_data['timestamp_ns'] <= end_time_ns)
+        power_values_in_scope = power_data['power_tot_mw'][in_window] if in_window.any() else power_data['power_tot_mw']
+
+        results.update(analyze_energy(power_data, start_time_ns, end_time_ns))
+        if baseline is not None:
+            apply_idle_baseline(results, baseline)
+        results['min_power_mw'] = float(power_values_in_scope.min())
+        results['max_power_mw'] = float(power_values_in_scope.max())
 
     num_operations = 0.0
     operation_unit = "operation"
@@ -126,7 +244,12 @@ def analyze_power_consumption(power_data, config_data, start_time_ns, end_time_n
         net_config = config_data['network']
         mode = net_config['mode']
         if mode == 'inference':
-            num_operations = float(net_config['inference_params']['no_inferences'])
+            ip = net_config['inference_params']
+            if ip.get('batch_sizes'):
+                # Batch-size sweep: every size runs ceil(no_inferences / batch_size) full batches
+                num_operations = float(sum(-(-ip['no_inferences'] // size) * size for size in ip['batch_sizes']))
+            else:
+                num_operations = float(ip['no_inferences'])
             operation_unit = "inference"
         elif mode == 'training':
             tp = net_config['training_params']
@@ -144,10 +267,23 @@ def analyze_power_consumption(power_data, config_data, start_time_ns, end_time_n
         if mode in ['inference', 'training']:
              results['num_operations'] = num_operations
              results['operation_unit'] = operation_unit
+             if 'total_energy_j' in results and num_operations > 0:
+                 results['energy_per_operation_j'] = results['total_energy_j'] / num_operations
+                 results['energy_per_operation_uncertainty_j'] = results['energy_uncertainty_j'] / num_operations
+                 if 'dynamic_energy_j' in results:
+                     results['dynamic_energy_per_operation_j'] = results['dynamic_energy_j'] / num_operations
+                     results['dynamic_energy_per_operation_uncertainty_j'] = results['dynamic_energy_uncertainty_j'] / num_operations
 
     except KeyError as e:
         print(f"Warning (power_analyzer): Missing key '{e}' in config_data. Cannot determine ops.", file=sys.stderr)
     except Exception as e:
         print(f"Warning (power_analyzer): Error processing ops count from config: {e}", file=sys.stderr)
 
+    if 'total_energy_j' in results:
+        # Energy-delay product: penalizes saving energy by simply running slower
+        results['energy_delay_product_js'] = results['total_energy_j'] * results['total_duration_s']
+        if 'energy_per_operation_j' in results:
+            results['energy_delay_product_per_operation_js'] = \
+                results['energy_per_operation_j'] * results['total_duration_s'] / results['num_operations']
+
     return results
\ No newline at end of file
@@ -0,0 +1,219 @@
+import csv
+import glob
+import os
+import time
+
+# Power sources for logger.log_power. Every source reports milliwatts as a dict with a 'total' entry
+# plus one entry per rail; the rail names are fixed once the source is opened so the log has a stable header.
+
+POWER_SOURCES = ['jtop', 'hwmon', 'rapl', 'replay']
+
+class PowerSource:
+    name = 'base'
+
+    def __init__(self):
+        self.rails = []
+
+    def open(self):
+        pass
+
+    def close(self):
+        pass
+
+    def ok(self):
+        return True
+
+    def read(self):
+        raise NotImplementedError
+
+    def __enter__(self):
+        self.open()
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.close()
+
+class JtopSource(PowerSource):
+    # Jetson boards through jetson-stats; imported lazily so other platforms never need the package
+    name = 'jtop'
+
+    def __init__(self):
+        super().__init__()
+        self.jetson = None
+
+    def open(self):
+        from jtop import jtop
+        self.jetson = jtop()
+        self.jetson.start()
+        stats = self.jetson.stats
+        self.rails = [key[len('Power '):] for key in stats if key.startswith('Power ') and key != 'Power TOT']
+
+    def close(self):
+        if self.jetson is not None:
+            self.jetson.close()
+
+    def ok(self):
+        return self.jetson.ok()
+
+    def read(self):
+        stats = self.jetson.stats
+        readings = {'total': float(stats.get('Power TOT', 0))}
+        for rail in self.rails:
+            readings[rail] = float(stats.get(f"Power {rail}", 0))
+        return readings
+
+class HwmonSource(PowerSource):
+    # INA3221-style monitors exposed through hwmon: in<N>_input in mV and curr<N>_input in mA per channel
+    name = 'hwmon'
+
+    def __init__(self, hwmon_root='/sys/class/hwmon'):
+        super().__init__()
+        self.hwmon_root = hwmon_root
+        self.channels = []
+
+    def open(self):
+        for device_path in sorted(glob.glob(os.path.join(self.hwmon_root, 'hwmon*'))):
+            try:
+                with open(os.path.join(device_path, 'name')) as name_file:
+                    device_name = name_file.read().strip()
+            except OSError:
+                continue
+            if not device_name.startswith('ina3221'):
+                continue
+            for voltage_path in sorted(glob.glob(os.path.join(device_path, 'in*_input'))):
+                channel = os.path.basename(voltage_path)[len('in'):-len('_input')]
+                current_path = os.path.join(device_path, f"curr{channel}_input")
+                if not os.path.exists(current_path):
+                    continue
+                label_path = os.path.join(device_path, f"in{channel}_label")
+                if os.path.exists(label_path):
+                    with open(label_path) as label_file:
+                        rail = label_file.read().strip()
+                else:
+                    rail = f"{os.path.basename(device_path)}_ch{channel}"
+                self.channels.append((rail, voltage_path, current_path))
+        if not self.channels:
+            raise RuntimeError(f"no INA3221 channels found under {self.hwmon_root}")
+        self.rails = [rail for rail, voltage_path, current_path in self.channels]
+
+    def read(self):
+        readings = {}
+        for rail, voltage_path, current_path in self.channels:
+            with open(voltage_path) as voltage_file, open(current_path) as current_file:
+                readings[rail] = int(voltage_file.read()) * int(current_file.read()) / 1000.0  # mV * mA -> mW
+        readings['total'] = sum(readings.values())
+        return readings
+
+class RaplSource(PowerSource):
+    # Intel RAPL powercap zones. The counters are cumulative energy in microjoules, so power is the energy delta
+    # over the time delta between two reads; a counter that went backwards wrapped at max_energy_range_uj.
+    name = 'rapl'
+
+    def __init__(self, powercap_root='/sys/class/powercap'):
+        super().__init__()
+        self.powercap_root = powercap_root
+        self.zones = []
+        self.previous_energy_uj = []
+        self.previous_read_ns = None
+
+    def open(self):
+        for zone_path in sorted(glob.glob(os.path.join(self.powercap_root, 'intel-rapl:*'))):
+            energy_path = os.path.join(zone_path, 'energy_uj')
+            if not os.path.exists(energy_path):
+                continue
+            with open(os.path.join(zone_path, 'name')) as name_file:
+                zone_name = name_file.read().strip()
+            with open(os.path.join(zone_path, 'max_energy_range_uj')) as range_file:
+                max_energy_range_uj = int(range_file.read())
+            # intel-rapl:0 is package 0, intel-rapl:0:1 one of its sub-zones
+            zone_id = os.path.basename(zone_path)[len('intel-rapl:'):]
+            self.zones.append({'rail': f"{zone_name}:{zone_id}", 'name': zone_name, 'top_level': ':' not in zone_id,
+                               'energy_path': energy_path, 'max_energy_range_uj': max_energy_range_uj})
+        if not self.zones:
+            raise RuntimeError(f"no RAPL zones found under {self.powercap_root} (energy_uj may need root permissions)")
+        self.rails = [zone['rail'] for zone in self.zones]
+        self.previous_energy_uj = self.read_energy_uj()
+        self.previous_read_ns = time.perf_counter_ns()
+
+    def read_energy_uj(self):
+        energy_uj = []
+        for zone in self.zones:
+            with open(zone['energy_path']) as energy_file:
+                energy_uj.append(int(energy_file.read()))
+        return energy_uj
+
+    def read(self):
+        energy_uj = self.read_energy_uj()
+        read_ns = time.perf_counter_ns()
+        elapsed_s = (read_ns - self.previous_read_ns) / 1e9
+
+        readings = {}
+        total = 0.0
+        for zone, energy, previous_energy in zip(self.zones, energy_uj, self.previous_energy_uj):
+            delta_uj = energy - previous_energy
+            if delta_uj < 0:
+                delta_uj += zone['max_energy_range_uj'] + 1
+            power_mw = delta_uj / elapsed_s / 1000.0 if elapsed_s > 0 else 0.0
+            readings[zone['rail']] = power_mw
+            # Packages and DRAM are disjoint; core/uncore are part of their package, psys already covers both
+            if (zone['top_level'] and zone['name'].startswith('package')) or zone['name'] == 'dram':
+                total += power_mw
+        readings['total'] = total
+
+        self.previous_energy_uj = energy_uj
+        self.previous_read_ns = read_ns
+        return readings
+
+class ReplaySource(PowerSource):
+    # Plays back the samples of a recorded power trace (binary, or CSV as exported by power_trace.py) in order
+    # and wraps around, so CI runs are deterministic
+    name = 'replay'
+
+    def __init__(self, replay_file):
+        super().__init__()
+        self.replay_file = replay_file
+        self.samples = []
+        self.position = 0
+
+    def open(self):
+        if not self.replay_file.endswith('.csv'):
+            from power_trace import load_power_trace, rail_names
+            trace = load_power_trace(self.replay_file)
+            self.rails = rail_names(trace)
+            self.samples = [dict(zip(['total'] + self.rails, (float(value) for value in record.tolist()[1:]))) for record in trace]
+            if not self.samples:
+                raise RuntimeError(f"replay file {self.replay_file} contains no samples")
+            self.position = 0
+            return
+        with open(self.replay_file, 'r', newline='') as f:
+            reader = csv.reader(f)
+            header = next(reader)
+            # Columns after timestamp_ns and power_tot_mw are rails, named <rail>_mw
+            self.rails = [column[:-len('_mw')] if column.endswith('_mw') else column for column in header[2:]]
+            for row in reader:
+                if len(row) != len(header):
+                    continue
+                readings = {'total': float(row[1])}
+                for rail, value in zip(self.rails, row[2:]):
+                    readings[rail] = float(value)
+                self.samples.append(readings)
+        if not self.samples:
+            raise RuntimeError(f"replay file {self.replay_file} contains no samples")
+        self.position = 0
+
+    def read(self):
+        readings = self.samples[self.position % len(self.samples)]
+        self.position += 1
+        return dict(readings)
+
+def create_power_source(power_config):
+    source = power_config.get('source', 'jtop')
+    if source == 'jtop':
+        return JtopSource()
+    elif source == 'hwmon':
+        return HwmonSource(power_config.get('hwmon_path', '/sys/class/hwmon'))
+    elif source == 'rapl':
+        return RaplSource(power_config.get('powercap_path', '/sys/class/powercap'))
+    elif source == 'replay':
+        return ReplaySource(power_config['replay_file'])
+    raise ValueError(f"unknown power source '{source}'")
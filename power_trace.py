@@ -0,0 +1,165 @@
+import argparse
+import struct
+import time
+from datetime import datetime
+import numpy as np
+
+# Binary power trace written by logger.log_power.
+#
+# Header (little-endian): 8-byte magic, uint16 version, uint16 number of rails, uint32 header size in bytes,
+# int64 wall-clock and int64 CLOCK_MONOTONIC anchor in ns read at the same moment, followed by the rail names as
+# UTF-8 separated by newlines and zero-padded to a multiple of 8 bytes.
+# Body: fixed-size records of an int64 CLOCK_MONOTONIC timestamp in ns (the clock of the profilers' timed windows and
+# events) followed by float32 milliwatts for the total and every rail. Version 1 traces had wall-clock timestamps and
+# no anchor.
+# Records are appended while the run is in progress, so the number of records follows from the file size.
+# Loading maps the body as a structured NumPy array, which exposes every column as a zero-copy view.
+# Telemetry traces (telemetry.py) use the same layout with their own magic; their header lists the column names and
+# every record holds one float32 per column after the timestamp, without a total.
+
+TRACE_MAGIC = b'EMLPOWER'
+TELEMETRY_MAGIC = b'EMLTELEM'
+TRACE_VERSION = 2
+TRACE_EXTENSION = '.bin'
+HEADER_FORMAT = struct.Struct('<8sHHI')
+ANCHOR_FORMAT = struct.Struct('<qq')
+
+def clock_anchor():
+    # (wall_ns, monotonic_ns) read back to back
+    return time.time_ns(), time.monotonic_ns()
+
+def encode_header(rails, anchor, magic=TRACE_MAGIC):
+    names = "\n".join(rails).encode('utf-8')
+    fixed_size = HEADER_FORMAT.size + ANCHOR_FORMAT.size
+    header_size = fixed_size + len(names)
+    header_size += -header_size % 8
+    return (HEADER_FORMAT.pack(magic, TRACE_VERSION, len(rails), header_size) + ANCHOR_FORMAT.pack(*anchor)
+            + names.ljust(header_size - fixed_size, b'\0'))
+
+def read_header(trace_path, expected_magic=TRACE_MAGIC):
+    # Returns (rails, header_size, anchor); anchor is (wall_ns, monotonic_ns), or None for version 1 traces
+    with open(trace_path, 'rb') as f:
+        fixed = f.read(HEADER_FORMAT.size)
+        if len(fixed) < HEADER_FORMAT.size:
+            raise ValueError(f"{trace_path} is too short to be a power trace")
+        magic, version, no_rails, header_size = HEADER_FORMAT.unpack(fixed)
+        if magic != expected_magic:
+            raise ValueError(f"{trace_path} is not a {'power' if expected_magic == TRACE_MAGIC else 'telemetry'} trace")
+        if version not in (1, TRACE_VERSION):
+            raise ValueError(f"{trace_path} has unsupported power trace version {version}")
+        anchor = None
+        names_size = header_size - HEADER_FORMAT.size
+        if version >= 2:
+            anchor = ANCHOR_FORMAT.unpack(f.read(ANCHOR_FORMAT.size))
+            names_size -= ANCHOR_FORMAT.size
+        names = f.read(names_size).rstrip(b'\0').decode('utf-8')
+    rails = names.split("\n") if no_rails > 0 else []
+    return rails, header_size, anchor
+
+def wall_clock_ns(timestamp_ns, anchor):
+    # Converts a monotonic timestamp of the trace to wall-clock ns since the epoch
+    wall_ns, monotonic_ns = anchor
+    return timestamp_ns - monotonic_ns + wall_ns
+
+def record_dtype(rails):
+    return np.dtype([('timestamp_ns', '<i8'), ('power_tot_mw', '<f4')] + [(f"{rail}_mw", '<f4') for rail in rails])
+
+def telemetry_dtype(columns):
+    return np.dtype([('timestamp_ns', '<i8')] + [(column, '<f4') for column in columns])
+
+class PowerTraceWriter:
+    # Appends records while the run is in progress; the header is written once on open
+    magic = TRACE_MAGIC
+
+    def __init__(self, trace_path, rails):
+        self.trace_path = trace_path
+        self.rails = list(rails)
+        self.record_format = 'q' + 'f' * (1 + len(self.rails))
+        self.file = None
+
+    def __enter__(self):
+        self.file = open(self.trace_path, 'wb')
+        self.file.write(encode_header(self.rails, clock_anchor(), self.magic))
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.file.close()
+
+    def write_records(self, records):
+        # records: list of (timestamp_ns, [total, rail, ...]) written with a single pack and write
+        if not records:
+            return
+        values = []
+        for timestamp_ns, readings in records:
+            values.append(timestamp_ns)
+            values.extend(readings)
+        self.file.write(struct.pack('<' + self.record_format * len(records), *values))
+
+class TelemetryTraceWriter(PowerTraceWriter):
+    magic = TELEMETRY_MAGIC
+
+    def __init__(self, trace_path, columns):
+        super().__init__(trace_path, columns)
+        self.record_format = 'q' + 'f' * len(self.rails)
+
+def load_power_trace(trace_path):
+    rails, header_size, anchor = read_header(trace_path)
+    return map_records(trace_path, header_size, record_dtype(rails))
+
+def load_telemetry_trace(trace_path):
+    columns, header_size, anchor = read_header(trace_path, TELEMETRY_MAGIC)
+    return map_records(trace_path, header_size, telemetry_dtype(columns))
+
+def map_records(trace_path, header_size, dtype):
+    # Memory-maps the records; a partially written last record is ignored
+    with open(trace_path, 'rb') as f:
+        f.seek(0, 2)
+        no_records = (f.tell() - header_size) // dtype.itemsize
+    if no_records <= 0:
+        return np.empty(0, dtype=dtype)
+    return np.memmap(trace_path, dtype=dtype, mode='r', offset=header_size, shape=(no_records,))
+
+def slice_time_window(trace, start_time_ns, end_time_ns, margin=0):
+    # Binary search on the timestamp column; returns a view of the records in [start_time_ns, end_time_ns]
+    # plus up to `margin` records on either side
+    timestamps_ns = trace['timestamp_ns']
+    first = np.searchsorted(timestamps_ns, start_time_ns, side='left')
+    last = np.searchsorted(timestamps_ns, end_time_ns, side='right')
+    return trace[max(0, first - margin):last + margin]
+
+def rail_names(trace):
+    return [name[:-len('_mw')] for name in trace.dtype.names[2:]]
+
+def export_csv(trace, csv_path):
+    # Same columns as the binary trace, for reading in a spreadsheet or by eye
+    with open(csv_path, 'w') as f:
+        f.write(",".join(trace.dtype.names) + "\n")
+        chunk_size = 65536
+        for chunk_start in range(0, len(trace), chunk_size):
+            chunk = trace[chunk_start:chunk_start + chunk_size]
+            columns = [chunk['timestamp_ns'].astype(str)] + [np.char.mod('%.3f', chunk[name]) for name in trace.dtype.names[1:]]
+            f.write("".join(",".join(row) + "\n" for row in zip(*columns)))
+
+def main():
+    parser = argparse.ArgumentParser(description='Export a binary power trace to CSV')
+    parser.add_argument('trace', type=str, help='Path to the binary power trace')
+    parser.add_argument('--csv', type=str, default=None, help='Output CSV path (default: the trace path with a .csv extension)')
+    parser.add_argument('--start', type=int, default=None, help='Only export samples at or after this CLOCK_MONOTONIC timestamp (ns)')
+    parser.add_argument('--end', type=int, default=None, help='Only export samples at or before this CLOCK_MONOTONIC timestamp (ns)')
+    args = parser.parse_args()
+
+    trace = load_power_trace(args.trace)
+    if args.start is not None or args.end is not None:
+        trace = slice_time_window(trace,
+                                  args.start if args.start is not None else np.iinfo(np.int64).min,
+                                  args.end if args.end is not None else np.iinfo(np.int64).max)
+    csv_path = args.csv or (args.trace[:-len(TRACE_EXTENSION)] if args.trace.endswith(TRACE_EXTENSION) else args.trace) + '.csv'
+    export_csv(trace, csv_path)
+    print(f"Exported {len(trace)} samples with rails {rail_names(trace)} to {csv_path}")
+    anchor = read_header(args.trace)[2]
+    if anchor is not None and len(trace) > 0:
+        first_sample = datetime.fromtimestamp(wall_clock_ns(int(trace['timestamp_ns'][0]), anchor) / 1e9)
+        print(f"Timestamps are CLOCK_MONOTONIC ns; the first sample was taken at {first_sample.isoformat()} (wall clock).")
+
+if __name__ == "__main__":
+    main()
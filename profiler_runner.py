@@ -1,6 +1,90 @@
 import subprocess
 import threading
 import re
+import json
+
+EVENT_POLL_INTERVAL_S = 0.1
+
+class EventTail:
+    # Follows the profiler's JSON-lines event file (python/events.py, cpp/EventChannel.h) while it runs:
+    # prints phase transitions live, pairs phase_begin/phase_end into spans and collects metrics events
+    def __init__(self, events_file_path, profiler_name, verbose=True):
+        self.events_file_path = events_file_path
+        self.profiler_name = profiler_name
+        self.verbose = verbose
+        self.metrics = {}
+        self.phases = []
+        self.open_phases = []
+        self.stop_event = threading.Event()
+        self.thread = threading.Thread(target=self.run, daemon=True)
+        self.position = 0
+        self.partial_line = ""
+
+    def start(self):
+        # Start from an empty file, the channel appends
+        open(self.events_file_path, 'w').close()
+        self.thread.start()
+
+    def stop(self):
+        self.stop_event.set()
+        self.thread.join(timeout=5)
+        self.poll()
+        for open_phase in self.open_phases:
+            print(f"Warning: {self.profiler_name} phase '{open_phase['phase']}' never ended.")
+
+    def run(self):
+        while not self.stop_event.wait(timeout=EVENT_POLL_INTERVAL_S):
+            self.poll()
+
+    def poll(self):
+        # Reads only what was appended since the last poll; an incomplete last line waits for the next one
+        try:
+            with open(self.events_file_path, 'r') as f:
+                f.seek(self.position)
+                chunk = f.read()
+                self.position = f.tell()
+        except OSError:
+            return
+        if not chunk:
+            return
+        lines = (self.partial_line + chunk).split("\n")
+        self.partial_line = lines.pop()
+        for line in lines:
+            if line.strip():
+                self.handle_line(line)
+
+    def handle_line(self, line):
+        try:
+            event = json.loads(line)
+        except ValueError:
+            print(f"Warning: Could not parse event line: {line}")
+            return
+        kind = event.pop('event', None)
+        if kind == 'clock_anchor':
+            # Wall-clock time of the monotonic timestamp t_ns, for dating the run's events
+            self.metrics['clock_anchor'] = {'wall_ns': event['wall_ns'], 'monotonic_ns': event['t_ns'],
+                                            'resolution_ns': event.get('resolution_ns')}
+        elif kind == 'metrics':
+            self.metrics[event['name']] = event['data']
+        elif kind == 'phase_begin':
+            event['depth'] = len(self.open_phases)
+            self.open_phases.append(event)
+            if self.verbose:
+                print(f"[{self.profiler_name}] {'  ' * event['depth']}> {event['phase']}")
+        elif kind == 'phase_end':
+            # Close the innermost open phase of that name; anything opened inside it and never closed is dropped
+            for index in range(len(self.open_phases) - 1, -1, -1):
+                if self.open_phases[index]['phase'] == event['phase']:
+                    begin = self.open_phases[index]
+                    del self.open_phases[index:]
+                    span = {key: value for key, value in begin.items() if key not in ('t_ns', 'source')}
+                    span.update({key: value for key, value in event.items() if key not in ('t_ns', 'source', 'phase')})
+                    span['start_ns'] = begin['t_ns']
+                    span['end_ns'] = event['t_ns']
+                    self.phases.append(span)
+                    if self.verbose:
+                        print(f"[{self.profiler_name}] {'  ' * span['depth']}< {span['phase']} ({(span['end_ns'] - span['start_ns']) / 1e6:.1f} ms)")
+                    break
 
 def run_profiler_task(
     profiler_name,
@@ -9,9 +93,14 @@ def run_profiler_task(
     power_log_file_path,
     power_logging_enabled,
     logging_interval,
-    log_power_func
+    log_power_func,
+    power_source=None,
+    events_file_path=None,
+    telemetry_file_path=None
 ):
     print(f"\n--- Starting {profiler_name} Profiling ---")
+    if events_file_path is not None:
+        executable_path_args = list(executable_path_args) + ['-e', events_file_path]
     if isinstance(executable_path_args, list):
         print(f"Command: {' '.join(executable_path_args)}")
     else:
@@ -24,8 +113,14 @@ def run_profiler_task(
     
     captured_start_time = None
     captured_end_time = None
+    captured_metrics = {}
+    event_tail = None
 
     try:
+        if events_file_path is not None:
+            event_tail = EventTail(events_file_path, profiler_name)
+            event_tail.start()
+
         proc = subprocess.Popen(
             executable_path_args,
             stdout=subprocess.PIPE,
@@ -37,7 +132,8 @@ def run_profiler_task(
             stop_logging_event = threading.Event()
             log_thread = threading.Thread(
                 target=log_power_func,
-                args=(proc.pid, stop_logging_event, power_log_file_path, logging_interval),
+                args=(proc.pid, stop_logging_event, power_log_file_path, logging_interval, power_source),
+                kwargs={'telemetry_file': telemetry_file_path},
                 daemon=True
             )
             print(f"Starting power logging for {profiler_name} (log file: {power_log_file_path})...")
@@ -50,15 +146,29 @@ def run_profiler_task(
         stdout_bytes, stderr_bytes = proc.communicate()
         profiler_return_code = proc.returncode
 
+        if event_tail is not None:
+            event_tail.stop()
+            captured_metrics.update(event_tail.metrics)
+            captured_metrics['phases'] = event_tail.phases
+
         print(f"\n--- {profiler_name} Profiler Output ---")
         
         time_pattern = re.compile(r"\[START TIME\]\s+(\d+)\s+-\s+\[END TIME\]\s+(\d+)")
+        metrics_pattern = re.compile(r"^\[METRICS\]\s+(.*)$")
         
         processed_stdout_lines = []
         if stdout_bytes:
             stdout_str_full = stdout_bytes.decode('utf-8', errors='replace')
             
             for line in stdout_str_full.splitlines():
+                metrics_match = metrics_pattern.match(line)
+                if metrics_match:
+                    try:
+                        captured_metrics.update(json.loads(metrics_match.group(1)))
+                    except ValueError:
+                        print(f"Warning: Could not parse metrics line: {line}")
+                    continue
+
                 match = time_pattern.search(line)
                 if match:
                     if captured_start_time is None:
@@ -100,18 +210,20 @@ def run_profiler_task(
         elif power_logging_enabled and log_thread is None:
             print(f"Warning: {profiler_name} power logging was flagged as enabled, but the logging thread was not initialized.")
         
-        return profiler_return_code, captured_start_time, captured_end_time
+        return profiler_return_code, captured_start_time, captured_end_time, captured_metrics
 
     except FileNotFoundError:
         exec_name = executable_path_args[0] if executable_path_args else "Unknown Executable"
         print(f"Error: {profiler_name} profiler executable not found at '{exec_name}' (related to config: {config_path_for_error_msg})")
         print(f"Skipping {profiler_name} profiling.")
-        return -1, None, None
+        return -1, None, None, {}
     except Exception as e:
         print(f"An unexpected error occurred while running the {profiler_name} profiler: {e}")
         print(f"Skipping {profiler_name} profiling.")
         if proc and proc.poll() is not None:
             profiler_return_code = proc.returncode
-        return profiler_return_code, captured_start_time, captured_end_time
+        return profiler_return_code, captured_start_time, captured_end_time, captured_metrics
     finally:
+        if event_tail is not None and event_tail.thread.is_alive():
+            event_tail.stop_event.set()
         print(f"\nMain program execution for {profiler_name} profiler finished.")
\ No newline at end of file
@@ -0,0 +1,69 @@
+import torch
+import torch.nn as nn
+import copy
+import time
+
+EXECUTION_BACKENDS = ['eager', 'script', 'trace', 'compile', 'inference_mode', 'channels_last']
+
+class InferenceModeWrapper(nn.Module):
+    def __init__(self, module):
+        super(InferenceModeWrapper, self).__init__()
+        self.module = module
+
+    def forward(self, x):
+        with torch.inference_mode():
+            return self.module(x)
+
+def uses_channels_last(backend):
+    return backend == 'channels_last'
+
+def synchronize(device):
+    if device == 'gpu':
+        torch.cuda.synchronize()
+
+def prepare_backend(network, backend, device, input_shape, batch_size=1):
+    # Returns the model to profile plus the one-off preparation cost, which is kept out of the steady-state latency.
+    # Returns (None, reason) if the backend cannot run here.
+    torch_device = torch.device('cuda') if device == 'gpu' else torch.device('cpu')
+    if backend == 'compile' and not hasattr(torch, 'compile'):
+        return None, "torch.compile requires PyTorch 2.0 or newer"
+    if uses_channels_last(backend) and len(input_shape) != 3:
+        return None, "channels_last only applies to [channels, height, width] inputs"
+
+    network.eval()
+    network.to(torch_device)
+    example_input = torch.randn(batch_size, *input_shape, device=torch_device)
+    if uses_channels_last(backend):
+        example_input = example_input.contiguous(memory_format=torch.channels_last)
+
+    with torch.no_grad():
+        synchronize(device)
+        conversion_start = time.perf_counter_ns()
+        if backend == 'eager':
+            model = network
+        elif backend == 'script':
+            model = torch.jit.freeze(torch.jit.script(network))
+        elif backend == 'trace':
+            model = torch.jit.freeze(torch.jit.trace(network, example_input))
+        elif backend == 'compile':
+            model = torch.compile(copy.deepcopy(network))
+        elif backend == 'inference_mode':
+            model = InferenceModeWrapper(network)
+        elif backend == 'channels_last':
+            model = copy.deepcopy(network).to(memory_format=torch.channels_last)
+        else:
+            return None, f"unknown execution backend '{backend}'"
+        conversion_ns = time.perf_counter_ns() - conversion_start
+
+        # torch.compile and the TorchScript profiling executor do their real work on the first calls
+        first_call_start = time.perf_counter_ns()
+        model(example_input)
+        synchronize(device)
+        first_call_ns = time.perf_counter_ns() - first_call_start
+
+    preparation = {
+        'backend': backend,
+        'conversion_ms': conversion_ns / 1_000_000,
+        'first_call_ms': first_call_ns / 1_000_000,
+    }
+    return model, preparation
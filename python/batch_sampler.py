@@ -0,0 +1,103 @@
+import collections
+import time
+from concurrent.futures import ThreadPoolExecutor
+import numpy as np
+import torch
+
+# Batches of the in-memory synthetic training data. torch.utils.data.DataLoader over a TensorDataset indexes and
+# collates every sample in Python, which for small dense networks costs more than the training step itself. The batch
+# sampler draws one permutation per epoch and gathers every batch with a single index_select of a contiguous slice of
+# it, on the device the data lives on. Datasets on disk (see synthetic_data.py) are read by the prefetching loader.
+
+DATA_LOADERS = ['batch_sampler', 'dataloader']
+PREFETCH_LOADER = 'disk_prefetch'
+# Batches read ahead per prefetch worker
+PREFETCH_DEPTH = 2
+# Out-of-core loaders are timed over this many batches instead of a whole epoch
+OVERHEAD_MAX_BATCHES = 100
+
+class BatchSampler:
+    def __init__(self, data, labels, batch_size):
+        self.data = data
+        self.labels = labels
+        self.batch_size = batch_size
+
+    def __len__(self):
+        return (len(self.data) + self.batch_size - 1) // self.batch_size
+
+    def __iter__(self):
+        order = torch.randperm(len(self.data), device=self.data.device)
+        for start in range(0, len(order), self.batch_size):
+            index = order[start:start + self.batch_size]
+            yield self.data.index_select(0, index), self.labels.index_select(0, index)
+
+class PrefetchingBatchLoader:
+    # Batches of a memory-mapped dataset, read by background workers while the previous batches train. The indices of
+    # every batch are sorted, so each read walks the file in order.
+    def __init__(self, data, labels, batch_size, device, workers):
+        self.data = data
+        self.labels = labels
+        self.batch_size = batch_size
+        self.device = device
+        self.workers = workers
+
+    def __len__(self):
+        return (len(self.data) + self.batch_size - 1) // self.batch_size
+
+    def read_batch(self, index):
+        index = np.sort(index)
+        inputs = torch.from_numpy(self.data[index])
+        labels = self.labels[torch.from_numpy(index)]
+        if self.device == 'gpu':
+            return inputs.pin_memory().to('cuda', non_blocking=True), labels.pin_memory().to('cuda', non_blocking=True)
+        return inputs, labels
+
+    def __iter__(self):
+        order = torch.randperm(len(self.data)).numpy()
+        batch_indices = [order[start:start + self.batch_size] for start in range(0, len(order), self.batch_size)]
+        with ThreadPoolExecutor(max_workers=self.workers) as executor:
+            pending = collections.deque(executor.submit(self.read_batch, index) for index in batch_indices[:self.workers * PREFETCH_DEPTH])
+            next_batch = len(pending)
+            while pending:
+                batch = pending.popleft().result()
+                if next_batch < len(batch_indices):
+                    pending.append(executor.submit(self.read_batch, batch_indices[next_batch]))
+                    next_batch += 1
+                yield batch
+
+def create_loader(name, data, labels, batch_size, device='cpu', prefetch_workers=2):
+    if name == 'batch_sampler':
+        return BatchSampler(data, labels, batch_size)
+    if name == PREFETCH_LOADER:
+        return PrefetchingBatchLoader(data, labels, batch_size, device, prefetch_workers)
+    return torch.utils.data.DataLoader(torch.utils.data.TensorDataset(data, labels), batch_size=batch_size, shuffle=True)
+
+def measure_loader_overhead(loader, synchronize, max_batches=None):
+    # Fetching batches without training on them, for one epoch or the first max_batches batches of it
+    synchronize()
+    start_ns = time.monotonic_ns()
+    no_batches = 0
+    for _ in loader:
+        no_batches += 1
+        if max_batches is not None and no_batches >= max_batches:
+            break
+    synchronize()
+    batch_ms = (time.monotonic_ns() - start_ns) / 1e6 / no_batches if no_batches > 0 else 0.0
+    return {'batches': no_batches, 'ms_per_epoch': batch_ms * len(loader), 'ms_per_batch': batch_ms}
+
+def summarize_loader_overhead(selected, overhead, step_ms):
+    # The training step of the run minus the fetch time of the selected loader is the compute per step, which gives
+    # the share of a step every loader would take
+    compute_ms = max(step_ms - overhead[selected]['ms_per_batch'], 0.0)
+    for stats in overhead.values():
+        loader_step_ms = compute_ms + stats['ms_per_batch']
+        stats['share_of_step'] = stats['ms_per_batch'] / loader_step_ms if loader_step_ms > 0 else 0.0
+    return {'selected': selected, 'step_ms': step_ms, 'loaders': overhead}
+
+def format_loader_overhead(summary):
+    lines = []
+    for name, stats in summary['loaders'].items():
+        selected_marker = " (selected)" if name == summary['selected'] else ""
+        lines.append(f"{name}{selected_marker}: {stats['ms_per_batch']:.4f} ms per batch, {stats['ms_per_epoch']:.3f} ms per epoch, "
+                     f"{stats['share_of_step'] * 100:.1f}% of a training step")
+    return "\n".join(lines)
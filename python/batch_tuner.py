@@ -0,0 +1,195 @@
+import argparse
+import copy
+import json
+import math
+import os
+import subprocess
+import sys
+import time
+import torch
+import constructor
+import training
+from batch_sampler import BatchSampler
+from parameter_parser import get_training_params, get_training_options
+from synthetic_data import generate_training_data, available_memory_bytes, MEMORY_SHARE
+
+# Training batch size search under a memory budget. Batch sizes are probed by exponential growth from min_batch_size
+# until a size no longer fits, then by bisection between the largest size that fits and the smallest that does not.
+# Every probe is a fresh process that trains a fresh network for a bounded number of steps on a small synthetic pool,
+# so a probe that runs out of memory (or is killed by the OOM killer) only ends that probe. Among the sizes that fit,
+# the one with the highest samples/s is written into a derived config for the full profile.
+
+DEFAULT_PROBE_STEPS = 20
+DEFAULT_MIN_BATCH_SIZE = 1
+DEFAULT_MAX_BATCH_SIZE = 4096
+DEFAULT_PROBE_TIMEOUT_S = 300
+# Batches in the synthetic pool a probe trains on
+PROBE_POOL_BATCHES = 2
+# Bisection stops once the largest fitting and the smallest failing size are within this share of each other
+BISECTION_TOLERANCE = 1 / 16
+
+def get_tuning_params(config_data):
+    tuning = config_data['network']['batch_size_tuning']
+    memory = tuning.get('memory', 'device' if config_data['network']['device'] == 'gpu' else 'rss')
+    # A batch larger than the dataset would only train on one ragged batch per epoch
+    max_batch_size = min(tuning.get('max_batch_size', DEFAULT_MAX_BATCH_SIZE), config_data['network']['training_params']['num_samples'])
+    min_batch_size = min(tuning.get('min_batch_size', DEFAULT_MIN_BATCH_SIZE), max_batch_size)
+    return [tuning['memory_budget_mb'], memory, tuning.get('probe_steps', DEFAULT_PROBE_STEPS), min_batch_size, max_batch_size,
+            tuning.get('probe_timeout_s', DEFAULT_PROBE_TIMEOUT_S)]
+
+def run_probe(config_data, batch_size, memory, probe_steps):
+    # Runs in the probe process; returns samples/s and the peak memory of probe_steps training steps
+    device = config_data['network']['device']
+    optimizer_choice, learning_rate, loss_function, _, _, _, num_classes, input_shape, task = get_training_params(config_data)
+    options = get_training_options(config_data)
+    memory_device = device if memory == 'device' else 'cpu'
+
+    network = constructor.build_custom_net(config_data['network']['layers'])
+    network.train()
+    network.to('cuda' if device == 'gpu' else 'cpu')
+    synchronize = torch.cuda.synchronize if device == 'gpu' else lambda: None
+    try:
+        pool_size = batch_size * PROBE_POOL_BATCHES
+        data, labels, data_info = generate_training_data(input_shape, num_classes, pool_size, task, device, options['data_seed'], 'memory')
+        loader = BatchSampler(data, labels, batch_size)
+        criterion = training.create_criterion(loss_function)
+        optimizer, _ = training.create_optimizer(optimizer_choice, network, learning_rate, options['optimizer_impl'])
+        settings = training.step_settings(device, dict(options, gradient_accumulation_steps=1))
+
+        # One epoch over the pool warms up, so allocator growth and kernel selection are not timed
+        training.train_epochs(network, loader, criterion, optimizer, 1, **settings)
+        synchronize()
+        training.reset_peak_memory(memory_device)
+        epochs = max(1, math.ceil(probe_steps / PROBE_POOL_BATCHES))
+        start_ns = time.monotonic_ns()
+        training.train_epochs(network, loader, criterion, optimizer, epochs, **settings)
+        synchronize()
+        duration_ns = time.monotonic_ns() - start_ns
+    except RuntimeError as e:
+        # CUDA and CPU allocator failures
+        if 'out of memory' not in str(e) and "can't allocate memory" not in str(e):
+            raise
+        return {'batch_size': batch_size, 'oom': True}
+    return {
+        'batch_size': batch_size,
+        'oom': False,
+        'steps': epochs * PROBE_POOL_BATCHES,
+        'samples_per_s': epochs * pool_size / (duration_ns / 1e9),
+        'peak_memory_mb': training.peak_memory_mb(memory_device),
+        'pool_mb': data_info['bytes'] / (1024 * 1024),
+    }
+
+def start_probe(config_path, batch_size, timeout_s):
+    # Runs one probe in a fresh process; a probe without a result did not fit
+    command = [sys.executable, os.path.abspath(__file__), '-c', config_path, '--probe', str(batch_size)]
+    try:
+        completed = subprocess.run(command, capture_output=True, text=True, timeout=timeout_s)
+    except subprocess.TimeoutExpired:
+        return {'batch_size': batch_size, 'oom': True, 'reason': f"no result within {timeout_s} s"}
+    for line in completed.stdout.splitlines():
+        if line.startswith('[PROBE] '):
+            return json.loads(line[len('[PROBE] '):])
+    if completed.returncode < 0:
+        reason = f"killed by signal {-completed.returncode}"
+    else:
+        reason = f"exit code {completed.returncode}: {completed.stderr.strip().splitlines()[-1] if completed.stderr.strip() else ''}"
+    return {'batch_size': batch_size, 'oom': True, 'reason': reason}
+
+def dataset_memory_mb(config_data, memory):
+    # Memory the full run's training data adds on top of a probe, if the full run keeps it in the budgeted memory
+    device = config_data['network']['device']
+    _, _, _, _, _, num_samples, _, input_shape, _ = get_training_params(config_data)
+    data_bytes = num_samples * math.prod(input_shape) * 4
+    storage = get_training_options(config_data)['data_storage']
+    if storage == 'auto':
+        storage = 'disk' if data_bytes > MEMORY_SHARE * available_memory_bytes(device) else 'memory'
+    if storage == 'disk' or (memory == 'rss' and device == 'gpu'):
+        return 0.0
+    return data_bytes / (1024 * 1024)
+
+def tune_batch_size(probe, memory_budget_mb, min_batch_size, max_batch_size, data_mb):
+    # probe(batch_size) returns a run_probe result. Returns (chosen batch size or None, all probe results by size)
+    probes = {}
+
+    def fits(batch_size):
+        if batch_size not in probes:
+            result = probe(batch_size)
+            if not result['oom']:
+                # The probe trains on a small pool; the full run keeps the whole dataset instead
+                result['projected_memory_mb'] = result['peak_memory_mb'] - result['pool_mb'] + data_mb
+            result['fits'] = not result['oom'] and result['projected_memory_mb'] <= memory_budget_mb
+            probes[batch_size] = result
+            print_probe(result)
+        return probes[batch_size]['fits']
+
+    largest_fit = None
+    smallest_failure = None
+    batch_size = min_batch_size
+    while True:
+        if not fits(batch_size):
+            smallest_failure = batch_size
+            break
+        largest_fit = batch_size
+        if batch_size >= max_batch_size:
+            break
+        batch_size = min(batch_size * 2, max_batch_size)
+
+    if largest_fit is not None and smallest_failure is not None:
+        low, high = largest_fit, smallest_failure
+        while high - low > max(1, int(low * BISECTION_TOLERANCE)):
+            middle = (low + high) // 2
+            if fits(middle):
+                low = middle
+            else:
+                high = middle
+
+    fitting = [result for result in probes.values() if result['fits']]
+    if not fitting:
+        return None, probes
+    return max(fitting, key=lambda result: result['samples_per_s'])['batch_size'], probes
+
+def print_probe(result):
+    if result['oom']:
+        print(f"Batch size {result['batch_size']:>6}: " + (f"no result ({result['reason']})" if result.get('reason') else "out of memory"))
+        return
+    fit_note = "" if result['fits'] else "  over budget"
+    print(f"Batch size {result['batch_size']:>6}: {result['samples_per_s']:>12.1f} samples/s, peak {result['peak_memory_mb']:>9.1f} MiB, "
+          f"projected {result['projected_memory_mb']:>9.1f} MiB{fit_note}")
+
+def write_derived_config(config_data, batch_size, output_path):
+    # The profiled config: the chosen batch size, and tuning switched off so the profilers never tune again
+    derived_config = copy.deepcopy(config_data)
+    derived_config['network']['training_params']['batch_size'] = batch_size
+    derived_config['network']['batch_size_tuning']['status'] = 'off'
+    with open(output_path, 'w') as output_file:
+        json.dump(derived_config, output_file, indent=4)
+
+def main():
+    parser = argparse.ArgumentParser(description='Search the training batch size with the highest throughput under a memory budget')
+    parser.add_argument('-c', type=str, required=True, help='Path to the configuration file')
+    parser.add_argument('-o', type=str, default=None, help='Path of the derived configuration file with the chosen batch size')
+    parser.add_argument('--probe', type=int, default=None, help='Run a single probe with this batch size and print its result')
+    args = parser.parse_args()
+    with open(args.c, 'r') as config_file:
+        config_data = json.load(config_file)
+    memory_budget_mb, memory, probe_steps, min_batch_size, max_batch_size, probe_timeout_s = get_tuning_params(config_data)
+
+    if args.probe is not None:
+        print("[PROBE] " + json.dumps(run_probe(config_data, args.probe, memory, probe_steps)), flush=True)
+        return
+
+    print(f"Searching batch sizes {min_batch_size} to {max_batch_size} within {memory_budget_mb} MiB of "
+          f"{'device memory' if memory == 'device' else 'RSS'}, {probe_steps} steps per probe...")
+    batch_size, probes = tune_batch_size(lambda size: start_probe(args.c, size, probe_timeout_s), memory_budget_mb,
+                                         min_batch_size, max_batch_size, dataset_memory_mb(config_data, memory))
+    if batch_size is None:
+        print(f"No batch size from {min_batch_size} fits into {memory_budget_mb} MiB.")
+        sys.exit(1)
+    print(f"Chosen batch size: {batch_size} ({probes[batch_size]['samples_per_s']:.1f} samples/s, "
+          f"{len(probes)} probes; configured: {config_data['network']['training_params']['batch_size']})")
+    if args.o:
+        write_derived_config(config_data, batch_size, args.o)
+        print(f"Derived configuration written to {args.o}")
+
+if __name__ == "__main__":
+    main()
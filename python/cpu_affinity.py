@@ -0,0 +1,19 @@
+import os
+
+def affinity_supported():
+    return hasattr(os, 'sched_setaffinity')
+
+def available_cores():
+    if affinity_supported():
+        return sorted(os.sched_getaffinity(0))
+    return list(range(os.cpu_count() or 1))
+
+def pin_to_cores(cores):
+    # Pins the calling process (and the threads it creates afterwards) to the given cores
+    if not cores:
+        return False
+    if not affinity_supported():
+        print("Warning: CPU affinity is not supported on this platform. Running unpinned.")
+        return False
+    os.sched_setaffinity(0, cores)
+    return True
@@ -0,0 +1,43 @@
+import json
+import time
+from contextlib import contextmanager
+
+# JSON-lines event channel to lightframe.py, see profiler_runner.EventTail. Every line is one object with an 'event'
+# ('clock_anchor', 'phase_begin', 'phase_end' or 'metrics'), a 't_ns' timestamp and event-specific fields. Without an
+# open channel (standalone runs, spawned sweep workers) phase events are dropped and metrics go to stdout.
+# Timestamps are time.monotonic_ns(), i.e. CLOCK_MONOTONIC like the C++ profiler and the power logger; the wall
+# clock is read once, as the anchor written when the channel is opened.
+
+_channel = None
+
+def open_channel(events_file_path):
+    global _channel
+    # Line buffered, so the runner sees every event as soon as it happens
+    _channel = open(events_file_path, 'a', buffering=1)
+    emit('clock_anchor', wall_ns=time.time_ns(), resolution_ns=int(time.get_clock_info('monotonic').resolution * 1e9))
+
+def close_channel():
+    global _channel
+    if _channel is not None:
+        _channel.close()
+        _channel = None
+
+def emit(event, **fields):
+    if _channel is None:
+        return
+    _channel.write(json.dumps(dict(event=event, t_ns=time.monotonic_ns(), source='python', **fields)) + "\n")
+
+@contextmanager
+def phase(name, **fields):
+    emit('phase_begin', phase=name, **fields)
+    try:
+        yield
+    finally:
+        emit('phase_end', phase=name, **fields)
+
+def emit_metrics(name, data):
+    # Structured results for lightframe.py, see profiler_runner.run_profiler_task
+    if _channel is None:
+        print(f"[METRICS] {json.dumps({name: data})}")
+    else:
+        emit('metrics', name=name, data=data)
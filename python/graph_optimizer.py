@@ -0,0 +1,67 @@
+import torch.nn as nn
+import copy
+from torch.nn.utils.fusion import fuse_conv_bn_eval
+import torch.ao.nn.intrinsic as nni
+
+GRAPH_OPTIMIZATION_PASSES = ['drop_dropout', 'fold_batchnorm', 'fuse_activations']
+
+def drop_dropout(layers):
+    # Dropout is the identity in eval mode, so the module call is pure overhead
+    kept = [layer for layer in layers if not isinstance(layer, nn.Dropout)]
+    return kept, len(layers) - len(kept)
+
+def fold_batchnorm(layers):
+    # A BatchNorm2d directly after a Conv2d is folded into the convolution's weight and bias. A conv2d layer with an
+    # activation_function is built as Conv2d -> activation, so a batchnorm2d layer that follows it comes after the
+    # nonlinearity and cannot be folded; those are counted as left unfolded.
+    folded = []
+    count = 0
+    not_adjacent = 0
+    for layer in layers:
+        previous = folded[-1] if folded else None
+        if isinstance(layer, nn.BatchNorm2d) and isinstance(previous, nn.Conv2d):
+            folded[-1] = fuse_conv_bn_eval(previous, layer)
+            count += 1
+        else:
+            not_adjacent += isinstance(layer, nn.BatchNorm2d)
+            folded.append(layer)
+    return folded, count, not_adjacent
+
+def fuse_activations(layers):
+    # Eager PyTorch has no fused float conv+relu kernel; the intrinsic modules mark the pair for backends
+    # that do (quantization, TorchScript freezing, torch.compile), and the ReLU runs in place so the
+    # activation no longer allocates and writes a second output tensor.
+    fused = []
+    count = 0
+    for layer in layers:
+        previous = fused[-1] if fused else None
+        if isinstance(layer, nn.ReLU) and isinstance(previous, nn.Conv2d):
+            fused[-1] = nni.ConvReLU2d(previous, nn.ReLU(inplace=True))
+            count += 1
+        elif isinstance(layer, nn.ReLU) and isinstance(previous, nn.Linear):
+            fused[-1] = nni.LinearReLU(previous, nn.ReLU(inplace=True))
+            count += 1
+        else:
+            fused.append(layer)
+    return fused, count
+
+def optimize_for_inference(network, passes):
+    # Returns an optimized copy of a CustomNet together with the number of modules each pass rewrote and notes on
+    # what a pass had to leave alone
+    optimized = copy.deepcopy(network).eval()
+    layers = list(optimized.layers)
+    pass_counts = {}
+    pass_notes = {}
+    for pass_name in GRAPH_OPTIMIZATION_PASSES:
+        if pass_name not in passes:
+            continue
+        if pass_name == 'drop_dropout':
+            layers, pass_counts[pass_name] = drop_dropout(layers)
+        elif pass_name == 'fold_batchnorm':
+            layers, pass_counts[pass_name], not_adjacent = fold_batchnorm(layers)
+            if not_adjacent > 0:
+                pass_notes[pass_name] = f"{not_adjacent} BatchNorm2d not adjacent to a Conv2d (e.g. after its activation), left unfolded"
+        elif pass_name == 'fuse_activations':
+            layers, pass_counts[pass_name] = fuse_activations(layers)
+    optimized.layers = nn.ModuleList(layers)
+    return optimized, pass_counts, pass_notes
@@ -1,53 +1,160 @@
 import torch
 import torch.nn as nn
+import numpy as np
 import time
 import json
+import math
 import random
+from latency_stats import summarize_latencies
+import events
 
-def profile_custom(network, device, input_shape, no_inferences, no_operations_warmup):
+DEFAULT_INPUT_POOL_SIZE = 64
+
+def create_input_pool(input_shape, batch_size, pool_size, device, pinned_inputs, channels_last=False, dtype=torch.float32):
+    # One contiguous block that the timed loop cycles through, so memory stays O(pool_size) for any no_inferences
+    generation_start = time.perf_counter_ns()
+    if channels_last:
+        # Allocated as [pool, batch, H, W, C] so that every [batch, C, H, W] view has channels_last strides
+        channels, height, width = input_shape
+        pool = torch.randn(pool_size, batch_size, height, width, channels).permute(0, 1, 4, 2, 3)
+    else:
+        pool = torch.randn(pool_size, batch_size, *input_shape)
+    if dtype != torch.float32:
+        pool = pool.to(dtype)
+    if device == 'gpu':
+        if pinned_inputs:
+            pool = pool.pin_memory()  # Stays on the host; each inference pays the host-to-device copy
+        else:
+            pool = pool.to(torch.device('cuda'))
+        torch.cuda.synchronize()
+    generation_ns = time.perf_counter_ns() - generation_start
+
+    pool_info = {
+        'size': pool_size,
+        'bytes': pool.element_size() * pool.nelement(),
+        'pinned': bool(pinned_inputs and device == 'gpu'),
+        'generation_ms': generation_ns / 1_000_000,
+    }
+    return list(pool.unbind(0)), pool_info
+
+def profile_custom(network, device, input_shape, no_inferences, no_operations_warmup, batch_size=1,
+                   input_pool_size=DEFAULT_INPUT_POOL_SIZE, pinned_inputs=False, channels_last=False, dtype=torch.float32,
+                   before_timed_run=None):
+    # before_timed_run: called right before the timed loop starts, e.g. to line up concurrent streams
     torch.set_grad_enabled(False)
     network.eval()
-    
-    inputs = []
-    for i in range(no_inferences):
-        input = torch.randn(input_shape).unsqueeze(0)  # Add a batch dimension of size 1
-        inputs.append(input)
+
+    pool_size = max(1, min(input_pool_size, no_inferences))
+    with events.phase('data_generation'):
+        inputs, pool_info = create_input_pool(input_shape, batch_size, pool_size, device, pinned_inputs, channels_last, dtype)
+
+    # Preallocated so that recording a sample inside the timed loop never allocates
+    latencies_ns = np.empty(no_inferences, dtype=np.int64)
 
     if device == 'cpu':
         if (no_operations_warmup > 0):
             print("Warming up...")
-            for i in range(no_operations_warmup):
-                output = network(random.choice(inputs))
-        
+            with events.phase('warmup'):
+                for i in range(no_operations_warmup):
+                    output = network(random.choice(inputs))
+
         print("Running inferences on CPU...")
-        start_time = time.time()
-        for input in inputs:
+        if before_timed_run is not None:
+            before_timed_run()
+        events.emit('phase_begin', phase='timed_run', batch_size=batch_size)
+        start_time = time.monotonic_ns()
+        for i in range(no_inferences):
+            input = inputs[i % pool_size]
+            iteration_start = time.perf_counter_ns()
             output = network(input)
-        end_time = time.time()
-        duration_sec = end_time - start_time
-        duration_ns = int(duration_sec * 1_000_000_000) # 1e9
-        return duration_ns, int(start_time * 1e9), int(end_time * 1e9)
+            latencies_ns[i] = time.perf_counter_ns() - iteration_start
+        end_time = time.monotonic_ns()
+        events.emit('phase_end', phase='timed_run', batch_size=batch_size)
     elif device == 'gpu':
         device = torch.device('cuda')  # Select the CUDA device
         net = network.to(device)  # Move the network to GPU
-        for i in range(len(inputs)):
-            inputs[i] = inputs[i].to(device)  # Move the individual tensor to the device
-        
+
         if (no_operations_warmup > 0):
-            print("Warming up...")    
-            for i in range(no_operations_warmup):
-                output = network(random.choice(inputs))
-        
+            print("Warming up...")
+            with events.phase('warmup'):
+                for i in range(no_operations_warmup):
+                    output = network(random.choice(inputs).to(device, non_blocking=True))
+                torch.cuda.synchronize()
+
+        # One event pair per inference; kernels are asynchronous, so host timers would only measure launch time
+        start_events = [torch.cuda.Event(enable_timing=True) for _ in range(no_inferences)]
+        end_events = [torch.cuda.Event(enable_timing=True) for _ in range(no_inferences)]
+
         print("Running inferences on GPU...")
         torch.cuda.synchronize()
-        start_time = time.time()
-        for input in inputs:
+        if before_timed_run is not None:
+            before_timed_run()
+        events.emit('phase_begin', phase='timed_run', batch_size=batch_size)
+        start_time = time.monotonic_ns()
+        copy_inputs = pool_info['pinned']
+        for i in range(no_inferences):
+            input = inputs[i % pool_size]
+            start_events[i].record()
+            if copy_inputs:
+                input = input.to(device, non_blocking=True)  # Pinned pool: the copy is part of each inference
             output = net(input)
+            end_events[i].record()
         torch.cuda.synchronize()
-        end_time = time.time()
-        duration_sec = end_time - start_time
-        duration_ns = int(duration_sec * 1_000_000_000) # 1e9
-        return duration_ns, int(start_time * 1e9), int(end_time * 1e9)
+        end_time = time.monotonic_ns()
+        events.emit('phase_end', phase='timed_run', batch_size=batch_size)
+        for i in range(no_inferences):
+            latencies_ns[i] = int(start_events[i].elapsed_time(end_events[i]) * 1_000_000)  # elapsed_time is in ms
     else:
         print("Error")
         exit(1)
+
+    duration_ns = end_time - start_time
+    run_info = {'latency': summarize_latencies(latencies_ns), 'input_pool': pool_info}
+    return duration_ns, start_time, end_time, run_info
+
+def find_throughput_knee(sweep_results, fraction_of_peak=0.9):
+    # Smallest batch size that already reaches the given fraction of the peak throughput
+    peak = max(result['samples_per_s'] for result in sweep_results)
+    for result in sweep_results:
+        if result['samples_per_s'] >= fraction_of_peak * peak:
+            return result['batch_size']
+    return None
+
+def profile_batch_sweep(network, device, input_shape, no_inferences, no_operations_warmup, batch_sizes,
+                        input_pool_size=DEFAULT_INPUT_POOL_SIZE, pinned_inputs=False, channels_last=False):
+    # The total number of samples is kept constant across batch sizes, so larger batches run fewer iterations
+    results = []
+    sweep_start_time = None
+    sweep_end_time = None
+    for batch_size in batch_sizes:
+        no_batches = max(1, math.ceil(no_inferences / batch_size))
+        no_batches_warmup = math.ceil(no_operations_warmup / batch_size)
+        print(f"Batch size {batch_size}: running {no_batches} batches...")
+        duration_ns, start_time, end_time, run_info = profile_custom(
+            network, device, input_shape, no_batches, no_batches_warmup, batch_size=batch_size,
+            input_pool_size=input_pool_size, pinned_inputs=pinned_inputs, channels_last=channels_last)
+        latency_stats = run_info['latency']
+
+        if sweep_start_time is None:
+            sweep_start_time = start_time
+        sweep_end_time = end_time
+        results.append({
+            'batch_size': batch_size,
+            'no_batches': no_batches,
+            'samples_per_s': no_batches * batch_size / (duration_ns / 1e9),
+            'batch_latency_mean_ms': latency_stats['mean_ms'],
+            'batch_latency_p50_ms': latency_stats['p50_ms'],
+            'batch_latency_p99_ms': latency_stats['p99_ms'],
+            'sample_latency_mean_ms': latency_stats['mean_ms'] / batch_size,
+            'input_generation_ms': run_info['input_pool']['generation_ms'],
+        })
+
+    knee_batch_size = find_throughput_knee(results)
+    for result in results:
+        result['knee'] = result['batch_size'] == knee_batch_size
+    sweep = {
+        'results': results,
+        'knee_batch_size': knee_batch_size,
+        'peak_samples_per_s': max(result['samples_per_s'] for result in results),
+    }
+    return sweep_start_time, sweep_end_time, sweep
@@ -0,0 +1,47 @@
+import numpy as np
+
+PERCENTILES = (50, 90, 95, 99, 99.9)
+
+def log_histogram(latencies_ns):
+    # Base-2 buckets in microseconds: [1, 2), [2, 4), [4, 8), ... us
+    latencies_us = np.maximum(latencies_ns, 1) / 1_000.0
+    low_exp = int(np.floor(np.log2(latencies_us.min())))
+    high_exp = int(np.floor(np.log2(latencies_us.max()))) + 1
+    edges = np.exp2(np.arange(low_exp, high_exp + 1, dtype=np.float64))
+    counts, _ = np.histogram(latencies_us, bins=edges)
+
+    histogram = []
+    for i, count in enumerate(counts):
+        if count > 0:
+            histogram.append({'lower_us': float(edges[i]), 'upper_us': float(edges[i + 1]), 'count': int(count)})
+    return histogram
+
+def summarize_latencies(latencies_ns, slowest_n=10):
+    latencies_ns = np.asarray(latencies_ns, dtype=np.int64)
+    if latencies_ns.size == 0:
+        return {'count': 0}
+
+    latencies_ms = latencies_ns / 1_000_000.0
+    stats = {
+        'count': int(latencies_ns.size),
+        'mean_ms': float(latencies_ms.mean()),
+        'std_ms': float(latencies_ms.std()),
+        'min_ms': float(latencies_ms.min()),
+        'max_ms': float(latencies_ms.max()),
+    }
+    for percentile, value in zip(PERCENTILES, np.percentile(latencies_ms, PERCENTILES)):
+        stats[f"p{percentile:g}_ms"] = float(value)
+
+    stats['histogram'] = log_histogram(latencies_ns)
+
+    slowest_n = min(slowest_n, latencies_ns.size)
+    slowest = np.argpartition(latencies_ns, -slowest_n)[-slowest_n:]
+    slowest = slowest[np.argsort(latencies_ns[slowest])[::-1]]
+    stats['slowest'] = [{'iteration': int(i), 'latency_ms': float(latencies_ms[i])} for i in slowest]
+    return stats
+
+def format_latency_line(stats):
+    if not stats or stats.get('count', 0) == 0:
+        return "No per-inference latencies recorded."
+    return (f"Latency p50: {stats['p50_ms']:.4f} ms, p90: {stats['p90_ms']:.4f} ms, "
+            f"p99: {stats['p99_ms']:.4f} ms, max: {stats['max_ms']:.4f} ms, std: {stats['std_ms']:.4f} ms")
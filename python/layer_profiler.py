@@ -0,0 +1,184 @@
+import torch
+import numpy as np
+import time
+
+class PhaseRecorder:
+    # Per-layer, per-iteration timings for one phase (forward or backward), preallocated before profiling
+    def __init__(self, num_layers, iterations, use_cuda_events):
+        self.use_cuda_events = use_cuda_events
+        if use_cuda_events:
+            self.start_events = [[torch.cuda.Event(enable_timing=True) for _ in range(iterations)] for _ in range(num_layers)]
+            self.end_events = [[torch.cuda.Event(enable_timing=True) for _ in range(iterations)] for _ in range(num_layers)]
+        else:
+            self.start_ns = np.zeros((num_layers, iterations), dtype=np.int64)
+        self.elapsed_ns = np.zeros((num_layers, iterations), dtype=np.int64)
+
+    def start(self, layer_index, iteration):
+        if self.use_cuda_events:
+            self.start_events[layer_index][iteration].record()
+        else:
+            self.start_ns[layer_index, iteration] = time.monotonic_ns()
+
+    def stop(self, layer_index, iteration):
+        if self.use_cuda_events:
+            self.end_events[layer_index][iteration].record()
+        else:
+            self.elapsed_ns[layer_index, iteration] = time.monotonic_ns() - self.start_ns[layer_index, iteration]
+
+    def elapsed(self):
+        if self.use_cuda_events:
+            torch.cuda.synchronize()
+            for layer_index, (starts, ends) in enumerate(zip(self.start_events, self.end_events)):
+                for iteration, (start_event, end_event) in enumerate(zip(starts, ends)):
+                    self.elapsed_ns[layer_index, iteration] = int(start_event.elapsed_time(end_event) * 1_000_000)
+        return self.elapsed_ns
+
+    def spans(self, iterations, anchor_ns=None, anchor_event=None):
+        # [layer index, CLOCK_MONOTONIC start in ns, duration in ns] of every layer in the first `iterations` iterations.
+        # CUDA events only measure relative to each other, so GPU starts are placed relative to an anchor event that
+        # was recorded on an idle device at host time anchor_ns.
+        elapsed_ns = self.elapsed()
+        spans = []
+        for iteration in range(min(iterations, elapsed_ns.shape[1])):
+            for layer_index in range(elapsed_ns.shape[0]):
+                if self.use_cuda_events:
+                    start_ns = anchor_ns + int(anchor_event.elapsed_time(self.start_events[layer_index][iteration]) * 1_000_000)
+                else:
+                    start_ns = int(self.start_ns[layer_index, iteration])
+                spans.append([layer_index, start_ns, int(elapsed_ns[layer_index, iteration])])
+        return spans
+
+class LayerTimer:
+    # Times every top-level module of CustomNet.layers through forward (and optionally backward) hooks
+    def __init__(self, network, device, iterations, include_backward=False):
+        self.modules = list(network.layers)
+        self.iteration = 0
+        self.handles = []
+        self.output_shapes = [None] * len(self.modules)
+        use_cuda_events = device == 'gpu'
+        self.forward = PhaseRecorder(len(self.modules), iterations, use_cuda_events)
+        self.backward = PhaseRecorder(len(self.modules), iterations, use_cuda_events) if include_backward else None
+        self.anchor_ns = None
+        self.anchor_event = None
+
+    def mark_anchor(self):
+        # Host time of an event recorded on an idle device, for placing CUDA event timings on the monotonic clock
+        if self.forward.use_cuda_events:
+            torch.cuda.synchronize()
+            self.anchor_event = torch.cuda.Event(enable_timing=True)
+            self.anchor_ns = time.monotonic_ns()
+            self.anchor_event.record()
+
+    def attach(self):
+        for layer_index, module in enumerate(self.modules):
+            self.handles.append(module.register_forward_pre_hook(self.make_forward_pre_hook(layer_index)))
+            self.handles.append(module.register_forward_hook(self.make_forward_hook(layer_index)))
+            if self.backward is not None:
+                self.handles.append(module.register_full_backward_pre_hook(self.make_backward_pre_hook(layer_index)))
+                self.handles.append(module.register_full_backward_hook(self.make_backward_hook(layer_index)))
+        return self
+
+    def detach(self):
+        for handle in self.handles:
+            handle.remove()
+        self.handles = []
+
+    def make_forward_pre_hook(self, layer_index):
+        def hook(module, inputs):
+            self.forward.start(layer_index, self.iteration)
+        return hook
+
+    def make_forward_hook(self, layer_index):
+        def hook(module, inputs, output):
+            self.forward.stop(layer_index, self.iteration)
+            if self.output_shapes[layer_index] is None:
+                self.output_shapes[layer_index] = list(output.shape[1:])
+        return hook
+
+    def make_backward_pre_hook(self, layer_index):
+        def hook(module, grad_output):
+            self.backward.start(layer_index, self.iteration)
+        return hook
+
+    def make_backward_hook(self, layer_index):
+        def hook(module, grad_input, grad_output):
+            self.backward.stop(layer_index, self.iteration)
+        return hook
+
+    def summarize(self, recorder):
+        elapsed_ms = recorder.elapsed() / 1_000_000.0
+        means = elapsed_ms.mean(axis=1)
+        p99s = np.percentile(elapsed_ms, 99, axis=1)
+        total = means.sum()
+
+        rows = []
+        for layer_index, module in enumerate(self.modules):
+            rows.append({
+                'index': layer_index,
+                'type': type(module).__name__,
+                'output_shape': self.output_shapes[layer_index],
+                'mean_ms': float(means[layer_index]),
+                'p99_ms': float(p99s[layer_index]),
+                'share': float(means[layer_index] / total) if total > 0 else 0.0,
+            })
+        return rows
+
+def profile_layers(network, device, input_shape, iterations, trace_iterations=0, include_backward=False, batch_size=1,
+                   no_operations_warmup=10):
+    # Runs after the main timed region so that the hook overhead never shows up in the end-to-end numbers
+    torch_device = torch.device('cuda') if device == 'gpu' else torch.device('cpu')
+    network.to(torch_device)
+    input = torch.randn(batch_size, *input_shape, device=torch_device)
+
+    if include_backward:
+        network.train()
+        # Full backward hooks reject modules that modify their inputs in place
+        inplace_modules = [module for module in network.modules() if getattr(module, 'inplace', False)]
+        for module in inplace_modules:
+            module.inplace = False
+        # The first layer only gets a backward hook call if its input requires a gradient
+        input.requires_grad_(True)
+    else:
+        network.eval()
+
+    def run_iteration():
+        if include_backward:
+            with torch.enable_grad():
+                output = network(input)
+                output.sum().backward()
+        else:
+            with torch.no_grad():
+                output = network(input)
+
+    for i in range(no_operations_warmup):
+        run_iteration()
+
+    timer = LayerTimer(network, device, iterations, include_backward).attach()
+    timer.mark_anchor()
+    try:
+        for i in range(iterations):
+            timer.iteration = i
+            run_iteration()
+    finally:
+        timer.detach()
+        if include_backward:
+            for module in inplace_modules:
+                module.inplace = True
+            network.zero_grad(set_to_none=True)
+
+    layer_profile = {'iterations': iterations, 'batch_size': batch_size, 'forward': timer.summarize(timer.forward)}
+    if include_backward:
+        layer_profile['backward'] = timer.summarize(timer.backward)
+    if trace_iterations > 0:
+        # Individual layer executions for the timeline export, see trace_exporter.py
+        layer_profile['spans'] = {'forward': timer.forward.spans(trace_iterations, timer.anchor_ns, timer.anchor_event)}
+        if include_backward:
+            layer_profile['spans']['backward'] = timer.backward.spans(trace_iterations, timer.anchor_ns, timer.anchor_event)
+    return layer_profile
+
+def format_layer_table(rows):
+    lines = [f"{'#':>3} {'Module':<14} {'Output shape':<18} {'Mean ms':>10} {'P99 ms':>10} {'Share':>7}"]
+    for row in rows:
+        lines.append(f"{row['index']:>3} {row['type']:<14} {str(row['output_shape']):<18} {row['mean_ms']:>10.4f} "
+                     f"{row['p99_ms']:>10.4f} {row['share'] * 100:>6.1f}%")
+    return "\n".join(lines)
@@ -0,0 +1,106 @@
+import torch
+import multiprocessing
+import os
+import constructor
+import inference
+from cpu_affinity import pin_to_cores, available_cores
+from parameter_parser import get_inference_params, get_input_pool_params, get_warmup_params
+
+# Longest a stream waits at the start barrier for the others to build, warm up and generate their input pools
+BARRIER_TIMEOUT_S = 600
+
+def split_cores(no_streams):
+    # Disjoint, equally sized core sets, one per stream; None if there are fewer cores than streams
+    cores = available_cores()
+    cores_per_stream = len(cores) // no_streams
+    if cores_per_stream < 1:
+        return None
+    return [cores[i * cores_per_stream:(i + 1) * cores_per_stream] for i in range(no_streams)]
+
+def run_stream(config_data, stream_index, no_streams, cores, barrier, result_queue):
+    # Every stream is an independent process with its own CustomNet, as with one model instance per camera
+    pinned = pin_to_cores(cores)
+    if config_data['network']['device'] == 'cpu':
+        # Without this every process would start a full-size intra-op pool and oversubscribe the cores
+        torch.set_num_threads(len(cores) if pinned else max(1, (os.cpu_count() or 1) // no_streams))
+
+    network = constructor.build_custom_net(config_data['network']['layers'])
+    device = config_data['network']['device']
+    input_shape, no_inferences = get_inference_params(config_data)
+    input_pool_size, pinned_inputs = get_input_pool_params(config_data)
+    no_operations_warmup = get_warmup_params(config_data)[0]
+
+    torch_device = torch.device('cuda') if device == 'gpu' else torch.device('cpu')
+    network.eval().to(torch_device)
+    with torch.no_grad():
+        warmup_input = torch.randn(1, *input_shape, device=torch_device)
+        for i in range(no_operations_warmup):
+            network(warmup_input)
+
+    # All streams start their timed loops together, after every process has built, warmed up and generated its input
+    # pool. A stream that never arrives breaks the barrier, which fails the other streams instead of blocking them.
+    duration_ns, start_time, end_time, run_info = inference.profile_custom(network, device, input_shape, no_inferences, 0,
+                                                                           input_pool_size=input_pool_size, pinned_inputs=pinned_inputs,
+                                                                           before_timed_run=lambda: barrier.wait(timeout=BARRIER_TIMEOUT_S))
+    latency_stats = run_info['latency']
+    result_queue.put({
+        'stream': stream_index,
+        'cores': list(cores) if pinned else None,
+        'start_time': start_time,
+        'end_time': end_time,
+        'inferences_per_s': no_inferences / (duration_ns / 1e9),
+        'mean_ms': latency_stats['mean_ms'],
+        'p50_ms': latency_stats['p50_ms'],
+        'p99_ms': latency_stats['p99_ms'],
+    })
+
+def run_streams(config_data, no_streams, pin_cores):
+    context = multiprocessing.get_context('spawn')
+    barrier = context.Barrier(no_streams)
+    result_queue = context.Queue()
+    core_sets = split_cores(no_streams) if pin_cores else None
+    if pin_cores and core_sets is None:
+        print(f"Warning: fewer cores than {no_streams} streams. Running unpinned.")
+
+    workers = []
+    for stream_index in range(no_streams):
+        cores = core_sets[stream_index] if core_sets else None
+        worker = context.Process(target=run_stream, args=(config_data, stream_index, no_streams, cores, barrier, result_queue))
+        worker.start()
+        workers.append(worker)
+    while any(worker.is_alive() for worker in workers):
+        if any(worker.exitcode not in (None, 0) for worker in workers):
+            # A failed stream never reaches the barrier; release the others right away
+            barrier.abort()
+        for worker in workers:
+            worker.join(timeout=0.1)
+    if any(worker.exitcode != 0 for worker in workers):
+        print(f"Warning: a stream worker failed with {no_streams} streams. Skipping this configuration.")
+        return None
+
+    streams = sorted([result_queue.get() for _ in range(no_streams)], key=lambda result: result['stream'])
+    no_inferences = config_data['network']['inference_params']['no_inferences']
+    # Aggregate throughput over the span from the first stream starting to the last one finishing
+    span_s = (max(stream['end_time'] for stream in streams) - min(stream['start_time'] for stream in streams)) / 1e9
+    return {
+        'streams': no_streams,
+        'pinned': core_sets is not None,
+        'aggregate_inferences_per_s': no_streams * no_inferences / span_s if span_s > 0 else 0.0,
+        'per_stream': streams,
+    }
+
+def profile_multi_stream(config_data, stream_counts, pin_cores):
+    results = []
+    for no_streams in stream_counts:
+        print(f"Running {no_streams} concurrent inference stream(s)...")
+        result = run_streams(config_data, no_streams, pin_cores)
+        if result is not None:
+            results.append(result)
+
+    # Scaling efficiency relative to the smallest stream count, 1.0 means perfectly linear scaling
+    if results:
+        baseline = min(results, key=lambda result: result['streams'])
+        for result in results:
+            speedup = result['aggregate_inferences_per_s'] / baseline['aggregate_inferences_per_s']
+            result['scaling_efficiency'] = speedup / (result['streams'] / baseline['streams'])
+    return {'results': results}
@@ -3,6 +3,26 @@ def get_inference_params(config_data):
     no_inference = config_data['network']['inference_params']['no_inferences']
     return [input_shape, no_inference]
 
+def get_input_pool_params(config_data):
+    input_pool_size = config_data['network']['inference_params'].get('input_pool_size', 64)
+    pinned_inputs = config_data['network']['inference_params'].get('pinned_inputs', False)
+    return [input_pool_size, pinned_inputs]
+
+def get_batch_sizes(config_data):
+    return config_data['network']['inference_params'].get('batch_sizes')
+
+def get_execution_backends(config_data):
+    execution_backend = config_data['network'].get('execution_backend', 'eager')
+    if isinstance(execution_backend, str):
+        return [execution_backend]
+    return execution_backend
+
+def get_precisions(config_data):
+    return config_data['network']['inference_params'].get('precisions')
+
+def get_graph_optimizations(config_data):
+    return config_data['network'].get('graph_optimizations', [])
+
 def get_training_params(config_data):
     optimizer_choice = config_data['network']['training_params']['optimizer']
     learning_rate = config_data['network']['training_params']['learning_rate']
@@ -15,6 +35,58 @@ def get_training_params(config_data):
     task = config_data['network']['task']
     return [optimizer_choice, learning_rate, loss_function, batch_size, epochs, num_samples, num_classes, input_shape, task]
 
+def get_training_options(config_data):
+    # Optional training_params settings, passed to training.train_network as keyword arguments
+    training_params = config_data['network']['training_params']
+    synthetic_data = training_params.get('synthetic_data', {})
+    return {'step_breakdown': training_params.get('step_breakdown', False),
+            'data_loader': training_params.get('data_loader', 'batch_sampler'),
+            'data_seed': synthetic_data.get('seed', 0),
+            'data_storage': synthetic_data.get('storage', 'auto'),
+            'data_cache_dir': synthetic_data.get('cache_dir', 'data_cache'),
+            'prefetch_workers': synthetic_data.get('prefetch_workers', 2),
+            'autocast': training_params.get('autocast', False),
+            'set_to_none': training_params.get('set_to_none', False),
+            'optimizer_impl': training_params.get('optimizer_impl', 'default'),
+            'gradient_accumulation_steps': training_params.get('gradient_accumulation_steps', 1),
+            'variants': training_params.get('variants')}
+
+def get_layer_profiling_params(config_data):
+    # Returns None unless per-layer profiling is switched on
+    layer_profiling = config_data['network'].get('layer_profiling', {'status': 'off'})
+    if layer_profiling['status'] != 'on':
+        return None
+    return [layer_profiling.get('iterations', 100), layer_profiling.get('trace_iterations', 0)]
+
+def get_thread_sweep_params(config_data):
+    # Returns None unless a thread sweep is configured
+    thread_sweep = config_data['network'].get('thread_sweep')
+    if not thread_sweep:
+        return None
+    intra_op_threads = thread_sweep['intra_op_threads']
+    inter_op_threads = thread_sweep.get('inter_op_threads', [1])
+    core_sets = thread_sweep.get('core_sets', [None])
+    return [intra_op_threads, inter_op_threads, core_sets]
+
+def get_serving_params(config_data):
+    # Returns None unless a serving benchmark is configured
+    serving = config_data['network'].get('serving')
+    if not serving:
+        return None
+    request_rates = serving.get('request_rates', [])
+    concurrency_levels = serving.get('concurrency', [])
+    duration_s = serving.get('duration_s', 5)
+    max_batch_size = serving.get('max_batch_size', 8)
+    max_queue_delay_ms = serving.get('max_queue_delay_ms', 2)
+    return [request_rates, concurrency_levels, duration_s, max_batch_size, max_queue_delay_ms]
+
+def get_multi_stream_params(config_data):
+    # Returns None unless a multi-stream scaling run is configured
+    multi_stream = config_data['network'].get('multi_stream')
+    if not multi_stream:
+        return None
+    return [multi_stream['streams'], multi_stream.get('pin_cores', False)]
+
 def get_warmup_params(config_data):
     no_operations = config_data['network']['warmup_params']['no_operations']
     return [no_operations]
\ No newline at end of file
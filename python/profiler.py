@@ -1,39 +1,255 @@
 import constructor
 import inference
 import training
+import layer_profiler
+import backends
+import quantization
+import graph_optimizer
+import thread_sweep
+import serving
+import multistream
+import step_breakdown
+import batch_sampler
 import json
-from parameter_parser import get_inference_params, get_training_params, get_warmup_params
+import sys
+import time
+import events
+from events import emit_metrics
+from parameter_parser import get_inference_params, get_input_pool_params, get_batch_sizes, get_execution_backends, get_precisions, get_graph_optimizations, get_training_params, get_training_options, get_warmup_params, get_layer_profiling_params, get_thread_sweep_params, get_serving_params, get_multi_stream_params
 import argparse
+from latency_stats import format_latency_line
 
 def read_config_file(config_file_path):
     with open(config_file_path, 'r') as config_file:
         config_data = json.load(config_file)
     return config_data
 
-parser = argparse.ArgumentParser()
-parser.add_argument('-c', type=str, default='../configs/network_config.json', help='Path to the configuration file')
-args = parser.parse_args()
-config_data = read_config_file(args.c)
-    
-network = constructor.build_custom_net(config_data['network']['layers'])
-#constructor.print_network_architecture(network)
-    
-device = config_data['network']['device']
-warmup_params = get_warmup_params(config_data)
-
-if config_data['network']['mode'] == 'inference':
+def profile_backend_single(config_data, model, device, warmup_params, channels_last, is_primary):
     inference_params = get_inference_params(config_data)
-    inference_time, start_time, end_time = inference.profile_custom(network, device, *inference_params, *warmup_params)
+    input_pool_size, pinned_inputs = get_input_pool_params(config_data)
+    inference_time, start_time, end_time, run_info = inference.profile_custom(model, device, *inference_params, *warmup_params,
+                                                                              input_pool_size=input_pool_size, pinned_inputs=pinned_inputs,
+                                                                              channels_last=channels_last)
+    latency_stats = run_info['latency']
     total_time = inference_time * pow(10, -6)
-    print(f"[START TIME] {start_time} - [END TIME] {end_time}")
+    if is_primary:
+        print(f"[START TIME] {start_time} - [END TIME] {end_time}")
+        emit_metrics('latency', latency_stats)
+        emit_metrics('input_pool', run_info['input_pool'])
+    print(f"Generated an input pool of {run_info['input_pool']['size']} tensors ({run_info['input_pool']['bytes']} bytes) "
+          f"in {run_info['input_pool']['generation_ms']:.3f} ms (not part of the timed run).")
     print(f"Ran {config_data['network']['inference_params']['no_inferences']} inferences in {total_time} ms.")
     print(f"Time spent per inference: {str(total_time / config_data['network']['inference_params']['no_inferences'])} ms on average.")
-elif config_data['network']['mode'] == 'training':
-    training_params = get_training_params(config_data)
-    training_time, start_time, end_time = training.train_network(network, device, *training_params, *warmup_params)
-    total_time = training_time * pow(10, -6)
+    print(format_latency_line(latency_stats))
+    return inference_time, latency_stats
+
+def profile_backend_sweep(config_data, model, device, warmup_params, channels_last):
+    inference_params = get_inference_params(config_data)
+    start_time, end_time, sweep = inference.profile_batch_sweep(model, device, *inference_params, *warmup_params, get_batch_sizes(config_data),
+                                                                *get_input_pool_params(config_data), channels_last=channels_last)
     print(f"[START TIME] {start_time} - [END TIME] {end_time}")
-    print(f"Trained for {config_data['network']['training_params']['epochs']} epochs in {total_time} ms.")
-    print(f"Time spent per epoch: {total_time / config_data['network']['training_params']['epochs']} ms on average.")
-else:
-    print("Invalid mode specified in the configuration file.")
\ No newline at end of file
+    emit_metrics('batch_sweep', sweep)
+    for result in sweep['results']:
+        knee_marker = " (knee)" if result['knee'] else ""
+        print(f"Batch size {result['batch_size']}: {result['samples_per_s']:.1f} samples/s, "
+              f"{result['batch_latency_mean_ms']:.4f} ms per batch, {result['sample_latency_mean_ms']:.4f} ms per sample{knee_marker}")
+
+def profile_precisions(config_data, network, device, warmup_params):
+    # Compared after the main fp32 run, which stays comparable with the LibTorch profiler
+    inference_params = get_inference_params(config_data)
+    input_shape, no_inferences = inference_params
+    input_pool_size, pinned_inputs = get_input_pool_params(config_data)
+    precision_results = []
+    for precision in get_precisions(config_data):
+        model, info = quantization.prepare_precision(network, precision, device, input_shape)
+        if model is None:
+            print(f"Skipping precision '{precision}': {info}")
+            continue
+        print(f"Precision '{precision}': prepared in {info['preparation_ms']:.3f} ms, model size {info['model_size_bytes']} bytes.")
+        inference_time, start_time, end_time, run_info = inference.profile_custom(model, device, *inference_params, *warmup_params,
+                                                                                  input_pool_size=input_pool_size, pinned_inputs=pinned_inputs,
+                                                                                  dtype=quantization.input_dtype(precision))
+        info['max_abs_deviation'] = quantization.max_output_deviation(network, model, precision, device, input_shape)
+        info['inferences_per_s'] = no_inferences / (inference_time / 1e9)
+        for key in ['mean_ms', 'p50_ms', 'p99_ms']:
+            info[key] = run_info['latency'][key]
+        print(f"Precision '{precision}': {format_latency_line(run_info['latency'])}, "
+              f"max deviation from fp32 {info['max_abs_deviation']:.6g}")
+        precision_results.append(info)
+    emit_metrics('precisions', precision_results)
+
+def profile_serving(config_data, network, device, warmup_params):
+    # Concurrent single-sample requests through a dynamic batcher, after the synchronous profile
+    request_rates, concurrency_levels, duration_s, max_batch_size, max_queue_delay_ms = get_serving_params(config_data)
+    input_pool_size, pinned_inputs = get_input_pool_params(config_data)
+    serving_profile = serving.profile_serving(network, device, config_data['network']['input_shape'], *warmup_params,
+                                              request_rates, concurrency_levels, duration_s, max_batch_size, max_queue_delay_ms,
+                                              input_pool_size=input_pool_size)
+    emit_metrics('serving', serving_profile)
+    for result in serving_profile['results']:
+        latency = result['end_to_end_latency']
+        print(f"Offered {result['offered_load']} ({result['load_type']}): {result['throughput_per_s']:.1f} requests/s, "
+              f"mean batch size {result['mean_batch_size']:.2f}, queueing p50 {result['queueing_delay']['p50_ms']:.4f} ms, "
+              f"end-to-end p50 {latency['p50_ms']:.4f} ms, p99 {latency['p99_ms']:.4f} ms")
+
+def profile_graph_optimization(config_data, network, device, warmup_params):
+    # Returns the optimized network, which every later inference profile uses
+    inference_params = get_inference_params(config_data)
+    input_pool_size, pinned_inputs = get_input_pool_params(config_data)
+    optimized, pass_counts, pass_notes = graph_optimizer.optimize_for_inference(network, get_graph_optimizations(config_data))
+    for pass_name, count in pass_counts.items():
+        note = f" ({pass_notes[pass_name]})" if pass_name in pass_notes else ""
+        print(f"Graph optimization '{pass_name}': rewrote {count} module(s){note}.")
+
+    latencies = {}
+    for label, model in [('before', network), ('after', optimized)]:
+        inference_time, start_time, end_time, run_info = inference.profile_custom(model, device, *inference_params, *warmup_params,
+                                                                                  input_pool_size=input_pool_size, pinned_inputs=pinned_inputs)
+        latencies[label] = {key: run_info['latency'][key] for key in ['mean_ms', 'p50_ms', 'p99_ms']}
+        print(f"Graph optimization, {label}: {format_latency_line(run_info['latency'])}")
+    emit_metrics('graph_optimization', {'passes': pass_counts, 'notes': pass_notes, 'before': latencies['before'], 'after': latencies['after']})
+    return optimized
+
+def run_clock_echo():
+    # Answers every line on stdin with the current CLOCK_MONOTONIC timestamp, so clock_check.py can measure the offset
+    # between this process and the power logger
+    print(f"READY {int(time.get_clock_info('monotonic').resolution * 1e9)}", flush=True)
+    for line in sys.stdin:
+        if line.strip() == 'quit':
+            break
+        print(time.monotonic_ns(), flush=True)
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('-c', type=str, default='../configs/network_config.json', help='Path to the configuration file')
+    parser.add_argument('-e', type=str, default=None, help='Path of the JSON-lines event file read by lightframe.py')
+    parser.add_argument('--clock-check', action='store_true', help='Echo monotonic timestamps for clock_check.py and exit')
+    args = parser.parse_args()
+    if args.clock_check:
+        run_clock_echo()
+        return
+    config_data = read_config_file(args.c)
+    if args.e:
+        events.open_channel(args.e)
+
+    with events.phase('build'):
+        network = constructor.build_custom_net(config_data['network']['layers'])
+    #constructor.print_network_architecture(network)
+
+    device = config_data['network']['device']
+    warmup_params = get_warmup_params(config_data)
+
+    if config_data['network']['mode'] == 'inference':
+        inference_params = get_inference_params(config_data)
+        if get_graph_optimizations(config_data):
+            with events.phase('graph_optimization'):
+                network = profile_graph_optimization(config_data, network, device, warmup_params)
+        execution_backends = get_execution_backends(config_data)
+        backend_results = []
+        for backend in execution_backends:
+            with events.phase('backend_preparation', backend=backend):
+                model, preparation = backends.prepare_backend(network, backend, device, config_data['network']['input_shape'])
+            if model is None:
+                print(f"Skipping execution backend '{backend}': {preparation}")
+                continue
+            channels_last = backends.uses_channels_last(backend)
+            print(f"Execution backend '{backend}': converted in {preparation['conversion_ms']:.3f} ms, "
+                  f"first call took {preparation['first_call_ms']:.3f} ms (both excluded from the timed run).")
+
+            # The first usable backend drives the power analysis window; any further backends are compared at batch size 1
+            is_primary = not backend_results
+            if is_primary and get_batch_sizes(config_data):
+                profile_backend_sweep(config_data, model, device, warmup_params, channels_last)
+                if len(execution_backends) == 1:
+                    backend_results.append(preparation)
+                    continue
+            inference_time, latency_stats = profile_backend_single(config_data, model, device, warmup_params, channels_last,
+                                                                   is_primary and not get_batch_sizes(config_data))
+            backend_results.append(dict(preparation,
+                                        inferences_per_s=inference_params[1] / (inference_time / 1e9),
+                                        mean_ms=latency_stats['mean_ms'],
+                                        p50_ms=latency_stats['p50_ms'],
+                                        p99_ms=latency_stats['p99_ms']))
+
+        if len(execution_backends) > 1:
+            emit_metrics('backends', backend_results)
+
+        if get_precisions(config_data):
+            with events.phase('precision_comparison'):
+                profile_precisions(config_data, network, device, warmup_params)
+
+        if get_serving_params(config_data) is not None:
+            with events.phase('serving'):
+                profile_serving(config_data, network, device, warmup_params)
+
+        if get_multi_stream_params(config_data) is not None:
+            with events.phase('multi_stream'):
+                multi_stream = multistream.profile_multi_stream(config_data, *get_multi_stream_params(config_data))
+            emit_metrics('multi_stream', multi_stream)
+            for result in multi_stream['results']:
+                print(f"{result['streams']} stream(s): {result['aggregate_inferences_per_s']:.1f} inferences/s in total, "
+                      f"scaling efficiency {result['scaling_efficiency'] * 100:.1f}%")
+                for stream in result['per_stream']:
+                    print(f"  Stream {stream['stream']}" + (f" on cores {stream['cores']}" if stream['cores'] else "")
+                          + f": {stream['inferences_per_s']:.1f} inferences/s, p50 {stream['p50_ms']:.4f} ms, p99 {stream['p99_ms']:.4f} ms")
+    elif config_data['network']['mode'] == 'training':
+        training_params = get_training_params(config_data)
+        training_time, start_time, end_time, run_info = training.train_network(network, device, *training_params, *warmup_params,
+                                                                               **get_training_options(config_data))
+        total_time = training_time * pow(10, -6)
+        print(f"[START TIME] {start_time} - [END TIME] {end_time}")
+        emit_metrics('training', run_info)
+        print(f"Trained for {config_data['network']['training_params']['epochs']} epochs in {total_time} ms.")
+        print(f"Time spent per epoch: {total_time / config_data['network']['training_params']['epochs']} ms on average.")
+        print(f"Throughput: {run_info['samples_per_s']:.1f} samples/s, final epoch loss {run_info['epoch_losses'][-1]:.4f}")
+        data_info = run_info['synthetic_data']
+        if data_info['storage'] == 'disk':
+            print(f"Training data: {data_info['bytes'] / (1024 * 1024):.1f} MiB on disk ({'cached' if data_info['cached'] else 'generated'}: {data_info['path']})")
+        else:
+            print(f"Training data: {data_info['bytes'] / (1024 * 1024):.1f} MiB in memory (seed {data_info['seed']})")
+        print("Data loader overhead:")
+        print(batch_sampler.format_loader_overhead(run_info['data_loader']))
+        print(f"Peak memory: {run_info['peak_memory_mb']:.1f} MiB")
+        for variant in run_info.get('variants', [])[1:]:
+            memory = f", peak memory {variant['peak_memory_mb']:.1f} MiB ({variant['memory_ratio']:.2f}x)" if variant['memory_ratio'] is not None else ""
+            print(f"Variant {variant['name']}: {variant['samples_per_s']:.1f} samples/s ({variant['speedup']:.2f}x){memory}, "
+                  f"final epoch loss {variant['final_loss']:.4f}")
+        if 'step_breakdown' in run_info:
+            breakdown = run_info['step_breakdown']
+            print(f"Step breakdown over {breakdown['steps']} steps ({breakdown['bound']}-bound):")
+            print(step_breakdown.format_step_table(breakdown))
+            print(format_latency_line(breakdown['step_latency']).replace("Latency", "Step latency", 1))
+    else:
+        print("Invalid mode specified in the configuration file.")
+
+    thread_sweep_params = get_thread_sweep_params(config_data)
+    if thread_sweep_params is not None and device != 'cpu':
+        print("Skipping thread sweep: it only applies to the 'cpu' device.")
+    elif thread_sweep_params is not None and config_data['network']['mode'] in ['inference', 'training']:
+        with events.phase('thread_sweep'):
+            sweep = thread_sweep.sweep_threads(config_data, *thread_sweep_params)
+        emit_metrics('thread_sweep', sweep)
+        for result in sweep['results']:
+            print(f"{result['intra_op_threads']} intra-op / {result['inter_op_threads']} inter-op threads"
+                  + (f" on cores {result['cores']}" if result['cores'] else "")
+                  + f": {result['duration_ms']:.3f} ms, speedup {result['speedup']:.2f}x, efficiency {result['parallel_efficiency'] * 100:.1f}%")
+
+    layer_profiling_params = get_layer_profiling_params(config_data)
+    if layer_profiling_params is not None and config_data['network']['mode'] in ['inference', 'training']:
+        include_backward = config_data['network']['mode'] == 'training'
+        batch_size = config_data['network']['training_params']['batch_size'] if include_backward else 1
+        print(f"Profiling individual layers over {layer_profiling_params[0]} iterations...")
+        with events.phase('layer_profiling'):
+            layer_profile = layer_profiler.profile_layers(network, device, config_data['network']['input_shape'], *layer_profiling_params,
+                                                          include_backward=include_backward, batch_size=batch_size)
+        emit_metrics('layer_profile', layer_profile)
+        print("Forward time per layer:")
+        print(layer_profiler.format_layer_table(layer_profile['forward']))
+        if include_backward:
+            print("Backward time per layer:")
+            print(layer_profiler.format_layer_table(layer_profile['backward']))
+
+    events.close_channel()
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,87 @@
+import torch
+import torch.nn as nn
+import copy
+import io
+import time
+
+PRECISIONS = ['fp32', 'fp16', 'bf16', 'int8_dynamic', 'int8_static']
+
+def model_size_bytes(model):
+    # Serialized state_dict size, which counts packed int8 weights at their real size
+    buffer = io.BytesIO()
+    torch.save(model.state_dict(), buffer)
+    return buffer.getbuffer().nbytes
+
+def input_dtype(precision):
+    if precision == 'fp16':
+        return torch.float16
+    elif precision == 'bf16':
+        return torch.bfloat16
+    return torch.float32
+
+def quantize_dynamic_int8(network):
+    # Weights of dense layers are stored as int8, activations are quantized on the fly per batch
+    return torch.ao.quantization.quantize_dynamic(copy.deepcopy(network), {nn.Linear}, dtype=torch.qint8)
+
+def quantize_static_int8(network, input_shape, calibration_batches):
+    # FX graph mode handles the residual additions that eager-mode static quantization cannot
+    from torch.ao.quantization import get_default_qconfig_mapping
+    from torch.ao.quantization.quantize_fx import prepare_fx, convert_fx
+
+    # fbgemm on x86, qnnpack on ARM edge boards
+    backend = 'fbgemm' if 'fbgemm' in torch.backends.quantized.supported_engines else 'qnnpack'
+    torch.backends.quantized.engine = backend
+
+    example_inputs = (torch.randn(1, *input_shape),)
+    prepared = prepare_fx(copy.deepcopy(network).eval(), get_default_qconfig_mapping(backend), example_inputs)
+    # Observer calibration pass on synthetic inputs
+    with torch.no_grad():
+        for i in range(calibration_batches):
+            prepared(torch.randn(1, *input_shape))
+    return convert_fx(prepared)
+
+def prepare_precision(network, precision, device, input_shape, calibration_batches=32):
+    # Returns (model, info) or (None, reason) when the variant cannot run on this device
+    if precision in ['int8_dynamic', 'int8_static'] and device != 'cpu':
+        return None, "PyTorch int8 kernels only run on the CPU"
+    if precision == 'fp16' and device == 'cpu':
+        return None, "fp16 matmul and convolution kernels are not generally available on the CPU"
+    if precision == 'bf16' and device == 'gpu' and not torch.cuda.is_bf16_supported():
+        return None, "this GPU does not support bf16"
+
+    network.eval()
+    network.to(torch.device('cpu'))
+    preparation_start = time.perf_counter_ns()
+    if precision == 'fp32':
+        model = network
+    elif precision in ['fp16', 'bf16']:
+        model = copy.deepcopy(network).to(input_dtype(precision))
+    elif precision == 'int8_dynamic':
+        model = quantize_dynamic_int8(network)
+    elif precision == 'int8_static':
+        model = quantize_static_int8(network, input_shape, calibration_batches)
+    else:
+        return None, f"unknown precision '{precision}'"
+    preparation_ns = time.perf_counter_ns() - preparation_start
+
+    info = {
+        'precision': precision,
+        'preparation_ms': preparation_ns / 1_000_000,
+        'model_size_bytes': model_size_bytes(model),
+    }
+    return model, info
+
+def max_output_deviation(reference_model, model, precision, device, input_shape, batches=8):
+    # Max absolute difference to the fp32 baseline on the same synthetic inputs
+    torch_device = torch.device('cuda') if device == 'gpu' else torch.device('cpu')
+    reference_model.to(torch_device)
+    model.to(torch_device)
+    max_deviation = 0.0
+    generator = torch.Generator().manual_seed(0)
+    with torch.no_grad():
+        for i in range(batches):
+            input = torch.randn(1, *input_shape, generator=generator).to(torch_device)
+            reference_output = reference_model(input).float()
+            output = model(input.to(input_dtype(precision))).float()
+            max_deviation = max(max_deviation, (output - reference_output).abs().max().item())
+    return max_deviation
@@ -0,0 +1,197 @@
+import torch
+import numpy as np
+import threading
+import queue
+import time
+from latency_stats import summarize_latencies
+
+DEFAULT_MAX_BATCH_SIZE = 8
+DEFAULT_MAX_QUEUE_DELAY_MS = 2.0
+
+class Request:
+    __slots__ = ('arrival_ns', 'input', 'batch_start_ns', 'completion_ns', 'done')
+
+    def __init__(self, arrival_ns, input):
+        self.arrival_ns = arrival_ns
+        self.input = input
+        self.batch_start_ns = None
+        self.completion_ns = None
+        self.done = threading.Event()
+
+class DynamicBatcher:
+    # Groups queued requests into one forward pass until max_batch_size is reached or the oldest request
+    # has waited max_queue_delay_ms, whichever comes first
+    def __init__(self, network, device, input_shape, max_batch_size, max_queue_delay_ms):
+        self.network = network
+        self.device = device
+        self.max_batch_size = max_batch_size
+        self.max_queue_delay_ns = int(max_queue_delay_ms * 1_000_000)
+        self.requests = queue.Queue()
+        self.batch_sizes = []
+        self.error = None
+        torch_device = torch.device('cuda') if device == 'gpu' else torch.device('cpu')
+        # Requests are copied into slices of one preallocated batch buffer instead of being concatenated
+        self.batch_buffer = torch.empty(max_batch_size, *input_shape, device=torch_device)
+        self.worker = threading.Thread(target=self.serve, daemon=True)
+
+    def start(self):
+        self.worker.start()
+
+    def submit(self, request):
+        self.requests.put(request)
+
+    def stop(self):
+        self.requests.put(None)
+        self.worker.join()
+        if self.error is not None:
+            raise RuntimeError(f"Dynamic batcher failed: {self.error}") from self.error
+
+    def collect_batch(self, first):
+        batch = [first]
+        deadline_ns = first.arrival_ns + self.max_queue_delay_ns
+        while len(batch) < self.max_batch_size:
+            remaining_s = (deadline_ns - time.perf_counter_ns()) / 1e9
+            try:
+                request = self.requests.get(timeout=remaining_s) if remaining_s > 0 else self.requests.get_nowait()
+            except queue.Empty:
+                break
+            if request is None:
+                self.requests.put(None)  # Handled after this batch
+                break
+            batch.append(request)
+        return batch
+
+    def serve(self):
+        torch.set_grad_enabled(False)
+        while True:
+            first = self.requests.get()
+            if first is None:
+                return
+            if self.error is not None:
+                # After a failed batch requests are only released, so no client waits forever; stop() re-raises
+                first.done.set()
+                continue
+            batch = self.collect_batch(first)
+            try:
+                self.run_batch(batch)
+            except Exception as e:
+                self.error = e
+                for request in batch:
+                    request.done.set()
+
+    def run_batch(self, batch):
+        batch_start_ns = time.perf_counter_ns()
+        for i, request in enumerate(batch):
+            # Every request input is a batch of one
+            self.batch_buffer[i].copy_(request.input[0], non_blocking=True)
+            request.batch_start_ns = batch_start_ns
+        self.network(self.batch_buffer[:len(batch)])
+        if self.device == 'gpu':
+            torch.cuda.synchronize()
+        completion_ns = time.perf_counter_ns()
+        self.batch_sizes.append(len(batch))
+        for request in batch:
+            request.completion_ns = completion_ns
+            request.done.set()
+
+def generate_open_loop(batcher, inputs, request_rate, duration_s, seed=0):
+    # Poisson arrivals at a fixed rate that do not wait for earlier responses. Each request is stamped with its
+    # scheduled arrival time, so a late generator cannot hide queueing delay (coordinated omission).
+    generator = np.random.default_rng(seed)
+    no_requests = max(1, int(request_rate * duration_s))
+    arrival_offsets_ns = np.cumsum(generator.exponential(1e9 / request_rate, no_requests)).astype(np.int64)
+    requests = []
+    start_ns = time.perf_counter_ns()
+    for i, offset_ns in enumerate(arrival_offsets_ns):
+        if batcher.error is not None:
+            break
+        arrival_ns = start_ns + int(offset_ns)
+        wait_s = (arrival_ns - time.perf_counter_ns()) / 1e9
+        if wait_s > 0:
+            time.sleep(wait_s)
+        request = Request(arrival_ns, inputs[i % len(inputs)])
+        requests.append(request)
+        batcher.submit(request)
+    return requests
+
+def generate_closed_loop(batcher, inputs, concurrency, duration_s):
+    # A fixed number of clients that each send their next request as soon as the previous one returns
+    requests = [[] for _ in range(concurrency)]
+    end_ns = time.perf_counter_ns() + int(duration_s * 1e9)
+
+    def client(client_index):
+        i = client_index
+        while time.perf_counter_ns() < end_ns and batcher.error is None:
+            request = Request(time.perf_counter_ns(), inputs[i % len(inputs)])
+            requests[client_index].append(request)
+            batcher.submit(request)
+            request.done.wait()
+            i += concurrency
+
+    clients = [threading.Thread(target=client, args=(client_index,)) for client_index in range(concurrency)]
+    for thread in clients:
+        thread.start()
+    for thread in clients:
+        thread.join()
+    return [request for client_requests in requests for request in client_requests]
+
+def compact_stats(latencies_ns):
+    stats = summarize_latencies(latencies_ns, slowest_n=0)
+    return {key: value for key, value in stats.items() if key not in ['histogram', 'slowest']}
+
+def summarize_load(requests, batch_sizes, load_type, offered_load):
+    for request in requests:
+        request.done.wait()
+    arrival_ns = np.array([request.arrival_ns for request in requests], dtype=np.int64)
+    batch_start_ns = np.array([request.batch_start_ns for request in requests], dtype=np.int64)
+    completion_ns = np.array([request.completion_ns for request in requests], dtype=np.int64)
+    elapsed_s = (completion_ns.max() - arrival_ns.min()) / 1e9
+
+    result = {
+        'load_type': load_type,
+        'offered_load': offered_load,
+        'requests': len(requests),
+        'throughput_per_s': len(requests) / elapsed_s if elapsed_s > 0 else 0.0,
+        'mean_batch_size': float(np.mean(batch_sizes)) if batch_sizes else 0.0,
+        'queueing_delay': compact_stats(batch_start_ns - arrival_ns),
+        'end_to_end_latency': compact_stats(completion_ns - arrival_ns),
+    }
+    if load_type == 'rate':
+        result['offered_rate_per_s'] = offered_load
+    return result
+
+def run_load(network, device, input_shape, inputs, load_type, offered_load, duration_s, max_batch_size, max_queue_delay_ms):
+    batcher = DynamicBatcher(network, device, input_shape, max_batch_size, max_queue_delay_ms)
+    batcher.start()
+    if load_type == 'rate':
+        requests = generate_open_loop(batcher, inputs, offered_load, duration_s)
+    else:
+        requests = generate_closed_loop(batcher, inputs, offered_load, duration_s)
+    # Waits for the queued requests and fails the run if the batcher did
+    batcher.stop()
+    return summarize_load(requests, batcher.batch_sizes, load_type, offered_load)
+
+def profile_serving(network, device, input_shape, no_operations_warmup, request_rates, concurrency_levels, duration_s,
+                    max_batch_size=DEFAULT_MAX_BATCH_SIZE, max_queue_delay_ms=DEFAULT_MAX_QUEUE_DELAY_MS, input_pool_size=64):
+    torch.set_grad_enabled(False)
+    network.eval()
+    torch_device = torch.device('cuda') if device == 'gpu' else torch.device('cpu')
+    network.to(torch_device)
+
+    # Single-sample requests, generated up front like the inference input pool
+    inputs = list(torch.randn(input_pool_size, 1, *input_shape, device=torch_device).unbind(0))
+    if no_operations_warmup > 0:
+        print("Warming up...")
+        for batch_size in range(1, max_batch_size + 1):
+            network(torch.randn(batch_size, *input_shape, device=torch_device))
+        for i in range(no_operations_warmup):
+            network(inputs[i % input_pool_size])
+
+    results = []
+    loads = [('rate', rate) for rate in request_rates] + [('concurrency', level) for level in concurrency_levels]
+    for load_type, offered_load in loads:
+        label = f"{offered_load} requests/s" if load_type == 'rate' else f"{offered_load} concurrent clients"
+        print(f"Serving {label} for {duration_s} s (max batch size {max_batch_size}, max queue delay {max_queue_delay_ms} ms)...")
+        results.append(run_load(network, device, input_shape, inputs, load_type, offered_load, duration_s,
+                                max_batch_size, max_queue_delay_ms))
+    return {'max_batch_size': max_batch_size, 'max_queue_delay_ms': max_queue_delay_ms, 'duration_s': duration_s, 'results': results}
@@ -0,0 +1,72 @@
+import time
+import numpy as np
+import torch
+from latency_stats import summarize_latencies
+
+# Per-step timing of the training loop. Every step is cut at six boundaries: before the batch is fetched, after the
+# fetch, after the forward pass, after the loss, after backward and after optimizer.step(). On GPU the boundaries are
+# CUDA events, so each phase is the time the device timeline spent on it and a fetch that overlaps queued kernels
+# only counts with its exposed part.
+
+STEP_PHASES = ['fetch', 'forward', 'loss', 'backward', 'optimizer']
+# A step that waits this long on its batch is limited by the data loader rather than by the framework
+LOADER_BOUND_SHARE = 0.25
+
+class StepTimer:
+    def __init__(self, no_steps, use_cuda_events):
+        # Preallocated for every step of the timed run, so marking a boundary never allocates
+        self.use_cuda_events = use_cuda_events
+        self.capacity = no_steps
+        no_boundaries = len(STEP_PHASES) + 1
+        if use_cuda_events:
+            self.boundary_events = [[torch.cuda.Event(enable_timing=True) for _ in range(no_boundaries)] for _ in range(no_steps)]
+        else:
+            self.marks_ns = np.zeros((no_steps, no_boundaries), dtype=np.int64)
+        self.no_steps = 0
+
+    def mark(self, step, boundary):
+        if step >= self.capacity:
+            # The fetch attempt that ends the last epoch
+            return
+        if self.use_cuda_events:
+            self.boundary_events[step][boundary].record()
+        else:
+            self.marks_ns[step, boundary] = time.monotonic_ns()
+
+    def durations_ns(self):
+        # (steps, phases) array of the completed steps
+        if not self.use_cuda_events:
+            return np.diff(self.marks_ns[:self.no_steps], axis=1)
+        torch.cuda.synchronize()
+        durations_ns = np.zeros((self.no_steps, len(STEP_PHASES)), dtype=np.int64)
+        for step in range(self.no_steps):
+            step_events = self.boundary_events[step]
+            for phase in range(len(STEP_PHASES)):
+                durations_ns[step, phase] = int(step_events[phase].elapsed_time(step_events[phase + 1]) * 1_000_000)  # ms -> ns
+        return durations_ns
+
+def summarize_steps(durations_ns):
+    step_ns = durations_ns.sum(axis=1)
+    total_ns = step_ns.sum()
+    phases = {}
+    for index, name in enumerate(STEP_PHASES):
+        phase_ms = durations_ns[:, index] / 1_000_000.0
+        phases[name] = {
+            'mean_ms': float(phase_ms.mean()),
+            'p50_ms': float(np.percentile(phase_ms, 50)),
+            'p99_ms': float(np.percentile(phase_ms, 99)),
+            'share': float(durations_ns[:, index].sum() / total_ns) if total_ns > 0 else 0.0,
+        }
+    return {
+        'steps': int(len(durations_ns)),
+        'step_latency': summarize_latencies(step_ns),
+        'phases': phases,
+        'bound': 'loader' if phases['fetch']['share'] >= LOADER_BOUND_SHARE else 'compute',
+    }
+
+def format_step_table(breakdown):
+    lines = [f"{'Phase':<10} {'Mean ms':>10} {'P50 ms':>10} {'P99 ms':>10} {'Share':>7}"]
+    for name in STEP_PHASES:
+        phase = breakdown['phases'][name]
+        lines.append(f"{name:<10} {phase['mean_ms']:>10.4f} {phase['p50_ms']:>10.4f} {phase['p99_ms']:>10.4f} {phase['share'] * 100:>6.1f}%")
+    return "\n".join(lines)
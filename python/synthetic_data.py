@@ -0,0 +1,86 @@
+import hashlib
+import json
+import os
+import numpy as np
+import torch
+
+# Synthetic training data. Samples are generated straight into float32 tensors by a seeded CPU torch.Generator, so no
+# float64 intermediate is allocated. A dataset that does not fit into memory is generated chunk by chunk into a
+# memory-mapped .npy file in the cache directory, named after the input shape, sample count, task and seed, and later
+# runs with the same settings reuse the file. Both storages draw the labels first and then the data in the same chunks
+# from the same generator, so a seed gives the same dataset in memory and on disk, on every device; in-memory data for
+# the GPU is moved there once generated.
+
+DATA_STORAGES = ['auto', 'memory', 'disk']
+DEFAULT_CACHE_DIR = 'data_cache'
+# 'auto' keeps the dataset in memory as long as it takes at most this share of the available memory
+MEMORY_SHARE = 0.5
+GENERATION_CHUNK_BYTES = 64 * 1024 * 1024
+
+def available_memory_bytes(device):
+    if device == 'gpu':
+        free_bytes, _ = torch.cuda.mem_get_info()
+        return free_bytes
+    try:
+        with open('/proc/meminfo') as meminfo_file:
+            for line in meminfo_file:
+                if line.startswith('MemAvailable:'):
+                    return int(line.split()[1]) * 1024  # kB
+    except OSError:
+        pass
+    return os.sysconf('SC_AVPHYS_PAGES') * os.sysconf('SC_PAGE_SIZE')
+
+def generate_labels(generator, num_classes, num_samples, task):
+    # Classification
+    if task == 'classification':
+        return torch.randint(0, num_classes, (num_samples,), generator=generator)
+    # Multi-class Regression
+    elif task == 'regression' and num_classes > 1:
+        return torch.randn(num_samples, num_classes, generator=generator)
+    # Single-output Regression
+    return torch.randn(num_samples, 1, generator=generator)
+
+def dataset_file_path(cache_dir, input_shape, num_samples, task, num_classes, seed):
+    description = json.dumps([list(input_shape), num_samples, task, num_classes, seed])
+    return os.path.join(cache_dir, f"train_data_{hashlib.sha1(description.encode()).hexdigest()[:16]}.npy")
+
+def fill_uniform(generator, data):
+    # data is a float32 tensor or memmap, filled in place chunk by chunk
+    chunk_samples = max(1, GENERATION_CHUNK_BYTES // (data[0].nbytes or 1))
+    for start in range(0, len(data), chunk_samples):
+        chunk = data[start:start + chunk_samples]
+        (chunk if isinstance(chunk, torch.Tensor) else torch.from_numpy(chunk)).uniform_(generator=generator)
+
+def generate_data_file(generator, path, input_shape, num_samples):
+    # Written under a temporary name and renamed once complete, so an interrupted generation is never reused
+    os.makedirs(os.path.dirname(path) or '.', exist_ok=True)
+    partial_path = path + '.partial'
+    data = np.lib.format.open_memmap(partial_path, mode='w+', dtype=np.float32, shape=(num_samples, *input_shape))
+    fill_uniform(generator, data)
+    data.flush()
+    del data
+    os.replace(partial_path, path)
+
+def generate_training_data(input_shape, num_classes, num_samples, task, device, seed=0, storage='auto', cache_dir=DEFAULT_CACHE_DIR):
+    # Returns (data, labels, data_info). In memory, data and labels are tensors on the training device; on disk, data
+    # is a read-only np.memmap and labels a CPU tensor
+    data_bytes = num_samples * int(np.prod(input_shape)) * 4
+    if storage == 'auto':
+        storage = 'disk' if data_bytes > MEMORY_SHARE * available_memory_bytes(device) else 'memory'
+    data_info = {'storage': storage, 'bytes': data_bytes, 'seed': seed}
+
+    generator = torch.Generator()
+    generator.manual_seed(seed)
+    labels = generate_labels(generator, num_classes, num_samples, task)
+    if storage == 'memory':
+        data = torch.empty(num_samples, *input_shape)
+        fill_uniform(generator, data)
+        torch_device = 'cuda' if device == 'gpu' else 'cpu'
+        return data.to(torch_device), labels.to(torch_device), data_info
+
+    path = dataset_file_path(cache_dir, input_shape, num_samples, task, num_classes, seed)
+    data_info['path'] = path
+    data_info['cached'] = os.path.exists(path)
+    if not data_info['cached']:
+        generate_data_file(generator, path, input_shape, num_samples)
+    return np.load(path, mmap_mode='r'), labels, data_info
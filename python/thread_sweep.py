@@ -0,0 +1,69 @@
+import torch
+import multiprocessing
+import constructor
+import inference
+import training
+from cpu_affinity import pin_to_cores
+from parameter_parser import get_inference_params, get_input_pool_params, get_training_params, get_training_options, get_warmup_params
+
+def run_thread_config(config_data, intra_op_threads, inter_op_threads, cores, result_queue):
+    # Runs in a fresh process: torch.set_num_interop_threads can only be called before any inter-op work
+    pinned = pin_to_cores(cores)
+    torch.set_num_interop_threads(inter_op_threads)
+    torch.set_num_threads(intra_op_threads)
+
+    network = constructor.build_custom_net(config_data['network']['layers'])
+    device = config_data['network']['device']
+    warmup_params = get_warmup_params(config_data)
+    result = {
+        'intra_op_threads': intra_op_threads,
+        'inter_op_threads': inter_op_threads,
+        'cores': list(cores) if pinned else None,
+    }
+    if config_data['network']['mode'] == 'inference':
+        input_pool_size, pinned_inputs = get_input_pool_params(config_data)
+        duration_ns, start_time, end_time, run_info = inference.profile_custom(network, device, *get_inference_params(config_data), *warmup_params,
+                                                                               input_pool_size=input_pool_size, pinned_inputs=pinned_inputs)
+        result['p50_ms'] = run_info['latency']['p50_ms']
+        result['p99_ms'] = run_info['latency']['p99_ms']
+    else:
+        # Training variants are compared in the main run only
+        training_options = dict(get_training_options(config_data), variants=None)
+        duration_ns, start_time, end_time, run_info = training.train_network(network, device, *get_training_params(config_data), *warmup_params,
+                                                                             **training_options)
+    result['duration_ms'] = duration_ns / 1_000_000
+    result_queue.put(result)
+
+def sweep_threads(config_data, intra_op_threads, inter_op_threads, core_sets):
+    # Every configuration runs in its own spawned process so thread pools and affinity start from a clean state
+    context = multiprocessing.get_context('spawn')
+    result_queue = context.Queue()
+    results = []
+    for cores in core_sets:
+        for inter_op in inter_op_threads:
+            for intra_op in intra_op_threads:
+                print(f"Thread sweep: {intra_op} intra-op / {inter_op} inter-op threads"
+                      + (f" on cores {cores}" if cores else "") + "...")
+                worker = context.Process(target=run_thread_config, args=(config_data, intra_op, inter_op, cores, result_queue))
+                worker.start()
+                worker.join()
+                if worker.exitcode != 0:
+                    print(f"Warning: thread sweep worker exited with code {worker.exitcode}. Skipping this configuration.")
+                    continue
+                results.append(result_queue.get())
+
+    if not results:
+        return {'results': [], 'best': None}
+
+    # Speedup is relative to the fewest intra-op threads on the same cores with the same inter-op threads, efficiency
+    # normalizes it by the added intra-op threads
+    groups = {}
+    for result in results:
+        groups.setdefault((tuple(result['cores'] or ()), result['inter_op_threads']), []).append(result)
+    for group in groups.values():
+        baseline = min(group, key=lambda result: result['intra_op_threads'])
+        for result in group:
+            result['speedup'] = baseline['duration_ms'] / result['duration_ms']
+            result['parallel_efficiency'] = result['speedup'] / (result['intra_op_threads'] / baseline['intra_op_threads'])
+    best = min(results, key=lambda result: result['duration_ms'])
+    return {'results': results, 'best': best}
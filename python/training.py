@@ -1,108 +1,248 @@
+import copy
+import resource
 import torch
 import torch.nn as nn
 import torch.optim as optim
-import numpy as np
 import time
+import events
+from step_breakdown import StepTimer, summarize_steps
+from batch_sampler import DATA_LOADERS, PREFETCH_LOADER, OVERHEAD_MAX_BATCHES, create_loader, measure_loader_overhead, summarize_loader_overhead
+from synthetic_data import generate_training_data, DEFAULT_CACHE_DIR
 
-def generate_mock_training_data(input_shape, num_classes, num_samples, task):
-    # Create random training data and labels
-    train_data = np.random.rand(num_samples, *input_shape).astype(np.float32)
-    train_data = torch.tensor(train_data)
-    
-    # Classification
-    if task == 'classification':
-        train_labels = np.random.randint(0, num_classes, num_samples)
-    # Multi-class Regression
-    elif task == 'regression' and num_classes > 1:
-        train_labels = np.random.randn(num_samples, num_classes).astype(np.float32)
-    # Single-output Regression
-    else:
-        train_labels = np.random.randn(num_samples).astype(np.float32)
-        train_labels = train_labels.reshape(-1, 1)
-    train_labels = torch.tensor(train_labels)
-    
-    return train_data, train_labels
+OPTIMIZERS = {'adam': optim.Adam, 'sgd': optim.SGD, 'rmsprop': optim.RMSprop}
+OPTIMIZER_IMPLEMENTATIONS = ['default', 'foreach', 'fused']
 
-def train_network(network, device, optimizer_choice, learning_rate, loss_function, batch_size, epochs, num_samples, num_classes, input_shape, task, no_operations_warmup):
+def create_criterion(loss_function):
     if loss_function == 'categorical_crossentropy':
-        criterion = nn.CrossEntropyLoss()
+        return nn.CrossEntropyLoss()
     elif loss_function == 'mse':
-        criterion = nn.MSELoss()
-    else:
-        print('Unsupported loss function:', loss_function)
-        exit(1)
+        return nn.MSELoss()
+    print('Unsupported loss function:', loss_function)
+    exit(1)
 
-    if optimizer_choice == 'adam':
-        optimizer = optim.Adam(network.parameters(), lr=learning_rate)
-    elif optimizer_choice == 'sgd':
-        optimizer = optim.SGD(network.parameters(), lr=learning_rate)
-    elif optimizer_choice == 'rmsprop':
-        optimizer = optim.RMSprop(network.parameters(), lr=learning_rate)
-    else:
+def create_optimizer(optimizer_choice, network, learning_rate, optimizer_impl='default'):
+    # Returns the optimizer and the implementation it actually uses
+    if optimizer_choice not in OPTIMIZERS:
         print('Unsupported optimizer choice:', optimizer_choice)
         exit(1)
+    implementation = {} if optimizer_impl == 'default' else {optimizer_impl: True}
+    try:
+        return OPTIMIZERS[optimizer_choice](network.parameters(), lr=learning_rate, **implementation), optimizer_impl
+    except (TypeError, RuntimeError) as e:
+        # E.g. no fused kernel for this optimizer, device or PyTorch version
+        print(f"Warning: '{optimizer_impl}' {optimizer_choice} is not available ({e}). Using the default implementation.")
+        return OPTIMIZERS[optimizer_choice](network.parameters(), lr=learning_rate), 'default'
 
-    # Generate mock training data and labels
-    train_data, train_labels = generate_mock_training_data(input_shape, num_classes, num_samples, task)
+def step_settings(device, options):
+    # train_epochs keyword arguments for the autocast, set_to_none and gradient_accumulation_steps training options.
+    # Autocast runs in bf16 on the CPU and in fp16 on the GPU, where a GradScaler keeps small gradients from
+    # flushing to zero.
+    settings = {
+        'device_type': 'cuda' if device == 'gpu' else 'cpu',
+        'autocast_dtype': None,
+        'scaler': None,
+        'set_to_none': options['set_to_none'],
+        'accumulation_steps': options['gradient_accumulation_steps'],
+    }
+    if options['autocast']:
+        settings['autocast_dtype'] = torch.float16 if device == 'gpu' else torch.bfloat16
+        if device == 'gpu':
+            settings['scaler'] = torch.amp.GradScaler('cuda')
+    return settings
 
+def reset_peak_memory(device):
     if device == 'gpu':
-        train_dataset = torch.utils.data.TensorDataset(train_data.to('cuda'), train_labels.to('cuda'))
+        torch.cuda.reset_peak_memory_stats()
+        return
+    try:
+        # Resets the peak RSS (VmHWM) of the process
+        with open('/proc/self/clear_refs', 'w') as clear_refs_file:
+            clear_refs_file.write('5')
+    except OSError:
+        pass
+
+def peak_memory_mb(device):
+    # Peak device memory allocated by PyTorch on the GPU, peak RSS of the process on the CPU
+    if device == 'gpu':
+        return torch.cuda.max_memory_allocated() / (1024 * 1024)
+    try:
+        with open('/proc/self/status') as status_file:
+            for line in status_file:
+                if line.startswith('VmHWM:'):
+                    return int(line.split()[1]) / 1024  # kB
+    except OSError:
+        pass
+    return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024
+
+def train_network(network, device, optimizer_choice, learning_rate, loss_function, batch_size, epochs, num_samples, num_classes, input_shape, task, no_operations_warmup,
+                  step_breakdown=False, data_loader='batch_sampler', data_seed=0, data_storage='auto', data_cache_dir=DEFAULT_CACHE_DIR,
+                  prefetch_workers=2, autocast=False, set_to_none=False, optimizer_impl='default', gradient_accumulation_steps=1,
+                  variants=None):
+    criterion = create_criterion(loss_function)
+
+    # Generate mock training data and labels, on the training device unless the dataset goes to disk
+    with events.phase('data_generation'):
+        train_data, train_labels, data_info = generate_training_data(input_shape, num_classes, num_samples, task, device,
+                                                                     data_seed, data_storage, data_cache_dir)
+    if data_info['storage'] == 'disk':
+        # Out-of-core data always goes through the prefetching loader
+        data_loader = PREFETCH_LOADER
+        loader_names, max_batches = [PREFETCH_LOADER], OVERHEAD_MAX_BATCHES
     else:
-        train_dataset = torch.utils.data.TensorDataset(train_data, train_labels)
-    train_loader = torch.utils.data.DataLoader(train_dataset, batch_size=batch_size, shuffle=True)
+        loader_names, max_batches = DATA_LOADERS, None
+    make_loader = lambda name: create_loader(name, train_data, train_labels, batch_size, device, prefetch_workers)
+    train_loader = make_loader(data_loader)
 
     network.train()
     if device == 'cpu':
         network.to('cpu')
-        if (no_operations_warmup > 0):
-            print("Warming up...")
-            for i in range(no_operations_warmup):
-                with torch.no_grad():
-                    inputs, labels = next(iter(train_loader))
-                    outputs = network(inputs)
-        
-        print("Training on CPU...")
-        start_time = time.time()
-        for epoch in range(epochs):
-            running_loss = 0.0
-            for i, data in enumerate(train_loader, 0):
-                inputs, labels = data
-                optimizer.zero_grad()
-                outputs = network(inputs)
-                loss = criterion(outputs, labels)
-                loss.backward()
-                optimizer.step()
-                running_loss += loss.item()
-        end_time = time.time()
+        synchronize = lambda: None
     elif device == 'gpu':
         network.to('cuda')
-        if (no_operations_warmup > 0):
-            print("Warming up...")
-            for i in range(no_operations_warmup):
-                with torch.no_grad():
-                    inputs, labels = next(iter(train_loader))
-                    outputs = network(inputs)  
-        
-        print("Training on GPU...")
-        torch.cuda.synchronize()
-        start_time = time.time()
-        for epoch in range(epochs):    
-            running_loss = 0.0
-            for i, data in enumerate(train_loader, 0):
-                inputs, labels = data
-                optimizer.zero_grad()
-                outputs = network(inputs)
-                loss = criterion(outputs, labels)
-                loss.backward()
-                optimizer.step()
-                running_loss += loss.item() 
-        torch.cuda.synchronize()
-        end_time = time.time()
+        synchronize = torch.cuda.synchronize
     else:
         print("Error")
         exit(1)
+    # Created once the parameters are on the device, which fused implementations require
+    optimizer, optimizer_impl = create_optimizer(optimizer_choice, network, learning_rate, optimizer_impl)
+    options = {'autocast': autocast, 'set_to_none': set_to_none, 'optimizer_impl': optimizer_impl,
+               'gradient_accumulation_steps': gradient_accumulation_steps}
+
+    # Fetch cost of every loader, outside the timed run
+    with events.phase('loader_overhead'):
+        loader_overhead = {name: measure_loader_overhead(make_loader(name), synchronize, max_batches) for name in loader_names}
+
+    if (no_operations_warmup > 0):
+        print("Warming up...")
+        with events.phase('warmup'):
+            inputs, labels = next(iter(train_loader))
+            for i in range(no_operations_warmup):
+                with torch.no_grad():
+                    outputs = network(inputs)
+            synchronize()
+
+    step_timer = StepTimer(len(train_loader) * epochs, device == 'gpu') if step_breakdown else None
+    # Every variant starts from the same weights as the main run
+    initial_state = copy.deepcopy(network.state_dict()) if variants else None
+
+    print(f"Training on {device.upper()}...")
+    reset_peak_memory(device)
+    synchronize()
+    events.emit('phase_begin', phase='timed_run')
+    start_time = time.monotonic_ns()
+    epoch_losses = train_epochs(network, train_loader, criterion, optimizer, epochs, step_timer, **step_settings(device, options))
+    synchronize()
+    end_time = time.monotonic_ns()
+    events.emit('phase_end', phase='timed_run')
+
+    duration_ns = end_time - start_time
+    run_info = {
+        'samples': len(train_data) * epochs,
+        'samples_per_s': len(train_data) * epochs / (duration_ns / 1e9),
+        'epoch_losses': epoch_losses,
+        'peak_memory_mb': peak_memory_mb(device),
+        'options': options,
+        'synthetic_data': data_info,
+        'data_loader': summarize_loader_overhead(data_loader, loader_overhead, duration_ns / 1e6 / (len(train_loader) * epochs)),
+    }
+    if step_timer is not None:
+        run_info['step_breakdown'] = summarize_steps(step_timer.durations_ns())
+    if variants:
+        with events.phase('training_variants'):
+            run_info['variants'] = compare_variants(network, device, train_loader, criterion, optimizer_choice, learning_rate, epochs,
+                                                    initial_state, options, run_info, variants, synchronize)
+    return duration_ns, start_time, end_time, run_info
 
-    duration_sec = end_time - start_time
-    duration_ns = int(duration_sec * 1_000_000_000)
-    return duration_ns, int(start_time * 1e9), int(end_time * 1e9)
+def variant_name(variant):
+    return ", ".join(f"{key}={value}" for key, value in variant.items())
 
+def compare_variants(network, device, train_loader, criterion, optimizer_choice, learning_rate, epochs, initial_state, baseline_options,
+                     baseline_info, variants, synchronize):
+    # Trains the baseline and every variant (a dict overriding some of the baseline training options) from the initial
+    # weights on the same data, outside the timed run, and compares their throughput and peak memory. The baseline is
+    # trained again here rather than taken from the main run, and every run is preceded by one untimed epoch with a
+    # throwaway optimizer, so all of them are timed warm. Peak memory is only compared on the GPU: on the CPU the peak
+    # RSS of the process includes the dataset and the network the variants share, and is reported as None.
+    trained_state = copy.deepcopy(network.state_dict())
+    results = []
+    for variant in [{}] + list(variants):
+        options = dict(baseline_options, **variant)
+        name = variant_name(variant) if variant else 'baseline'
+        print(f"Training variant {name}...")
+        settings = step_settings(device, options)
+        network.load_state_dict(initial_state)
+        warm_optimizer, _ = create_optimizer(optimizer_choice, network, learning_rate, options['optimizer_impl'])
+        train_epochs(network, train_loader, criterion, warm_optimizer, 1, **settings)
+        network.load_state_dict(initial_state)
+        optimizer, options['optimizer_impl'] = create_optimizer(optimizer_choice, network, learning_rate, options['optimizer_impl'])
+        settings = step_settings(device, options)
+        reset_peak_memory(device)
+        synchronize()
+        start_ns = time.monotonic_ns()
+        epoch_losses = train_epochs(network, train_loader, criterion, optimizer, epochs, **settings)
+        synchronize()
+        duration_ns = time.monotonic_ns() - start_ns
+        results.append({'name': name, 'options': options,
+                        'samples_per_s': baseline_info['samples'] / (duration_ns / 1e9),
+                        'peak_memory_mb': peak_memory_mb(device) if device == 'gpu' else None, 'final_loss': epoch_losses[-1]})
+    for result in results:
+        result['speedup'] = result['samples_per_s'] / results[0]['samples_per_s']
+        result['memory_ratio'] = result['peak_memory_mb'] / results[0]['peak_memory_mb'] if results[0]['peak_memory_mb'] else None
+    # Later profiling passes see the network as the main run left it
+    network.load_state_dict(trained_state)
+    return results
+
+def train_epochs(network, train_loader, criterion, optimizer, epochs, step_timer=None, device_type='cpu', autocast_dtype=None, scaler=None,
+                 set_to_none=False, accumulation_steps=1):
+    # The loss is accumulated on the device and read back once per epoch: loss.item() in every step would
+    # synchronize with the device each time. Returns the mean loss of every epoch.
+    # With gradient accumulation the optimizer steps once every accumulation_steps batches and after the last batch of
+    # an epoch; the step breakdown then times every batch, with an empty optimizer phase between optimizer steps.
+    mark = step_timer.mark if step_timer is not None else lambda step, boundary: None
+    epoch_losses = []
+    step = 0
+    for epoch in range(epochs):
+        events.emit('phase_begin', phase='epoch', index=epoch)
+        running_loss = None
+        no_batches = 0
+        no_epoch_batches = len(train_loader)
+        batches = iter(train_loader)
+        while True:
+            mark(step, 0)
+            try:
+                inputs, labels = next(batches)
+            except StopIteration:
+                break
+            mark(step, 1)
+            if no_batches % accumulation_steps == 0:
+                optimizer.zero_grad(set_to_none=set_to_none)  # Counted with the forward pass
+            with torch.autocast(device_type, dtype=autocast_dtype, enabled=autocast_dtype is not None):
+                outputs = network(inputs)
+                mark(step, 2)
+                loss = criterion(outputs, labels)
+            mark(step, 3)
+            # The last group of an epoch may hold fewer batches, its gradient is still the mean over them
+            group_start = no_batches - no_batches % accumulation_steps
+            group_size = min(accumulation_steps, no_epoch_batches - group_start)
+            scaled_loss = loss / group_size if group_size > 1 else loss
+            if scaler is not None:
+                scaler.scale(scaled_loss).backward()
+            else:
+                scaled_loss.backward()
+            mark(step, 4)
+            if (no_batches + 1) % accumulation_steps == 0 or no_batches + 1 == no_epoch_batches:
+                if scaler is not None:
+                    scaler.step(optimizer)
+                    scaler.update()
+                else:
+                    optimizer.step()
+            mark(step, 5)
+            if step_timer is not None:
+                step_timer.no_steps = step + 1
+            running_loss = loss.detach().float() if running_loss is None else running_loss + loss.detach().float()
+            no_batches += 1
+            step += 1
+        # The only host-device synchronization of the epoch, which also makes the epoch boundary accurate
+        epoch_losses.append(running_loss.item() / no_batches if no_batches > 0 else 0.0)
+        events.emit('phase_end', phase='epoch', index=epoch)
+    return epoch_losses
@@ -0,0 +1,188 @@
+import glob
+import os
+import re
+
+# System telemetry sampled by logger.run_sampler on the same ticks as power. Every reading is a list of floats in
+# the order of `columns`, which is fixed once the reader is opened so the telemetry trace has a stable header.
+# Column names carry their unit: *_pct, *_mhz, *_c (degrees Celsius) and *_mb. Sources that do not exist on a
+# platform are left out.
+
+GPU_LOAD_PATHS = ['/sys/devices/gpu.0/load', '/sys/devices/platform/gpu.0/load']
+GPU_LOAD_GLOBS = ['/sys/devices/platform/bus@0/*.gpu/load', '/sys/devices/platform/*.gpu/load']
+GPU_DEVFREQ_GLOBS = ['/sys/class/devfreq/*gpu*/cur_freq', '/sys/devices/gpu.0/devfreq/*/cur_freq']
+
+def read_cpu_times(stat_path='/proc/stat'):
+    # Returns {'cpu': (busy, total), 'cpu0': (busy, total), ...} in jiffies
+    cpu_times = {}
+    with open(stat_path) as stat_file:
+        for line in stat_file:
+            if not line.startswith('cpu'):
+                break
+            name, *values = line.split()
+            fields = [int(value) for value in values]
+            idle = fields[3] + (fields[4] if len(fields) > 4 else 0)  # idle + iowait
+            total = sum(fields[:8])  # guest time is already part of user time
+            cpu_times[name] = (total - idle, total)
+    return cpu_times
+
+def read_int(path):
+    with open(path) as f:
+        return int(f.read())
+
+def readable_int(path):
+    try:
+        read_int(path)
+        return True
+    except (OSError, ValueError):
+        return False
+
+def find_gpu_load_path():
+    # Jetson boards report the GPU load in per mille under sysfs
+    candidates = list(GPU_LOAD_PATHS)
+    for pattern in GPU_LOAD_GLOBS:
+        candidates.extend(sorted(glob.glob(pattern)))
+    for path in candidates:
+        if readable_int(path):
+            return path
+    return None
+
+def find_gpu_frequency_path():
+    for pattern in GPU_DEVFREQ_GLOBS:
+        for path in sorted(glob.glob(pattern)):
+            if readable_int(path):
+                return path
+    return None
+
+def column_name(label):
+    return re.sub(r'[^A-Za-z0-9]+', '_', label).strip('_').lower()
+
+def read_meminfo():
+    meminfo = {}
+    with open('/proc/meminfo') as meminfo_file:
+        for line in meminfo_file:
+            key, value = line.split(':', 1)
+            meminfo[key] = int(value.split()[0])  # kB
+    return meminfo
+
+def read_memory_pressure(pressure_path='/proc/pressure/memory'):
+    # Share of the last 10 s in which at least one task stalled on memory (PSI 'some avg10')
+    with open(pressure_path) as pressure_file:
+        for line in pressure_file:
+            if line.startswith('some'):
+                return float(line.split()[1].split('=')[1])
+    return 0.0
+
+def read_process_memory(pid):
+    # Returns (RSS, USS) in MB; USS is the memory only this process maps, i.e. what it would free on exit
+    values = {}
+    with open(f"/proc/{pid}/smaps_rollup") as smaps_file:
+        for line in smaps_file:
+            parts = line.split()
+            if len(parts) >= 2 and parts[0] in ('Rss:', 'Private_Clean:', 'Private_Dirty:'):
+                values[parts[0]] = int(parts[1])
+    return values.get('Rss:', 0) / 1024.0, (values.get('Private_Clean:', 0) + values.get('Private_Dirty:', 0)) / 1024.0
+
+class Telemetry:
+    def __init__(self, pid=None):
+        # pid: process whose RSS/USS is sampled, i.e. the profiler
+        self.pid = pid
+        self.columns = []
+        self.readers = []
+        self.nvml_handle = None
+
+    def add(self, columns, reader):
+        # reader() returns one value per column; a reader that fails at open time is left out
+        try:
+            values = reader()
+        except (OSError, ValueError, IndexError, KeyError, ZeroDivisionError):
+            return
+        if len(values) == len(columns):
+            self.columns.extend(columns)
+            self.readers.append((reader, len(columns)))
+
+    def open(self):
+        self.columns = []
+        self.readers = []
+
+        self.previous_cpu_times = read_cpu_times()
+        cpu_names = list(self.previous_cpu_times)
+        self.add(['cpu_util_pct'] + [f"{name}_util_pct" for name in cpu_names[1:]], self.read_cpu_utilization)
+
+        policy_paths = sorted(glob.glob('/sys/devices/system/cpu/cpufreq/policy*/scaling_cur_freq'),
+                              key=lambda path: int(re.search(r'policy(\d+)', path).group(1)))
+        self.add([f"cpufreq_{path.split('/')[-2]}_mhz" for path in policy_paths],
+                 lambda: [read_int(path) / 1000.0 for path in policy_paths])  # kHz -> MHz
+
+        self.gpu_load_path = find_gpu_load_path()
+        self.nvml_handle = None
+        if self.gpu_load_path is not None:
+            self.add(['gpu_util_pct'], lambda: [read_int(self.gpu_load_path) / 10.0])
+        else:
+            # Discrete NVIDIA GPUs through NVML; imported lazily so other platforms never need the package
+            try:
+                import pynvml
+                pynvml.nvmlInit()
+                self.nvml_handle = pynvml.nvmlDeviceGetHandleByIndex(0)
+                self.add(['gpu_util_pct', 'gpu_freq_mhz'], self.read_nvml)
+            except Exception:
+                self.nvml_handle = None
+        gpu_frequency_path = find_gpu_frequency_path()
+        if gpu_frequency_path is not None and self.nvml_handle is None:
+            self.add(['gpu_freq_mhz'], lambda: [read_int(gpu_frequency_path) / 1e6])  # Hz -> MHz
+
+        zone_columns = []
+        zone_paths = []
+        for zone_path in sorted(glob.glob('/sys/class/thermal/thermal_zone*'), key=lambda path: int(re.search(r'(\d+)$', path).group(1))):
+            try:
+                with open(os.path.join(zone_path, 'type')) as type_file:
+                    zone_type = column_name(type_file.read().strip())
+            except OSError:
+                continue
+            if not readable_int(os.path.join(zone_path, 'temp')):
+                continue
+            column = f"temp_{zone_type}_c"
+            if column in zone_columns:
+                column = f"temp_{zone_type}_{os.path.basename(zone_path)[len('thermal_zone'):]}_c"
+            zone_columns.append(column)
+            zone_paths.append(os.path.join(zone_path, 'temp'))
+        self.add(zone_columns, lambda: [read_int(path) / 1000.0 for path in zone_paths])  # millidegrees -> degrees
+
+        if self.pid is not None:
+            self.add(['rss_mb', 'uss_mb'], lambda: list(read_process_memory(self.pid)))
+        self.add(['mem_available_pct'], self.read_memory_available)
+        self.add(['mem_pressure_pct'], lambda: [read_memory_pressure()])
+
+    def close(self):
+        if self.nvml_handle is not None:
+            import pynvml
+            pynvml.nvmlShutdown()
+
+    def read_cpu_utilization(self):
+        cpu_times = read_cpu_times()
+        utilization = []
+        for name, (busy, total) in cpu_times.items():
+            previous_busy, previous_total = self.previous_cpu_times.get(name, (busy, total))
+            utilization.append(100.0 * (busy - previous_busy) / (total - previous_total) if total > previous_total else 0.0)
+        self.previous_cpu_times = cpu_times
+        return utilization
+
+    def read_nvml(self):
+        import pynvml
+        return [float(pynvml.nvmlDeviceGetUtilizationRates(self.nvml_handle).gpu),
+                float(pynvml.nvmlDeviceGetClockInfo(self.nvml_handle, pynvml.NVML_CLOCK_GRAPHICS))]
+
+    def read_memory_available(self):
+        meminfo = read_meminfo()
+        return [100.0 * meminfo['MemAvailable'] / meminfo['MemTotal']]
+
+    def read(self):
+        readings = []
+        for reader, width in self.readers:
+            try:
+                values = reader()
+            except (OSError, ValueError, IndexError, KeyError, ZeroDivisionError):
+                # E.g. the profiler exited before the sampler stopped
+                values = []
+            # Keep the record layout intact if a source disappears (or a CPU goes offline) during the run
+            readings.extend((list(values) + [0.0] * width)[:width])
+        return readings
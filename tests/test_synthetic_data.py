@@ -0,0 +1,18 @@
+import os
+import sys
+import pytest
+
+torch = pytest.importorskip('torch')
+pytest.importorskip('numpy')
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'python'))
+import synthetic_data
+
+
+def test_seed_gives_the_same_dataset_in_memory_and_on_disk(tmp_path, monkeypatch):
+    # Small chunks, so the data is generated in several of them
+    monkeypatch.setattr(synthetic_data, 'GENERATION_CHUNK_BYTES', 3 * 2 * 4 * 4)
+    in_memory = synthetic_data.generate_training_data((2, 4), 3, 10, 'classification', 'cpu', 7, 'memory')
+    on_disk = synthetic_data.generate_training_data((2, 4), 3, 10, 'classification', 'cpu', 7, 'disk', str(tmp_path))
+    assert torch.equal(in_memory[0], torch.from_numpy(on_disk[0].copy()))
+    assert torch.equal(in_memory[1], on_disk[1])
@@ -0,0 +1,45 @@
+import os
+import sys
+import pytest
+
+torch = pytest.importorskip('torch')
+pytest.importorskip('numpy')
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'python'))
+import training
+
+
+def test_gradient_accumulation_scales_a_short_last_group():
+    # Three batches with two accumulation steps: the last group holds a single batch, whose accumulated gradient has
+    # to match the gradient of that batch on its own
+    torch.manual_seed(0)
+    network = torch.nn.Linear(4, 3)
+    criterion = torch.nn.CrossEntropyLoss()
+    batches = [(torch.randn(2, 4), torch.randint(0, 3, (2,))) for _ in range(3)]
+    # A zero learning rate keeps the weights fixed, so the gradient left after the epoch is the last group's
+    optimizer = torch.optim.SGD(network.parameters(), lr=0.0)
+
+    training.train_epochs(network, batches, criterion, optimizer, 1, accumulation_steps=2)
+    accumulated = network.weight.grad.clone()
+
+    network.zero_grad()
+    inputs, labels = batches[-1]
+    criterion(network(inputs), labels).backward()
+    assert torch.allclose(accumulated, network.weight.grad)
+
+
+def test_gradient_accumulation_matches_one_combined_batch():
+    torch.manual_seed(0)
+    network = torch.nn.Linear(4, 3)
+    criterion = torch.nn.CrossEntropyLoss()
+    batches = [(torch.randn(2, 4), torch.randint(0, 3, (2,))) for _ in range(2)]
+    optimizer = torch.optim.SGD(network.parameters(), lr=0.0)
+
+    training.train_epochs(network, batches, criterion, optimizer, 1, accumulation_steps=2)
+    accumulated = network.weight.grad.clone()
+
+    network.zero_grad()
+    inputs = torch.cat([batch[0] for batch in batches])
+    labels = torch.cat([batch[1] for batch in batches])
+    criterion(network(inputs), labels).backward()
+    assert torch.allclose(accumulated, network.weight.grad)
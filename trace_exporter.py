@@ -0,0 +1,161 @@
+import argparse
+import json
+import math
+import numpy as np
+from power_trace import load_power_trace, load_telemetry_trace, rail_names
+from profiler_runner import EventTail
+
+# Timeline export in the Chrome trace event format, which Perfetto (ui.perfetto.dev) and chrome://tracing open.
+# Power and telemetry become counter tracks, profiler phases and layer executions become spans, all on the
+# CLOCK_MONOTONIC timeline shared by the profilers and the power sampler. Events are written as they are produced, and
+# counter tracks are averaged down to at most max_counter_points points, so multi-hour traces stay small.
+
+DEFAULT_MAX_COUNTER_POINTS = 20000
+COUNTER_CHUNK_POINTS = 4096
+
+POWER_PID = 1
+TELEMETRY_PID = 2
+PROFILER_PID = 3
+PHASE_TID = 1
+LAYER_FORWARD_TID = 2
+LAYER_BACKWARD_TID = 3
+
+class ChromeTraceWriter:
+    # Streams a {"traceEvents": [...]} document; timestamps are given in ns and written in us relative to origin_ns
+    def __init__(self, output_path, origin_ns):
+        self.output_path = output_path
+        self.origin_ns = origin_ns
+        self.file = None
+        self.no_events = 0
+
+    def __enter__(self):
+        self.file = open(self.output_path, 'w')
+        self.file.write('{"displayTimeUnit": "ms", "traceEvents": [\n')
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.file.write('\n]}\n')
+        self.file.close()
+
+    def timestamp_us(self, timestamp_ns):
+        return (timestamp_ns - self.origin_ns) / 1000.0
+
+    def write_event(self, event):
+        if self.no_events > 0:
+            self.file.write(',\n')
+        self.file.write(json.dumps(event, separators=(',', ':')))
+        self.no_events += 1
+
+    def name_process(self, pid, name):
+        self.write_event({'name': 'process_name', 'ph': 'M', 'pid': pid, 'tid': 0, 'args': {'name': name}})
+
+    def name_thread(self, pid, tid, name):
+        self.write_event({'name': 'thread_name', 'ph': 'M', 'pid': pid, 'tid': tid, 'args': {'name': name}})
+
+    def write_span(self, pid, tid, name, start_ns, duration_ns, args=None):
+        event = {'name': name, 'ph': 'X', 'pid': pid, 'tid': tid, 'ts': self.timestamp_us(start_ns), 'dur': duration_ns / 1000.0}
+        if args:
+            event['args'] = args
+        self.write_event(event)
+
+    def write_counter(self, pid, name, timestamp_ns, values):
+        self.write_event({'name': name, 'ph': 'C', 'pid': pid, 'tid': 0, 'ts': self.timestamp_us(timestamp_ns), 'args': values})
+
+def downsample(records, max_points):
+    # Yields (timestamps_ns, {column: values}) chunks with every bucket of consecutive samples averaged into one
+    # point stamped with the bucket's first timestamp; averaging keeps the energy under the power curve
+    columns = records.dtype.names[1:]
+    bucket_size = max(1, math.ceil(len(records) / max_points))
+    chunk_size = bucket_size * COUNTER_CHUNK_POINTS
+    for chunk_start in range(0, len(records), chunk_size):
+        chunk = records[chunk_start:chunk_start + chunk_size]
+        bucket_starts = np.arange(0, len(chunk), bucket_size)
+        bucket_lengths = np.diff(np.append(bucket_starts, len(chunk)))
+        values = {column: np.add.reduceat(chunk[column].astype(np.float64), bucket_starts) / bucket_lengths for column in columns}
+        yield chunk['timestamp_ns'][bucket_starts], values
+
+def write_counter_tracks(writer, pid, records, track_names, max_points):
+    # track_names: column -> (counter name, series name); columns with the same counter name share a track
+    for timestamps_ns, values in downsample(records, max_points):
+        for point, timestamp_ns in enumerate(timestamps_ns):
+            tracks = {}
+            for column, (counter_name, series_name) in track_names.items():
+                tracks.setdefault(counter_name, {})[series_name] = round(float(values[column][point]), 3)
+            for counter_name, series in tracks.items():
+                writer.write_counter(pid, counter_name, int(timestamp_ns), series)
+
+def power_track_names(power_data):
+    # One track per rail, so no rail is drawn stacked on top of the total
+    track_names = {'power_tot_mw': ('Power total (mW)', 'mW')}
+    for rail in rail_names(power_data):
+        track_names[f"{rail}_mw"] = (f"Power {rail} (mW)", 'mW')
+    return track_names
+
+def telemetry_track_names(telemetry_data):
+    return {column: (column, 'value') for column in telemetry_data.dtype.names[1:]}
+
+def timeline_origin_ns(power_data, telemetry_data, phases):
+    candidates = []
+    for records in [power_data, telemetry_data]:
+        if records is not None and len(records) > 0:
+            candidates.append(int(records['timestamp_ns'][0]))
+    if phases:
+        candidates.append(min(phase['start_ns'] for phase in phases))
+    return min(candidates) if candidates else 0
+
+def export_timeline(output_path, profiler_name, power_data=None, telemetry_data=None, phases=None, layer_profile=None,
+                    max_counter_points=DEFAULT_MAX_COUNTER_POINTS):
+    # power_data/telemetry_data: full traces as loaded by power_trace; phases: spans as collected by
+    # profiler_runner.EventTail; layer_profile: the profiler's layer_profile metrics, with 'spans' if traced
+    origin_ns = timeline_origin_ns(power_data, telemetry_data, phases)
+    with ChromeTraceWriter(output_path, origin_ns) as writer:
+        if power_data is not None and len(power_data) > 0:
+            writer.name_process(POWER_PID, 'Power')
+            write_counter_tracks(writer, POWER_PID, power_data, power_track_names(power_data), max_counter_points)
+        if telemetry_data is not None and len(telemetry_data) > 0:
+            writer.name_process(TELEMETRY_PID, 'System telemetry')
+            write_counter_tracks(writer, TELEMETRY_PID, telemetry_data, telemetry_track_names(telemetry_data), max_counter_points)
+
+        writer.name_process(PROFILER_PID, profiler_name)
+        if phases:
+            writer.name_thread(PROFILER_PID, PHASE_TID, 'Phases')
+            for phase in phases:
+                args = {key: value for key, value in phase.items() if key not in ('phase', 'start_ns', 'end_ns', 'depth')}
+                writer.write_span(PROFILER_PID, PHASE_TID, phase['phase'], phase['start_ns'], phase['end_ns'] - phase['start_ns'], args)
+
+        if layer_profile and 'spans' in layer_profile:
+            layer_types = {row['index']: row['type'] for row in layer_profile['forward']}
+            for direction, tid in [('forward', LAYER_FORWARD_TID), ('backward', LAYER_BACKWARD_TID)]:
+                if direction not in layer_profile['spans']:
+                    continue
+                writer.name_thread(PROFILER_PID, tid, f"Layers ({direction})")
+                for layer_index, start_ns, duration_ns in layer_profile['spans'][direction]:
+                    writer.write_span(PROFILER_PID, tid, f"{layer_index}: {layer_types.get(layer_index, 'layer')}", start_ns, duration_ns)
+        return writer.no_events
+
+def main():
+    parser = argparse.ArgumentParser(description='Export a profiler run as a Chrome trace / Perfetto timeline')
+    parser.add_argument('--power', type=str, default=None, help='Binary power trace (*_power_log.bin)')
+    parser.add_argument('--telemetry', type=str, default=None, help='Binary telemetry trace (*_telemetry.bin)')
+    parser.add_argument('--events', type=str, default=None, help='Event file of the profiler run (*_events.jsonl)')
+    parser.add_argument('--name', type=str, default='Profiler', help='Name of the profiler process in the timeline')
+    parser.add_argument('--max-counter-points', type=int, default=DEFAULT_MAX_COUNTER_POINTS,
+                        help='Counter tracks are averaged down to at most this many points')
+    parser.add_argument('-o', '--output', type=str, required=True, help='Output JSON path')
+    args = parser.parse_args()
+
+    phases = None
+    layer_profile = None
+    if args.events:
+        event_tail = EventTail(args.events, args.name, verbose=False)
+        event_tail.poll()
+        phases = event_tail.phases
+        layer_profile = event_tail.metrics.get('layer_profile')
+    no_events = export_timeline(args.output, args.name,
+                                power_data=load_power_trace(args.power) if args.power else None,
+                                telemetry_data=load_telemetry_trace(args.telemetry) if args.telemetry else None,
+                                phases=phases, layer_profile=layer_profile, max_counter_points=args.max_counter_points)
+    print(f"Wrote {no_events} trace events to {args.output}")
+
+if __name__ == "__main__":
+    main()
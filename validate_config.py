@@ -1,4 +1,5 @@
 import json
+from config_analyzer import analyze_layers
 
 def load_config_file(config_file_path):
     try:
@@ -103,6 +104,18 @@ def validate_residual_params(residual_params):
         
     return [error for error in errors if error is not None]
 
+TRAINING_VARIANT_OPTIONS = ['autocast', 'set_to_none', 'optimizer_impl', 'gradient_accumulation_steps']
+
+def validate_training_options(options):
+    # Training performance options, set in 'training_params' or overridden by an entry of its 'variants'
+    errors = []
+    for option in ['autocast', 'set_to_none']:
+        if option in options and not isinstance(options[option], bool):
+            errors.append(f"'{option}' must be boolean.")
+    errors.append(validate_field(options, 'optimizer_impl', str, valid_values=['default', 'foreach', 'fused']))
+    errors.append(validate_field(options, 'gradient_accumulation_steps', int))
+    return [error for error in errors if error is not None]
+
 def check_network_config(network_config):
     errors = []
 
@@ -130,6 +143,22 @@ def check_network_config(network_config):
             errors.append("Missing 'inference_params' in 'inference' mode.")
         else:
             errors.append(validate_field(inference_params, 'no_inferences', int, required=True))
+            if 'batch_sizes' in inference_params:
+                batch_sizes = inference_params['batch_sizes']
+                if not isinstance(batch_sizes, list) or len(batch_sizes) < 1:
+                    errors.append("'batch_sizes' must be a non-empty list of positive integers.")
+                elif any(not isinstance(size, int) or isinstance(size, bool) or size <= 0 for size in batch_sizes):
+                    errors.append("All elements in 'batch_sizes' must be positive integers.")
+            errors.append(validate_field(inference_params, 'input_pool_size', int))
+            if 'precisions' in inference_params:
+                valid_precisions = ['fp32', 'fp16', 'bf16', 'int8_dynamic', 'int8_static']
+                precisions = inference_params['precisions']
+                if not isinstance(precisions, list) or len(precisions) < 1:
+                    errors.append("'precisions' must be a non-empty list of strings.")
+                elif any(precision not in valid_precisions for precision in precisions):
+                    errors.append(f"'precisions' entries must be one of {', '.join(valid_precisions)}.")
+            if 'pinned_inputs' in inference_params and not isinstance(inference_params['pinned_inputs'], bool):
+                errors.append("'pinned_inputs' must be boolean.")
 
     if network_config['mode'] == 'training':
         training_params = network_config.get('training_params')
@@ -144,6 +173,30 @@ def check_network_config(network_config):
             errors.append(validate_field(training_params, 'batch_size', int, required=True))
             errors.append(validate_field(training_params, 'epochs', int, required=True))
             errors.append(validate_field(training_params, 'num_samples', int, required=True))
+            if 'step_breakdown' in training_params and not isinstance(training_params['step_breakdown'], bool):
+                errors.append("'step_breakdown' must be boolean.")
+            errors.append(validate_field(training_params, 'data_loader', str, valid_values=['batch_sampler', 'dataloader']))
+            errors.extend(validate_training_options(training_params))
+            variants = training_params.get('variants')
+            if variants is not None:
+                if not isinstance(variants, list) or len(variants) < 1 or any(not isinstance(variant, dict) or not variant for variant in variants):
+                    errors.append("'variants' must be a non-empty list of non-empty dictionaries.")
+                else:
+                    for variant in variants:
+                        unknown_options = [option for option in variant if option not in TRAINING_VARIANT_OPTIONS]
+                        if unknown_options:
+                            errors.append(f"Unknown 'variants' option(s) {', '.join(unknown_options)}; valid options are {', '.join(TRAINING_VARIANT_OPTIONS)}.")
+                        errors.extend(validate_training_options(variant))
+            synthetic_data = training_params.get('synthetic_data')
+            if synthetic_data is not None:
+                if not isinstance(synthetic_data, dict):
+                    errors.append("'synthetic_data' must be a dictionary.")
+                else:
+                    if 'seed' in synthetic_data and (not isinstance(synthetic_data['seed'], int) or isinstance(synthetic_data['seed'], bool) or synthetic_data['seed'] < 0):
+                        errors.append("'seed' in 'synthetic_data' must be a non-negative integer.")
+                    errors.append(validate_field(synthetic_data, 'storage', str, valid_values=['auto', 'memory', 'disk']))
+                    errors.append(validate_field(synthetic_data, 'cache_dir', str))
+                    errors.append(validate_field(synthetic_data, 'prefetch_workers', int))
             
     warmup_params = network_config.get('warmup_params')
     if not warmup_params:
@@ -165,11 +218,120 @@ def check_network_config(network_config):
         elif power_measurement['status'] not in ['on', 'off']:
             errors.append("'status' must be either 'on' or 'off'.")
 
+        for field_name in ['export_csv', 'telemetry']:
+            if field_name in power_measurement and not isinstance(power_measurement[field_name], bool):
+                errors.append(f"'{field_name}' in 'power_measurement' must be boolean.")
+
+        for field_name in ['idle_baseline_s', 'baseline_drift_tolerance']:
+            if field_name in power_measurement and (not isinstance(power_measurement[field_name], (float, int)) or power_measurement[field_name] < 0):
+                errors.append(f"'{field_name}' in 'power_measurement' must be a non-negative number.")
+
+        if 'throttle_temperature_c' in power_measurement and not isinstance(power_measurement['throttle_temperature_c'], (float, int)):
+            errors.append("'throttle_temperature_c' in 'power_measurement' must be a number.")
+        if 'throttle_frequency_drop' in power_measurement and (not isinstance(power_measurement['throttle_frequency_drop'], (float, int))
+                                                               or not 0 < power_measurement['throttle_frequency_drop'] < 1):
+            errors.append("'throttle_frequency_drop' in 'power_measurement' must be a number between 0 and 1.")
+
+        valid_power_sources = ['jtop', 'hwmon', 'rapl', 'replay']
+        if power_measurement.get('source', 'jtop') not in valid_power_sources:
+            errors.append(f"'source' in 'power_measurement' must be one of {', '.join(valid_power_sources)}.")
+        elif power_measurement.get('source') == 'replay' and not isinstance(power_measurement.get('replay_file'), str):
+            errors.append("'replay_file' is required in 'power_measurement' for the 'replay' source.")
+
         if 'logging_interval' not in power_measurement:
             errors.append("Missing 'logging_interval' in the 'power_measurement'.")
         elif not isinstance(power_measurement['logging_interval'], (float, int)) or power_measurement['logging_interval'] <= 0:
             errors.append("'logging_interval' must be a positive number.")
 
+    valid_execution_backends = ['eager', 'script', 'trace', 'compile', 'inference_mode', 'channels_last']
+    execution_backend = network_config.get('execution_backend', 'eager')
+    execution_backends = [execution_backend] if isinstance(execution_backend, str) else execution_backend
+    if not isinstance(execution_backends, list) or len(execution_backends) < 1:
+        errors.append("'execution_backend' must be a string or a non-empty list of strings.")
+    elif any(backend not in valid_execution_backends for backend in execution_backends):
+        errors.append(f"'execution_backend' entries must be one of {', '.join(valid_execution_backends)}.")
+
+    valid_graph_optimizations = ['drop_dropout', 'fold_batchnorm', 'fuse_activations']
+    graph_optimizations = network_config.get('graph_optimizations', [])
+    if not isinstance(graph_optimizations, list):
+        errors.append("'graph_optimizations' must be a list of strings.")
+    elif any(pass_name not in valid_graph_optimizations for pass_name in graph_optimizations):
+        errors.append(f"'graph_optimizations' entries must be one of {', '.join(valid_graph_optimizations)}.")
+
+    thread_sweep = network_config.get('thread_sweep')
+    if thread_sweep is not None:
+        for field_name in ['intra_op_threads', 'inter_op_threads']:
+            thread_counts = thread_sweep.get(field_name, [1])
+            if not isinstance(thread_counts, list) or len(thread_counts) < 1 or \
+                    any(not isinstance(count, int) or count <= 0 for count in thread_counts):
+                errors.append(f"'{field_name}' in 'thread_sweep' must be a non-empty list of positive integers.")
+        if 'intra_op_threads' not in thread_sweep:
+            errors.append("Missing 'intra_op_threads' in 'thread_sweep'.")
+        core_sets = thread_sweep.get('core_sets', [[0]])
+        if not isinstance(core_sets, list) or len(core_sets) < 1 or any(not isinstance(cores, list) or len(cores) < 1 or
+                                                  any(not isinstance(core, int) or core < 0 for core in cores) for cores in core_sets):
+            errors.append("'core_sets' in 'thread_sweep' must be a non-empty list of non-empty lists of core indices.")
+
+    serving = network_config.get('serving')
+    if serving is not None:
+        request_rates = serving.get('request_rates', [])
+        concurrency_levels = serving.get('concurrency', [])
+        if not isinstance(request_rates, list) or any(not isinstance(rate, (float, int)) or rate <= 0 for rate in request_rates):
+            errors.append("'request_rates' in 'serving' must be a list of positive numbers.")
+        if not isinstance(concurrency_levels, list) or any(not isinstance(level, int) or level <= 0 for level in concurrency_levels):
+            errors.append("'concurrency' in 'serving' must be a list of positive integers.")
+        if not request_rates and not concurrency_levels:
+            errors.append("'serving' needs at least one entry in 'request_rates' or 'concurrency'.")
+        if not isinstance(serving.get('duration_s', 5), (float, int)) or serving.get('duration_s', 5) <= 0:
+            errors.append("'duration_s' in 'serving' must be a positive number.")
+        if not isinstance(serving.get('max_batch_size', 8), int) or serving.get('max_batch_size', 8) <= 0:
+            errors.append("'max_batch_size' in 'serving' must be a positive integer.")
+        if not isinstance(serving.get('max_queue_delay_ms', 2), (float, int)) or serving.get('max_queue_delay_ms', 2) < 0:
+            errors.append("'max_queue_delay_ms' in 'serving' must be a non-negative number.")
+
+    multi_stream = network_config.get('multi_stream')
+    if multi_stream is not None:
+        streams = multi_stream.get('streams')
+        if not isinstance(streams, list) or len(streams) < 1 or any(not isinstance(count, int) or count <= 0 for count in streams):
+            errors.append("'streams' in 'multi_stream' must be a non-empty list of positive integers.")
+        if 'pin_cores' in multi_stream and not isinstance(multi_stream['pin_cores'], bool):
+            errors.append("'pin_cores' in 'multi_stream' must be boolean.")
+
+    timeline_trace = network_config.get('timeline_trace')
+    if timeline_trace is not None:
+        if timeline_trace.get('status') not in ['on', 'off']:
+            errors.append("'status' in 'timeline_trace' must be either 'on' or 'off'.")
+        errors.append(validate_field(timeline_trace, 'max_counter_points', int))
+
+    batch_size_tuning = network_config.get('batch_size_tuning')
+    if batch_size_tuning is not None:
+        if batch_size_tuning.get('status') not in ['on', 'off']:
+            errors.append("'status' in 'batch_size_tuning' must be either 'on' or 'off'.")
+        elif batch_size_tuning['status'] == 'on' and network_config.get('mode') != 'training':
+            errors.append("'batch_size_tuning' is only supported in 'training' mode.")
+        budget = batch_size_tuning.get('memory_budget_mb')
+        if not isinstance(budget, (int, float)) or isinstance(budget, bool) or budget <= 0:
+            errors.append("'memory_budget_mb' in 'batch_size_tuning' must be a positive number.")
+        errors.append(validate_field(batch_size_tuning, 'memory', str, valid_values=['rss', 'device']))
+        if batch_size_tuning.get('memory') == 'device' and network_config.get('device') != 'gpu':
+            errors.append("'memory': 'device' in 'batch_size_tuning' requires the 'gpu' device.")
+        for field_name in ['probe_steps', 'min_batch_size', 'max_batch_size']:
+            errors.append(validate_field(batch_size_tuning, field_name, int))
+        if isinstance(batch_size_tuning.get('min_batch_size', 1), int) and isinstance(batch_size_tuning.get('max_batch_size', 4096), int) \
+                and batch_size_tuning.get('min_batch_size', 1) > batch_size_tuning.get('max_batch_size', 4096):
+            errors.append("'min_batch_size' in 'batch_size_tuning' must not exceed 'max_batch_size'.")
+        timeout = batch_size_tuning.get('probe_timeout_s', 300)
+        if not isinstance(timeout, (int, float)) or isinstance(timeout, bool) or timeout <= 0:
+            errors.append("'probe_timeout_s' in 'batch_size_tuning' must be a positive number.")
+
+    layer_profiling = network_config.get('layer_profiling')
+    if layer_profiling is not None:
+        if layer_profiling.get('status') not in ['on', 'off']:
+            errors.append("'status' in 'layer_profiling' must be either 'on' or 'off'.")
+        errors.append(validate_field(layer_profiling, 'iterations', int))
+        if 'trace_iterations' in layer_profiling and (not isinstance(layer_profiling['trace_iterations'], int) or layer_profiling['trace_iterations'] < 0):
+            errors.append("'trace_iterations' in 'layer_profiling' must be a non-negative integer.")
+
     # Add more checks for specific keys in the 'network' section
 
     return [error for error in errors if error is not None]
@@ -266,6 +428,11 @@ def validate_config(config_file_path):
     layers_errors = check_layers_config(layers)
     all_errors = network_errors + layers_errors
 
+    # Shape propagation needs well-formed layers, so it only runs once the field checks pass
+    if not all_errors:
+        _, shape_errors = analyze_layers(network_config['input_shape'], layers)
+        all_errors.extend(shape_errors)
+
     if all_errors:
         print("Configuration Errors:")
         for error in all_errors: